@@ -0,0 +1,481 @@
+# batch.py
+# Batch inference through each provider's asynchronous batch API, for
+# offline workloads (bulk summarization, classification) that care about
+# tokens per dollar and total job time rather than per-request latency:
+#   Bedrock  model invocation jobs, with JSONL input and output in S3
+#   Vertex   batch prediction jobs, with JSONL input and output in Cloud Storage
+#   Azure    the OpenAI-style batch API of a global batch deployment, with
+#            JSONL sent and fetched through its Files API
+#
+# Every job goes through the same stages, each timed:
+#   package   the prompts written to a JSONL file one line at a time
+#   upload    the file sent to the provider (multipart or resumable uploads)
+#   submit    the job created
+#   queued, running   polled with exponential backoff until the job ends
+#   ingest    the output read back as a stream, a line at a time, into a CSV
+# so a prompt set of any size is never held in memory. Queued and running
+# times are as the polls saw them, so they are only as fine as the polling.
+#
+# Batch jobs are billed at a discount on the online token prices (half, on
+# all three at the time of writing; see price_ratio). mock_server.py emulates
+# the storage and job APIs, running each job through its lifecycle on the
+# clock, so the whole path can be exercised offline (see batch_benchmark.py).
+
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+from urllib.parse import urlparse
+
+from token_accounting import ESTIMATED, REPORTED, placeholder_tokens
+
+DEFAULT_POLL_INTERVAL = 10.0      # seconds before the first poll
+DEFAULT_MAX_POLL_INTERVAL = 120.0
+DEFAULT_TIMEOUT = 24 * 3600.0     # the providers' own completion window
+
+RECORDS_HEADER = ["Record", "Record ID", "Prompt Tokens", "Completion Tokens", "Token Source", "Cost", "Error", "Response"]
+
+
+class BatchTimeout(Exception):
+    # Raised when a job is still running at the timeout
+    pass
+
+
+class BatchBackend:
+    # One provider's batch API. The adapter from providers.py supplies the
+    # model, region, endpoint, generation settings and online prices.
+
+    # Share of the online token price charged for batch inference
+    price_ratio = 0.5
+
+    def __init__(self, provider, bucket=None, prefix="llm-benchmark-batch"):
+        self.provider = provider
+        self.bucket = bucket
+        self.prefix = prefix
+
+    @property
+    def model(self):
+        return self.provider.model
+
+    def connect(self):
+        # Import the SDKs and build the storage and job clients
+        raise NotImplementedError
+
+    def request(self, record_id, prompt):
+        # One line of the input file
+        raise NotImplementedError
+
+    def upload(self, path, name):
+        # Send the input file; returns where the job reads it from
+        raise NotImplementedError
+
+    def submit(self, source, name):
+        # Create the job; returns a dict the other calls identify it by
+        raise NotImplementedError
+
+    def status(self, job):
+        # ("queued" | "running" | "succeeded" | "failed", message or None)
+        raise NotImplementedError
+
+    def outputs(self, job):
+        # The job's output lines, read as a stream
+        raise NotImplementedError
+
+    def parse(self, line):
+        # (record id, text, prompt tokens, completion tokens, error) from one
+        # output line; tokens are None when the provider didn't report them
+        raise NotImplementedError
+
+    def cost(self, prompt_tokens, completion_tokens):
+        return self.provider.cost(prompt_tokens, completion_tokens) * self.price_ratio
+
+
+class BedrockBatch(BatchBackend):
+    # Bedrock ends every job in one of these, partially completed included
+    states = {
+        "Submitted": "queued", "Validating": "queued", "Scheduled": "queued",
+        "InProgress": "running", "Stopping": "running",
+        "Completed": "succeeded", "PartiallyCompleted": "succeeded",
+        "Failed": "failed", "Stopped": "failed", "Expired": "failed",
+    }
+
+    def connect(self):
+        import boto3
+        from botocore.config import Config
+
+        self.bucket = self.bucket or os.getenv("BEDROCK_BATCH_BUCKET")
+        if not self.bucket:
+            raise ValueError("BEDROCK_BATCH_BUCKET environment variable is not set.")
+        # The service role Bedrock reads the input and writes the output with
+        self.role_arn = os.getenv("BEDROCK_BATCH_ROLE_ARN")
+        if not self.role_arn:
+            raise ValueError("BEDROCK_BATCH_ROLE_ARN environment variable is not set.")
+
+        endpoint = self.provider.endpoint
+        self.s3 = boto3.client(
+            "s3", region_name=self.provider.region, endpoint_url=endpoint,
+            config=Config(s3={"addressing_style": "path"}) if endpoint else None
+        )
+        # Throttled polls are retried (and counted) by wait_for, not by botocore
+        self.client = boto3.client(
+            "bedrock", region_name=self.provider.region, endpoint_url=endpoint,
+            config=Config(retries={"mode": "standard", "total_max_attempts": 1})
+        )
+        self.provider.region = self.client.meta.region_name
+
+    def request(self, record_id, prompt):
+        return {
+            "recordId": record_id,
+            "modelInput": {
+                "prompt": prompt,
+                "max_gen_len": self.provider.max_tokens,
+                "temperature": self.provider.temperature,
+                "top_p": 0.9,
+            },
+        }
+
+    def upload(self, path, name):
+        from boto3.s3.transfer import TransferConfig
+
+        # Large files go up as parallel multipart uploads
+        key = f"{self.prefix}/{name}/input.jsonl"
+        self.s3.upload_file(
+            path, self.bucket, key,
+            Config=TransferConfig(multipart_threshold=16 * 1024 * 1024, multipart_chunksize=16 * 1024 * 1024, max_concurrency=8)
+        )
+        return f"s3://{self.bucket}/{key}"
+
+    def submit(self, source, name):
+        output = f"s3://{self.bucket}/{self.prefix}/{name}/output/"
+        response = self.client.create_model_invocation_job(
+            jobName=name, roleArn=self.role_arn, modelId=self.provider.model,
+            inputDataConfig={"s3InputDataConfig": {"s3Uri": source, "s3InputFormat": "JSONL"}},
+            outputDataConfig={"s3OutputDataConfig": {"s3Uri": output}}
+        )
+        return {"id": response["jobArn"], "source": source, "output": output}
+
+    def status(self, job):
+        response = self.client.get_model_invocation_job(jobIdentifier=job["id"])
+        return self.states.get(response["status"], "running"), response.get("message")
+
+    def outputs(self, job):
+        # <output>/<job id>/<input file name>.out
+        source = urlparse(job["source"])
+        output = urlparse(job["output"])
+        key = f"{output.path.strip('/')}/{job['id'].rsplit('/', 1)[-1]}/{os.path.basename(source.path)}.out"
+        body = self.s3.get_object(Bucket=output.netloc, Key=key)["Body"]
+        try:
+            yield from body.iter_lines()
+        finally:
+            body.close()
+
+    def parse(self, line):
+        item = json.loads(line)
+        output = item.get("modelOutput")
+        if not output:
+            error = item.get("error") or {}
+            return item.get("recordId"), "", None, None, error.get("errorMessage") or "No model output"
+        return (
+            item.get("recordId"), output.get("generation", ""), output.get("prompt_token_count"),
+            output.get("generation_token_count"), None
+        )
+
+
+class VertexBatch(BatchBackend):
+    # JobState names by stage
+    states = {
+        "JOB_STATE_QUEUED": "queued", "JOB_STATE_PENDING": "queued",
+        "JOB_STATE_RUNNING": "running", "JOB_STATE_CANCELLING": "running", "JOB_STATE_UPDATING": "running",
+        "JOB_STATE_SUCCEEDED": "succeeded", "JOB_STATE_PARTIALLY_SUCCEEDED": "succeeded",
+        "JOB_STATE_FAILED": "failed", "JOB_STATE_CANCELLED": "failed", "JOB_STATE_EXPIRED": "failed",
+    }
+
+    def connect(self):
+        import vertexai
+        from google.cloud import storage
+
+        project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
+        if not project_id:
+            raise ValueError("GOOGLE_CLOUD_PROJECT environment variable is not set.")
+        self.bucket = self.bucket or os.getenv("VERTEX_BATCH_BUCKET")
+        if not self.bucket:
+            raise ValueError("VERTEX_BATCH_BUCKET environment variable is not set.")
+
+        # A custom endpoint (e.g. the mock server) serves storage too, without credentials
+        endpoint = self.provider.endpoint or os.getenv("VERTEX_API_ENDPOINT")
+        if endpoint:
+            from google.auth.credentials import AnonymousCredentials
+
+            vertexai.init(project=project_id, location=self.provider.region, api_endpoint=endpoint, api_transport="rest")
+            self.storage = storage.Client(
+                project=project_id, credentials=AnonymousCredentials(), client_options={"api_endpoint": endpoint}
+            )
+        else:
+            vertexai.init(project=project_id, location=self.provider.region)
+            self.storage = storage.Client(project=project_id)
+
+    def request(self, record_id, prompt):
+        # Vertex keeps no record ID; the output echoes the request instead
+        return {
+            "request": {
+                "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+                "generationConfig": {
+                    "temperature": self.provider.temperature,
+                    "topP": 1,
+                    "maxOutputTokens": self.provider.max_tokens,
+                },
+            }
+        }
+
+    def upload(self, path, name):
+        # Files over 8 MB go up as resumable uploads
+        key = f"{self.prefix}/{name}/input.jsonl"
+        self.storage.bucket(self.bucket).blob(key).upload_from_filename(path, content_type="application/jsonl")
+        return f"gs://{self.bucket}/{key}"
+
+    def submit(self, source, name):
+        from vertexai.batch_prediction import BatchPredictionJob
+
+        job = BatchPredictionJob.submit(
+            source_model=f"publishers/meta/models/{self.provider.model}", input_dataset=source,
+            output_uri_prefix=f"gs://{self.bucket}/{self.prefix}/{name}/output"
+        )
+        return {"id": job.resource_name, "job": job}
+
+    def status(self, job):
+        job["job"].refresh()
+        error = getattr(job["job"], "error", None)
+        return self.states.get(job["job"].state.name, "running"), getattr(error, "message", None) or None
+
+    def outputs(self, job):
+        # Every predictions*.jsonl file in the job's output directory
+        directory = urlparse(job["job"].output_location)
+        for blob in self.storage.list_blobs(directory.netloc, prefix=directory.path.strip("/") + "/"):
+            if blob.name.endswith(".jsonl"):
+                with blob.open("rt", encoding="utf-8") as f:
+                    yield from f
+
+    def parse(self, line):
+        item = json.loads(line)
+        response = item.get("response")
+        if not response or item.get("status"):
+            return None, "", None, None, item.get("status") or "No response"
+        candidates = response.get("candidates") or [{}]
+        text = "".join(part.get("text", "") for part in candidates[0].get("content", {}).get("parts", []))
+        usage = response.get("usageMetadata") or {}
+        if not usage.get("totalTokenCount"):
+            return None, text, None, None, None
+        prompt_tokens = usage.get("promptTokenCount", 0)
+        completion_tokens = usage.get("candidatesTokenCount") or usage["totalTokenCount"] - prompt_tokens
+        return None, text, prompt_tokens, completion_tokens, None
+
+
+class AzureBatch(BatchBackend):
+    states = {
+        "validating": "queued",
+        "in_progress": "running", "finalizing": "running", "cancelling": "running",
+        "completed": "succeeded",
+        "failed": "failed", "expired": "failed", "cancelled": "failed",
+    }
+
+    @property
+    def model(self):
+        return self.deployment
+
+    def connect(self):
+        from openai import AzureOpenAI
+
+        # The batch API belongs to an Azure OpenAI / AI Foundry resource with a
+        # global batch deployment, not to the serverless Llama endpoint
+        endpoint = self.provider.endpoint or os.getenv("AZURE_BATCH_ENDPOINT")
+        if endpoint is None:
+            raise ValueError("AZURE_BATCH_ENDPOINT environment variable is not set.")
+        self.deployment = os.getenv("AZURE_BATCH_DEPLOYMENT") or self.provider.model or os.getenv("AZURE_LLAMAC3_MODEL_NAME")
+        if self.deployment is None:
+            raise ValueError("AZURE_BATCH_DEPLOYMENT environment variable is not set.")
+        api_key = os.getenv("AZURE_BATCH_API_KEY") or os.getenv("AZURE_LLAMAC3_API_KEY")
+        if api_key is None:
+            raise ValueError("AZURE_BATCH_API_KEY environment variable is not set.")
+        self.client = AzureOpenAI(azure_endpoint=endpoint, api_key=api_key, api_version="2024-10-21", max_retries=0)
+
+    def request(self, record_id, prompt):
+        return {
+            "custom_id": record_id,
+            "method": "POST",
+            "url": "/chat/completions",
+            "body": {
+                "model": self.deployment,
+                "messages": [
+                    {"role": "system", "content": "You are a helpful assistant."},
+                    {"role": "user", "content": prompt},
+                ],
+                "max_tokens": self.provider.max_tokens,
+                "temperature": self.provider.temperature,
+            },
+        }
+
+    def upload(self, path, name):
+        # The file is streamed up, then checked until the service has
+        # processed it, since a batch can't be created from a pending file
+        with open(path, "rb") as f:
+            uploaded = self.client.files.create(file=(f"{name}.jsonl", f), purpose="batch")
+        file_id = uploaded.id
+
+        def processed(job):
+            status = self.client.files.retrieve(file_id).status
+            if status == "error":
+                return "failed", f"File {file_id} was rejected."
+            return ("succeeded" if status == "processed" else "queued"), None
+
+        wait_for(processed, {"id": file_id}, 1.0, 10.0, DEFAULT_TIMEOUT, self.provider)
+        return file_id
+
+    def submit(self, source, name):
+        batch = self.client.batches.create(input_file_id=source, endpoint="/chat/completions", completion_window="24h")
+        return {"id": batch.id, "files": []}
+
+    def status(self, job):
+        batch = self.client.batches.retrieve(job["id"])
+        job["files"] = [file_id for file_id in (batch.output_file_id, batch.error_file_id) if file_id]
+        errors = getattr(batch.errors, "data", None) or []
+        return self.states.get(batch.status, "running"), errors[0].message if errors else None
+
+    def outputs(self, job):
+        # Successful requests are in the output file, failed ones in the error file
+        for file_id in job["files"]:
+            with self.client.files.with_streaming_response.content(file_id) as response:
+                yield from response.iter_lines()
+
+    def parse(self, line):
+        item = json.loads(line)
+        response = item.get("response") or {}
+        body = response.get("body") or {}
+        if item.get("error") or response.get("status_code") != 200:
+            error = item.get("error") or body.get("error") or {}
+            return item.get("custom_id"), "", None, None, error.get("message") or f"Status {response.get('status_code')}"
+        text = body["choices"][0]["message"]["content"]
+        usage = body.get("usage") or {}
+        if not usage.get("total_tokens"):
+            return item.get("custom_id"), text, None, None, None
+        return item.get("custom_id"), text, usage.get("prompt_tokens"), usage.get("completion_tokens"), None
+
+
+# Batch backends by provider key
+BATCH_BACKENDS = {
+    "gcp": VertexBatch,
+    "aws": BedrockBatch,
+    "azure": AzureBatch,
+}
+
+
+def wait_for(status, job, interval, max_interval, timeout, provider):
+    # Call status(job) until it reports "succeeded" or "failed", sleeping
+    # between calls from `interval` up to `max_interval` (1.5x per call, with
+    # jitter). A throttled call waits the provider's Retry-After, or the
+    # current interval, and counts toward the throttles returned. Returns
+    # (final state, message, time first seen out of the queue, throttles).
+    started = time.monotonic()
+    running = None
+    throttles = 0
+    while True:
+        try:
+            state, message = status(job)
+        except Exception as e:
+            if not provider.is_throttled(e):
+                raise
+            throttles += 1
+            state, message = None, None
+            wait = provider.retry_after(e)
+            if wait is not None:
+                interval = max(interval, wait)
+        if state in ("running", "succeeded", "failed") and running is None:
+            running = time.monotonic()
+        if state in ("succeeded", "failed"):
+            return state, message, running, throttles
+        if time.monotonic() - started + interval > timeout:
+            raise BatchTimeout(f"Job {job['id']} is still {state or 'unknown'} after {timeout:g}s")
+        time.sleep(interval * random.uniform(0.9, 1.1))
+        interval = min(max_interval, interval * 1.5)
+
+
+def package(backend, prompts, path):
+    # Write one request per prompt to `path`; returns the number of records
+    records = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for index, prompt in enumerate(prompts):
+            f.write(json.dumps(backend.request(f"{index:09d}", prompt), separators=(",", ":")))
+            f.write("\n")
+            records += 1
+    return records
+
+
+def ingest(backend, job, records_csv):
+    # Stream the job's output into `records_csv`; returns the totals
+    totals = {"succeeded": 0, "failed": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0, "estimated": 0}
+    with open(records_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(RECORDS_HEADER)
+        for number, line in enumerate(backend.outputs(job), start=1):
+            if not line.strip():
+                continue
+            record_id, text, prompt_tokens, completion_tokens, error = backend.parse(line)
+            source = REPORTED
+            if error is None and completion_tokens is None:
+                # Without usage figures, a rough count; the cost follows it
+                prompt_tokens, completion_tokens, source = 0, placeholder_tokens(text), ESTIMATED
+                totals["estimated"] += 1
+            cost = backend.cost(prompt_tokens, completion_tokens) if error is None else 0.0
+            if error is None:
+                totals["succeeded"] += 1
+                totals["prompt_tokens"] += prompt_tokens
+                totals["completion_tokens"] += completion_tokens
+                totals["cost"] += cost
+            else:
+                totals["failed"] += 1
+            writer.writerow([
+                number, record_id or "", "" if error else prompt_tokens, "" if error else completion_tokens,
+                "" if error else source, f"{cost:.6f}", error or "", text,
+            ])
+    return totals
+
+
+def run_batch(backend, prompts, name, records_csv, poll_interval=DEFAULT_POLL_INTERVAL,
+              max_poll_interval=DEFAULT_MAX_POLL_INTERVAL, timeout=DEFAULT_TIMEOUT):
+    # Package, upload, submit, wait for and ingest one job of `prompts` (any
+    # iterable of strings). Returns the stage times in seconds, the job's
+    # state and the totals from ingest(); records missing from the output of
+    # a job that succeeded count as failed.
+    times = {}
+    start = time.monotonic()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "input.jsonl")
+        records = package(backend, prompts, path)
+        times["package"] = time.monotonic() - start
+        mark = time.monotonic()
+        source = backend.upload(path, name)
+        times["upload"] = time.monotonic() - mark
+    mark = time.monotonic()
+    job = backend.submit(source, name)
+    submitted = time.monotonic()
+    times["submit"] = submitted - mark
+    print(f"{backend.provider.name}: submitted {records} records as {job['id']}")
+
+    state, message, running, throttles = wait_for(
+        backend.status, job, poll_interval, max_poll_interval, timeout, backend.provider
+    )
+    ended = time.monotonic()
+    times["queued"] = (running or ended) - submitted
+    times["running"] = ended - (running or ended)
+
+    totals = {"succeeded": 0, "failed": records, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0, "estimated": 0}
+    if state == "succeeded":
+        totals = ingest(backend, job, records_csv)
+        totals["failed"] = records - totals["succeeded"]
+    times["ingest"] = time.monotonic() - ended
+    times["total"] = time.monotonic() - start
+    return {
+        "job": job["id"], "state": state, "message": message, "records": records, "poll_throttles": throttles,
+        "times": times, **totals,
+    }
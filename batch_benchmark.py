@@ -0,0 +1,129 @@
+import argparse
+import csv
+import datetime
+import itertools
+import json
+
+from batch import BATCH_BACKENDS, DEFAULT_MAX_POLL_INTERVAL, DEFAULT_POLL_INTERVAL, DEFAULT_TIMEOUT, run_batch
+from providers import DEFAULT_QUESTION, PROVIDERS, get_provider
+from results_store import DEFAULT_STORE, query_totals
+
+# Runs one batch job per provider over the same prompt set and reports what
+# offline workloads care about: end-to-end job time, records and output
+# tokens per second, and the effective cost, next to the online numbers for
+# the same provider and model from the results store (mean response time and
+# cost per 1K output tokens over recent blocking runs, and how long the same
+# records would take online at --online-concurrency).
+#
+#     python batch_benchmark.py --prompts prompts.jsonl --providers aws,gcp
+#     python batch_benchmark.py --mock --records 500 --poll-interval 0.5
+#
+# --prompts is a text file with one prompt per line, or a JSONL file with a
+# "prompt" field per line. Without it, --question is sent --records times.
+# Every record's output goes to batch_<key>_records.csv.
+
+parser = argparse.ArgumentParser(description="Benchmark batch inference jobs on the Llama providers.")
+parser.add_argument("--question", type=str, default=DEFAULT_QUESTION, help="The question to send when there is no --prompts file.")
+parser.add_argument("--prompts", type=str, default=None, help="Prompt set: a text file with one prompt per line, or JSONL with a \"prompt\" field.")
+parser.add_argument("--records", type=int, default=100, help="Records to send: copies of --question, or the first N prompts of --prompts.")
+parser.add_argument("--providers", type=str, default=",".join(PROVIDERS), help="Comma-separated providers to run a job on (gcp, aws, azure).")
+parser.add_argument("--bucket", type=str, default=None, help="S3 or Cloud Storage bucket for the input and output files (defaults to BEDROCK_BATCH_BUCKET / VERTEX_BATCH_BUCKET).")
+parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="Seconds before the first status poll; later polls back off from it.")
+parser.add_argument("--max-poll-interval", type=float, default=DEFAULT_MAX_POLL_INTERVAL, help="Longest wait between status polls.")
+parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Give up on a job after this many seconds.")
+parser.add_argument("--store", type=str, default=DEFAULT_STORE, help="Results store the online numbers are read from.")
+parser.add_argument("--online-days", type=float, default=30.0, help="Compare with online runs from the last N days.")
+parser.add_argument("--online-concurrency", type=int, default=8, help="Concurrency the online time estimate assumes.")
+parser.add_argument("--mock", action="store_true", help="Point every provider at a local mock_server.py instead of the real endpoints.")
+parser.add_argument("--summary-csv", type=str, default="batch_summary.csv", help="The CSV filename to write the comparison to.")
+args = parser.parse_args()
+
+mock_url = None
+if args.mock:
+    from mock_server import start_mock_server, use_mock_credentials
+
+    mock_url = start_mock_server().url
+    use_mock_credentials()
+    print(f"Using mock inference server at {mock_url}")
+
+
+def read_prompts():
+    # The prompt set, one prompt at a time
+    if args.prompts is None:
+        yield from itertools.repeat(args.question, args.records)
+        return
+    with open(args.prompts, encoding="utf-8") as f:
+        lines = (line.rstrip("\n") for line in f if line.strip())
+        for line in itertools.islice(lines, args.records):
+            yield json.loads(line)["prompt"] if args.prompts.endswith(".jsonl") else line
+
+
+def online_numbers(provider):
+    # Online totals for the provider and model, or None without any runs
+    since = (datetime.datetime.utcnow() - datetime.timedelta(days=args.online_days)).isoformat() + "Z"
+    totals = query_totals(args.store, provider=provider.key, model=provider.model, mode="blocking", since=since)
+    return totals if totals["runs"] else None
+
+
+def per_thousand(cost, tokens):
+    return cost / tokens * 1000 if tokens else None
+
+
+def column(value, decimals):
+    return "" if value is None else f"{value:.{decimals}f}"
+
+
+started = datetime.datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+rows = []
+for key in args.providers.split(","):
+    key = key.strip()
+    provider = get_provider(key, args.question, endpoint=mock_url)
+    backend = BATCH_BACKENDS[key](provider, bucket=args.bucket)
+    try:
+        backend.connect()
+    except Exception as e:
+        print(f"Skipping {provider.name}: {e}")
+        continue
+
+    print(f"\n=== {provider.name} batch ===\n")
+    records_csv = f"batch_{key}_records.csv"
+    result = run_batch(
+        backend, read_prompts(), f"llm-benchmark-{key}-{started}", records_csv, poll_interval=args.poll_interval,
+        max_poll_interval=args.max_poll_interval, timeout=args.timeout
+    )
+    times = result["times"]
+    print(
+        f"{provider.name}: job {result['state']}{': ' + result['message'] if result['message'] else ''}; "
+        f"{result['succeeded']}/{result['records']} records in {times['total']:.1f}s "
+        f"(package {times['package']:.1f}s, upload {times['upload']:.1f}s, queued {times['queued']:.1f}s, "
+        f"running {times['running']:.1f}s, ingest {times['ingest']:.1f}s), cost ${result['cost']:.4f}"
+    )
+    if result["state"] == "succeeded":
+        print(f"Record outputs written to {records_csv}")
+
+    batch_per_1k = per_thousand(result["cost"], result["completion_tokens"])
+    online = online_numbers(provider)
+    online_mean = online["response_time"] / online["runs"] if online else None
+    online_per_1k = per_thousand(online["cost"], online["completion_tokens"]) if online else None
+    rows.append([
+        provider.name, backend.model, result["job"], result["state"], result["records"], result["succeeded"],
+        result["failed"], *(f"{times[stage]:.3f}" for stage in ("package", "upload", "submit", "queued", "running", "ingest", "total")),
+        f"{result['succeeded'] / times['total']:.3f}", f"{result['completion_tokens'] / times['total']:.1f}",
+        result["poll_throttles"], f"{result['cost']:.6f}", column(batch_per_1k, 6),
+        online["runs"] if online else "", column(online_mean, 3), column(online_per_1k, 6),
+        column(result["records"] * online_mean / args.online_concurrency if online else None, 1),
+        f"{1 - batch_per_1k / online_per_1k:.1%}" if batch_per_1k is not None and online_per_1k else "",
+    ])
+
+with open(args.summary_csv, mode="w", newline="", encoding="utf-8") as f:
+    writer = csv.writer(f)
+    writer.writerow([
+        "Provider", "Model", "Job", "State", "Records", "Succeeded", "Failed", "Package (s)", "Upload (s)", "Submit (s)",
+        "Queued (s)", "Running (s)", "Ingest (s)", "End-to-End (s)", "Records/s", "Output Tokens/s", "Poll Throttles",
+        "Batch Cost (USD)", "Batch Cost per 1K Output Tokens (USD)", "Online Runs", "Online Mean Response Time (s)",
+        "Online Cost per 1K Output Tokens (USD)", f"Online Time at Concurrency {args.online_concurrency} (s)",
+        "Batch Saving per Token",
+    ])
+    writer.writerows(rows)
+
+print(f"\nBatch comparison written to {args.summary_csv}")
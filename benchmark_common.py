@@ -0,0 +1,859 @@
+# benchmark_common.py
+# Shared helpers for the provider demo scripts: the request loop (sequential or
+# concurrent), per-run console output, and the results CSV with its statistics.
+
+import csv
+import datetime
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import live_metrics
+import net_timing
+from rate_limit import DEFAULT_MAX_RETRIES, RETRY_FIELDS, Scheduler, limit_for, parse_limits
+from results_log import ResultsLog, completed_runs, log_filename, read_log, series_wall_time
+from results_store import DEFAULT_STORE, add_benchmark
+from benchmark_stats import percentile, relative_ci_width, summarize_results
+from recording import Recorder, recording_filename
+from token_accounting import REPORTED, finalize_log, get_tokenizer
+
+# Column layout of the per-provider results CSV
+CSV_HEADER = [
+    "Run", "Phase", "Response Time (s)", "Prompt Tokens", "Completion Tokens", "Total Tokens",
+    "Characters", "Words", "Cost (USD)", "Region", "Timestamp (GMT)",
+    "TTFT (s)", "Mean Chunk Gap (s)", "P50 Chunk Gap (s)", "P95 Chunk Gap (s)", "Max Chunk Gap (s)",
+    "Decode Tokens/s", "Client Setup (s)", "Client Prep (s)", "DNS (s)", "Connect (s)", "TLS (s)", "Upload (s)",
+    "Server (s)", "Download (s)", "New Connections", "Throttles", "Retry Time (s)", "Queue Time (s)", "Schedule Delay (s)", "Token Source", "Error", "Response"
+]
+
+# Streaming metrics recorded per run, in the same order as their CSV columns
+STREAM_FIELDS = ["ttft", "mean_gap", "p50_gap", "p95_gap", "max_gap", "decode_tokens_per_s"]
+
+# Network phases recorded per run with --net-timing (see net_timing.py)
+NETWORK_FIELDS = net_timing.PHASES + ["new_connections"]
+
+# Successful runs needed before an adaptive run starts checking its target,
+# since a bootstrap interval from a handful of samples is itself unreliable
+MIN_ADAPTIVE_RUNS = 10
+
+# Arrival processes for open-loop load (--arrival-rate)
+ARRIVALS = ["poisson", "fixed"]
+
+# Threads available to an open-loop load: requests beyond this many in flight
+# wait for a thread, and that wait counts in their corrected latency
+DEFAULT_MAX_IN_FLIGHT = 256
+
+
+def add_load_arguments(parser):
+    # Command-line options shared by every provider script
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Number of requests to send (ignored when --duration or --target-ci-width is set)."
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of requests to keep in flight at the same time."
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=None,
+        help="Keep sending requests for this many seconds instead of a fixed number of runs."
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Use the provider's streaming API and record time-to-first-token and chunk gaps."
+    )
+    parser.add_argument(
+        "--net-timing",
+        action="store_true",
+        help="Record DNS, connect, TLS, upload, server and download time separately for every run."
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=1,
+        help="Requests sent before the measured runs and left out of the statistics."
+    )
+    parser.add_argument(
+        "--cold",
+        action="store_true",
+        help="Also measure a cold series, with a new client and connection for every request."
+    )
+    parser.add_argument(
+        "--rpm",
+        type=str,
+        default=None,
+        help="Requests per minute to stay under (the provider's quota)."
+    )
+    parser.add_argument(
+        "--tpm",
+        type=str,
+        default=None,
+        help="Tokens per minute to stay under (the provider's quota)."
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help="Times to retry a throttled request (after Retry-After or exponential backoff)."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted benchmark from its results log, skipping the runs it already completed."
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default=DEFAULT_STORE,
+        help="SQLite results store to add the runs to (see results_store.py); an empty string skips it."
+    )
+    parser.add_argument(
+        "--target-ci-width",
+        type=float,
+        default=None,
+        help="Keep sampling until the 95%% CI of the target percentile latency is this narrow, relative to "
+             "the percentile (e.g. 0.05 for 5%%), or a budget runs out."
+    )
+    parser.add_argument(
+        "--target-percentile",
+        type=int,
+        choices=[50, 90],
+        default=50,
+        help="Latency percentile whose CI --target-ci-width applies to."
+    )
+    parser.add_argument(
+        "--max-runs",
+        type=int,
+        default=200,
+        help="Most requests to send when sampling adaptively (--target-ci-width)."
+    )
+    parser.add_argument(
+        "--max-cost",
+        type=float,
+        default=None,
+        help="Stop sending requests once their estimated cost reaches this many USD."
+    )
+    parser.add_argument(
+        "--arrival-rate",
+        type=float,
+        default=None,
+        help="Open loop: send this many requests per second on schedule, however many are still in flight "
+             "(replaces --concurrency)."
+    )
+    parser.add_argument(
+        "--arrival",
+        type=str,
+        choices=ARRIVALS,
+        default="poisson",
+        help="Spacing of open-loop requests: Poisson (random, like independent users) or fixed intervals."
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=DEFAULT_MAX_IN_FLIGHT,
+        help="Most open-loop requests in flight at once; later ones wait, and the wait counts in their latency."
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Print every response in full (text and raw payload) instead of one line per run."
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve live latency, TTFT and throughput histograms on http://127.0.0.1:PORT/metrics (Prometheus/OpenMetrics)."
+    )
+    parser.add_argument(
+        "--dashboard",
+        action="store_true",
+        help="Show a live table of every provider's progress and percentiles in place of the per-run output."
+    )
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="Also save every raw response and its timing to <csv>_recording.jsonl.gz, for replay (see recording.py)."
+    )
+
+
+def load_options(args, key=None):
+    # run_provider() keyword arguments from the options added by add_load_arguments.
+    # `key` picks the provider's own --rpm/--tpm when given as "aws=60,azure=120".
+    return {
+        "num_runs": args.max_runs if args.target_ci_width else args.runs,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "stream": args.stream,
+        "warmup": args.warmup,
+        "cold": args.cold,
+        "target_ci_width": args.target_ci_width,
+        "target_percentile": args.target_percentile,
+        "max_cost": args.max_cost,
+        "rpm": limit_for(parse_limits(args.rpm), key),
+        "tpm": limit_for(parse_limits(args.tpm), key),
+        "max_retries": args.max_retries,
+        "resume": args.resume,
+        "store": args.store,
+        "arrival_rate": args.arrival_rate,
+        "arrival": args.arrival,
+        "max_in_flight": args.max_in_flight,
+        "recording": args.record,
+        "verbose": args.verbose,
+        "metrics_port": args.metrics_port,
+        "dashboard": args.dashboard,
+    }
+
+
+class StoppingRule:
+    # Decides when a series has enough samples: once the bootstrap CI of the
+    # target latency percentile is narrower than target_ci_width (relative to
+    # the percentile), or once the spend reaches max_cost. Either may be None.
+    # run_load() calls it with each completed result; it keeps only the
+    # latencies and the running cost.
+
+    def __init__(self, target_ci_width=None, target_percentile=50, max_cost=None):
+        self.target_ci_width = target_ci_width
+        self.target_percentile = target_percentile
+        self.max_cost = max_cost
+        self.reason = None
+        self.ci_width = None
+        self.samples = 0
+        self.cost = 0.0
+        self.latencies = []
+        self._checked_at = 0
+
+    def __call__(self, result):
+        self.samples += 1
+        self.cost += result["cost"]
+        if not result["error"]:
+            self.latencies.append(result["response_time"])
+        if self.max_cost is not None and self.cost >= self.max_cost:
+            self.reason = "max_cost"
+            return True
+        if self.target_ci_width is None:
+            return False
+        # Bootstrapping gets slower as samples pile up, so re-check only after
+        # the sample count has grown by 10%
+        if len(self.latencies) < max(MIN_ADAPTIVE_RUNS, self._checked_at * 1.1):
+            return False
+        self._checked_at = len(self.latencies)
+        self.ci_width = relative_ci_width(self.latencies, self.target_percentile)
+        if self.ci_width <= self.target_ci_width:
+            self.reason = "target"
+            return True
+        return False
+
+    def report(self):
+        # Fields added to the series' statistics
+        report = {"samples": self.samples, "max_cost": self.max_cost}
+        if self.target_ci_width is not None:
+            self.ci_width = relative_ci_width(self.latencies, self.target_percentile)
+            report.update({
+                "target_ci_width": self.target_ci_width,
+                "target_percentile": self.target_percentile,
+                "ci_width": self.ci_width if self.ci_width != float("inf") else None,
+                "target_met": self.ci_width <= self.target_ci_width,
+            })
+        # Runs out of requests (or time) if neither the target nor the cost budget stopped it
+        report["stop_reason"] = self.reason or "budget"
+        return report
+
+
+def utc_timestamp():
+    return datetime.datetime.utcnow().isoformat() + "Z"
+
+
+def stream_metrics(start_time, chunk_times, end_time, completion_tokens):
+    # Streaming metrics for one run from the perf_counter() times at which the
+    # request was sent, each content chunk arrived and the stream finished
+    if not chunk_times:
+        return dict.fromkeys(STREAM_FIELDS, 0.0)
+    ttft = chunk_times[0] - start_time
+    gaps = [later - earlier for earlier, later in zip(chunk_times, chunk_times[1:])]
+    decode_time = end_time - chunk_times[0]
+    return {
+        "ttft": ttft,
+        "mean_gap": sum(gaps) / len(gaps) if gaps else 0.0,
+        "p50_gap": percentile(gaps, 50),
+        "p95_gap": percentile(gaps, 95),
+        "max_gap": max(gaps) if gaps else 0.0,
+        # The first token is part of TTFT, so the decode rate covers the rest
+        "decode_tokens_per_s": (completion_tokens - 1) / decode_time if decode_time > 0 and completion_tokens > 1 else 0.0,
+    }
+
+
+def make_result(response_time, prompt_tokens, completion_tokens, total_tokens, cost, response, error=None, stream=None,
+                token_source=REPORTED):
+    # One run's metrics, in the shape every provider script returns.
+    # `stream` holds the stream_metrics() of a streaming run; `network` is
+    # filled in by run_provider with the net_timing phases. `token_source`
+    # says whether the token counts (and so the cost) are the provider's own
+    # or still to be counted (see token_accounting.py).
+    return {
+        "response_time": response_time,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": total_tokens,
+        "cost": cost,
+        "response": response or "",
+        "timestamp": utc_timestamp(),
+        "error": error,
+        "token_source": token_source,
+        "stream": stream,
+        "network": None,
+        # "warmup", "warm" (steady state) or "cold"; set by run_provider
+        "phase": "warm",
+        # Seconds spent building a fresh client, for cold runs
+        "client_setup": None,
+        # Throttled attempts before this one, the time they and their backoff
+        # took, and the time spent waiting for the rate budget (rate_limit.py)
+        "throttles": 0,
+        "retry_time": 0.0,
+        "queue_time": 0.0,
+        # Open-loop runs only: seconds between the request's place in the
+        # arrival schedule and the moment it was actually sent
+        "schedule_delay": None,
+    }
+
+
+def print_run(run, result, label=None, verbose=False):
+    # One line per run; `verbose` prints the response text and every metric.
+    # Build the whole block first so concurrent runs don't interleave line by line
+    resp_text = result["response"]
+    if not verbose:
+        line = f"Run {run + 1}: {result['response_time']:.2f}s, {result['completion_tokens']} tokens"
+        if result["stream"]:
+            line += f", TTFT {result['stream']['ttft']:.3f}s, {result['stream']['decode_tokens_per_s']:.1f} tokens/s"
+        print(f"[{label}] {line}" if label else line)
+        return
+    lines = [
+        f"[{label}] Run {run + 1}:" if label else f"Run {run + 1}:",
+        resp_text,
+        f"Response time: {result['response_time']:.2f} seconds",
+        f"Prompt tokens: {result['prompt_tokens']}",
+        f"Completion tokens: {result['completion_tokens']}",
+        f"Total tokens: {result['total_tokens']}",
+        f"Characters: {len(resp_text)}",
+        f"Words: {len(resp_text.split())}",
+        f"Estimated cost (USD): {result['cost']:.6f}",
+    ]
+    if result["stream"]:
+        lines += [
+            f"Time to first token: {result['stream']['ttft']:.3f} seconds",
+            f"Chunk gap mean/p95/max: {result['stream']['mean_gap']:.3f}/{result['stream']['p95_gap']:.3f}/{result['stream']['max_gap']:.3f} seconds",
+            f"Decode tokens/s: {result['stream']['decode_tokens_per_s']:.2f}",
+        ]
+    if result["network"]:
+        lines.append("Network: " + ", ".join(
+            f"{phase} {result['network'][phase]:.3f}s" for phase in net_timing.PHASES
+        ) + f", {result['network']['new_connections']} new connection(s)")
+    lines.append("-" * 40)
+    print("\n".join(lines))
+
+
+def _invoke_safely(invoke, run, label=None, verbose=False, quiet=False):
+    try:
+        result = invoke(run)
+    except Exception as e:
+        print(f"ERROR: {label + ' ' if label else ''}run {run + 1} failed. Reason: {e}")
+        result = make_result(0, 0, 0, 0, 0, "", error=f"{type(e).__name__}: {e}")
+        # Throttles and retry time up to the failure (set by rate_limit.Scheduler)
+        for field in RETRY_FIELDS:
+            result[field] = getattr(e, field, result[field])
+        return result
+    if not quiet:
+        print_run(run, result, label, verbose)
+    return result
+
+
+def run_load(invoke, num_runs=5, concurrency=1, duration=None, label=None, stop=None, record=None, skip=(),
+             arrival_rate=None, arrival="poisson", seed=None, verbose=False, quiet=False):
+    # Call invoke(run) for each run, keeping `concurrency` requests in flight.
+    # Each worker thread claims the next run number as soon as its previous
+    # request returns, until num_runs is reached or `duration` seconds pass.
+    # Run numbers in `skip` (already done by an earlier, resumed session) are
+    # passed over. Each result goes to record(run, result) as soon as it is
+    # complete rather than being kept here. `stop(result)`, if given, is called
+    # after each completed run and ends the load early by returning True;
+    # requests already in flight still finish, as they do on Ctrl-C. Returns
+    # the wall-clock time of the whole load. `label` prefixes the console
+    # output when several providers run at once. With `arrival_rate` the load
+    # is open-loop instead (see run_open_loop), with up to `concurrency`
+    # requests in flight. Each run prints a line, its full response with
+    # `verbose`, or nothing (except errors) when `quiet`.
+    if arrival_rate:
+        return run_open_loop(invoke, arrival_rate, arrival, num_runs, concurrency, duration, label, stop, record, skip,
+                             seed, verbose=verbose, quiet=quiet)
+    lock = threading.Lock()
+    next_run = [0]
+    stopped = [False]
+    deadline = time.monotonic() + duration if duration else None
+
+    def worker():
+        while True:
+            with lock:
+                while next_run[0] in skip:
+                    next_run[0] += 1
+                if stopped[0]:
+                    return
+                if deadline is not None:
+                    if time.monotonic() >= deadline:
+                        return
+                elif next_run[0] >= num_runs:
+                    return
+                run = next_run[0]
+                next_run[0] += 1
+            result = _invoke_safely(invoke, run, label, verbose, quiet)
+            with lock:
+                if record is not None:
+                    record(run, result)
+                if stop is not None and not stopped[0] and stop(result):
+                    stopped[0] = True
+
+    start_time = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        workers = [pool.submit(worker) for _ in range(max(1, concurrency))]
+        for future in workers:
+            future.result()
+    except KeyboardInterrupt:
+        # Let the requests in flight finish and be recorded, then stop
+        with lock:
+            stopped[0] = True
+        print(f"Interrupted{' ' + label if label else ''}: waiting for the requests in flight")
+        pool.shutdown(wait=True)
+        raise
+    finally:
+        pool.shutdown(wait=True)
+    return time.perf_counter() - start_time
+
+
+def arrival_times(rate, arrival="poisson", seed=None):
+    # Endless intended send times, in seconds from the start of the load: a
+    # Poisson process (exponential gaps) or evenly spaced at `rate` per second
+    rng = random.Random(seed)
+    t = 0.0
+    while True:
+        yield t
+        t += rng.expovariate(rate) if arrival == "poisson" else 1 / rate
+
+
+def run_open_loop(invoke, arrival_rate, arrival="poisson", num_runs=5, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                  duration=None, label=None, stop=None, record=None, skip=(), seed=None, verbose=False, quiet=False):
+    # Open-loop load: requests go out on an arrival schedule at arrival_rate
+    # per second whether or not earlier ones have returned, as real users'
+    # would. A closed loop waits for a response before sending the next
+    # request, so a slow response also delays the requests that should have
+    # gone out meanwhile and their latency is never measured (coordinated
+    # omission). Here every result carries schedule_delay, the time between
+    # its intended send time and the actual one (a late dispatcher or all
+    # `max_in_flight` threads busy), and the statistics add it back to give
+    # latency as measured from the intended send time. Stops after num_runs
+    # requests or once `duration` seconds of schedule have been sent; `skip`,
+    # `stop`, `record`, `verbose`, `quiet` and Ctrl-C behave as in run_load().
+    lock = threading.Lock()
+    stopped = [False]
+    start_time = time.perf_counter()
+
+    def request(run, intended):
+        delay = time.perf_counter() - intended
+        result = _invoke_safely(invoke, run, label, verbose, quiet)
+        result["schedule_delay"] = delay
+        with lock:
+            if record is not None:
+                record(run, result)
+            if stop is not None and not stopped[0] and stop(result):
+                stopped[0] = True
+
+    pool = ThreadPoolExecutor(max_workers=max(1, max_in_flight))
+    futures = []
+    try:
+        schedule = arrival_times(arrival_rate, arrival, seed)
+        for run, offset in enumerate(schedule):
+            if duration is not None:
+                if offset >= duration:
+                    break
+            elif run >= num_runs:
+                break
+            if run in skip:
+                continue
+            intended = start_time + offset
+            wait = intended - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            with lock:
+                if stopped[0]:
+                    break
+            futures.append(pool.submit(request, run, intended))
+        for future in futures:
+            future.result()
+    except KeyboardInterrupt:
+        # Send nothing more; let the requests in flight finish and be recorded
+        with lock:
+            stopped[0] = True
+        print(f"Interrupted{' ' + label if label else ''}: waiting for the requests in flight")
+        pool.shutdown(wait=True)
+        raise
+    finally:
+        pool.shutdown(wait=True)
+    return time.perf_counter() - start_time
+
+
+def stats_filename(csv_filename):
+    # The structured statistics live next to the per-run CSV
+    return os.path.splitext(csv_filename)[0] + "_stats.json"
+
+
+def _stream_columns(stream):
+    if not stream:
+        return [""] * len(STREAM_FIELDS)
+    return [f"{stream[field]:.3f}" if field != "decode_tokens_per_s" else f"{stream[field]:.2f}" for field in STREAM_FIELDS]
+
+
+def _network_columns(network):
+    if not network:
+        return [""] * len(NETWORK_FIELDS)
+    return [f"{network[phase]:.4f}" for phase in net_timing.PHASES] + [network["new_connections"]]
+
+
+def write_results_csv(csv_filename, log_path, region, concurrency, provider=None, model=None,
+                      sampling=None, cold_sampling=None, rate_limit=None, open_loop=None, tokenizer=None):
+    # Write one row per logged run to the CSV and the statistics to
+    # stats_filename(csv_filename), streaming over the results log. Failed
+    # runs keep their row, with the error and no metrics. The statistics cover
+    # the steady-state ("warm") runs; warm-up runs are only counted, and cold
+    # runs get their own statistics under "cold". `sampling` and
+    # `cold_sampling` are the StoppingRule reports of the two series, and
+    # `rate_limit` the scheduler's settings and `open_loop` the arrival
+    # schedule, if there was one. `tokenizer` names the tokenizer behind any
+    # estimated token counts.
+    last_timestamp = None
+    with open(csv_filename, mode="w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        # Write header row
+        writer.writerow(CSV_HEADER)
+        # Write each run's data
+        for result in read_log(log_path):
+            resp_text = result["response"]
+            if result["error"]:
+                metrics = [""] * 7
+            else:
+                metrics = [
+                    f"{result['response_time']:.2f}",
+                    result["prompt_tokens"],
+                    result["completion_tokens"],
+                    result["total_tokens"],
+                    len(resp_text),
+                    len(resp_text.split()),
+                    f"{result['cost']:.6f}",
+                ]
+            writer.writerow([
+                result["run"] + 1,
+                result["phase"],
+                *metrics,
+                region,
+                result["timestamp"],
+                *_stream_columns(result["stream"]),
+                f"{result['client_setup']:.4f}" if result["client_setup"] is not None else "",
+                *_network_columns(result["network"]),
+                result["throttles"],
+                f"{result['retry_time']:.3f}",
+                f"{result['queue_time']:.3f}",
+                f"{result['schedule_delay']:.3f}" if result.get("schedule_delay") is not None else "",
+                result.get("token_source", REPORTED),
+                result["error"] or "",
+                resp_text.replace('\n', ' ')
+            ])
+            last_timestamp = result["timestamp"]
+
+    stats = summarize_results(read_log(log_path, "warm"), series_wall_time(log_path, "warm"))
+    stats["warmup_runs"] = sum(1 for _ in read_log(log_path, "warmup"))
+    if sampling:
+        stats["sampling"] = sampling
+    cold_wall_time = series_wall_time(log_path, "cold")
+    if cold_wall_time is not None:
+        stats["cold"] = summarize_results(read_log(log_path, "cold"), cold_wall_time)
+        if cold_sampling:
+            stats["cold"]["sampling"] = cold_sampling
+    stats["provider"] = provider
+    stats["model"] = model
+    stats["region"] = region
+    stats["timestamp"] = last_timestamp or utc_timestamp()
+    stats["concurrency"] = concurrency
+    if rate_limit:
+        stats["rate_limit"] = rate_limit
+    if open_loop:
+        stats["open_loop"] = open_loop
+    if tokenizer:
+        stats["tokenizer"] = tokenizer
+    with open(stats_filename(csv_filename), mode="w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+
+    print(f"Results written to {csv_filename} and {stats_filename(csv_filename)}")
+    return stats
+
+
+def _print_latency(metrics):
+    latency = metrics["response_time"]
+    print(
+        f"Response time: mean {latency['mean']:.2f}s (95% CI {latency['ci_low']:.2f}-{latency['ci_high']:.2f}), "
+        f"stddev {latency['stddev']:.2f}s"
+    )
+    print(
+        f"Response time: min {latency['min']:.2f} / p50 {latency['p50']:.2f} / p90 {latency['p90']:.2f} / "
+        f"p95 {latency['p95']:.2f} / p99 {latency['p99']:.2f} / max {latency['max']:.2f} seconds"
+    )
+
+
+def _print_sampling(sampling):
+    if not sampling or "target_ci_width" not in sampling:
+        return
+    width = f"{sampling['ci_width']:.1%}" if sampling["ci_width"] is not None else "n/a"
+    print(
+        f"Adaptive sampling: {sampling['samples']} samples, p{sampling['target_percentile']} CI width {width} "
+        f"(target {sampling['target_ci_width']:.1%}, {'met' if sampling['target_met'] else 'not met'}, "
+        f"stopped by {sampling['stop_reason']})"
+    )
+
+
+def print_summary(stats):
+    # Print the main statistics to the console for quick reference
+    warmup = f", after {stats['warmup_runs']} warm-up" if stats.get("warmup_runs") else ""
+    print(f"Runs: {stats['runs']} ({stats['successes']} succeeded, {stats['errors']} failed{warmup})")
+    if not stats["successes"]:
+        return
+    metrics = stats["metrics"]
+    _print_latency(metrics)
+    print(f"Average prompt tokens: {metrics['prompt_tokens']['mean']:.2f}")
+    print(f"Average completion tokens: {metrics['completion_tokens']['mean']:.2f} (p50 {metrics['completion_tokens']['p50']:.0f})")
+    print(f"Average total tokens: {metrics['total_tokens']['mean']:.2f}")
+    print(f"Average cost: {metrics['cost']['mean']:.6f} (95% CI {metrics['cost']['ci_low']:.6f}-{metrics['cost']['ci_high']:.6f})")
+    estimated = stats["token_sources"].get("estimated", 0) + stats["token_sources"].get("pending", 0)
+    if estimated:
+        print(f"Token counts: {estimated} of {stats['runs']} runs estimated with {stats.get('tokenizer', 'placeholder counts')}, the rest provider-reported")
+    if "ttft" in metrics:
+        ttft = metrics["ttft"]
+        print(f"Time to first token: mean {ttft['mean']:.3f} / p50 {ttft['p50']:.3f} / p90 {ttft['p90']:.3f} / p99 {ttft['p99']:.3f} seconds")
+        print(f"Average chunk gap: {metrics['mean_gap']['mean']:.3f} seconds (p95 {metrics['p95_gap']['mean']:.3f})")
+        print(f"Average decode tokens/s: {metrics['decode_tokens_per_s']['mean']:.2f}")
+    if "server" in metrics:
+        print("Network time (mean / p90 seconds): " + ", ".join(
+            f"{phase} {metrics[phase]['mean']:.3f}/{metrics[phase]['p90']:.3f}" for phase in net_timing.PHASES
+        ))
+        print(f"New connections per run: {metrics['new_connections']['mean']:.2f}")
+    open_loop = stats.get("open_loop")
+    if open_loop:
+        print(
+            f"Open loop: {open_loop['arrival']} arrivals at {open_loop['arrival_rate']:.2f} requests/s "
+            f"(at most {open_loop['max_in_flight']} in flight), wall time: {stats['wall_time']:.2f} seconds"
+        )
+        delay = metrics["schedule_delay"]
+        corrected = metrics["corrected_response_time"]
+        print(f"Schedule delay: mean {delay['mean']:.3f} / p99 {delay['p99']:.3f} / max {delay['max']:.3f} seconds")
+        print(
+            f"Response time from intended send: p50 {corrected['p50']:.2f} / p90 {corrected['p90']:.2f} / "
+            f"p99 {corrected['p99']:.2f} / max {corrected['max']:.2f} seconds"
+        )
+        if "corrected_ttft" in metrics:
+            print(f"TTFT from intended send: p50 {metrics['corrected_ttft']['p50']:.3f} / p99 {metrics['corrected_ttft']['p99']:.3f} seconds")
+    else:
+        print(f"Concurrency: {stats['concurrency']}, wall time: {stats['wall_time']:.2f} seconds")
+    print(f"Throughput: {stats['requests_per_s']:.2f} requests/s, {stats['completion_tokens_per_s']:.2f} completion tokens/s")
+    if stats["throttles"]:
+        print(
+            f"Throttled: {stats['throttles']} attempts ({stats['throttle_rate']:.1%} of {stats['attempts']}), "
+            f"{stats['gave_up']} runs gave up; retries added {metrics['retry_time']['mean']:.2f}s per run on average "
+            f"(p90 {metrics['retry_time']['p90']:.2f}s)"
+        )
+    if metrics["queue_time"]["max"] > 0:
+        print(f"Waiting for the rate budget: mean {metrics['queue_time']['mean']:.2f}s, max {metrics['queue_time']['max']:.2f}s per run")
+    _print_sampling(stats.get("sampling"))
+
+    cold = stats.get("cold")
+    if cold:
+        print(f"Cold runs: {cold['runs']} ({cold['successes']} succeeded, {cold['errors']} failed)")
+        if cold["successes"]:
+            _print_latency(cold["metrics"])
+            print(f"Average client setup: {cold['metrics']['client_setup']['mean']:.3f} seconds")
+            if "ttft" in cold["metrics"]:
+                print(f"Cold time to first token: p50 {cold['metrics']['ttft']['p50']:.3f} seconds")
+        _print_sampling(cold.get("sampling"))
+
+
+def run_provider(provider, csv_filename, num_runs=5, concurrency=1, duration=None, stream=False, label=None,
+                 warmup=0, cold=False, target_ci_width=None, target_percentile=50, max_cost=None,
+                 rpm=None, tpm=None, max_retries=DEFAULT_MAX_RETRIES, resume=False, store=None,
+                 arrival_rate=None, arrival="poisson", max_in_flight=DEFAULT_MAX_IN_FLIGHT, recording=False,
+                 verbose=False, metrics_port=None, dashboard=False):
+    # Benchmark one connected providers.Provider adapter and write its results.
+    # `warmup` requests go first and stay out of the statistics; with `cold`, a
+    # second series sends every request from a new client (and so a new
+    # connection). With `target_ci_width`, each series stops as soon as its
+    # target_percentile latency is known that precisely (see StoppingRule), and
+    # num_runs is only the upper bound; `max_cost` caps each series' spend.
+    # All series share one rate_limit.Scheduler: at most `rpm` requests and
+    # `tpm` tokens per minute, and throttled requests retried up to
+    # `max_retries` times. Every result is appended to the results log as it
+    # completes; with `resume`, runs already in the log are skipped. At the
+    # end the log is copied into the `store` database (results_store.py), if
+    # given. With `arrival_rate` the warm and cold series are open-loop
+    # (run_open_loop): `arrival` requests per second, up to `max_in_flight`
+    # at once, in place of `concurrency`. With `recording`, the raw responses
+    # and their timing are saved for replay (recording.py). Every result also
+    # goes to the live_metrics histograms, served on `metrics_port` and/or
+    # shown on a `dashboard` (which replaces the per-run lines); `verbose`
+    # prints every response and raw payload in full. Returns the statistics
+    # written next to the CSV.
+    if provider.net_timing:
+        net_timing.install()
+    provider.verbose = verbose
+    scheduler = Scheduler(provider.is_throttled, provider.retry_after, rpm=rpm, tpm=tpm, max_retries=max_retries)
+
+    def traced(invoke, run):
+        if not provider.net_timing:
+            return invoke(run)
+        with net_timing.trace() as trace:
+            result = invoke(run)
+        result["network"] = trace.phases()
+        return result
+
+    def call(client_provider, run):
+        # Network timing covers the successful attempt, like response_time
+        invoke = client_provider.invoke_stream if stream else client_provider.invoke
+        return scheduler.call(lambda attempt_run: traced(invoke, attempt_run), run)
+
+    def warm_invoke(run):
+        return call(provider, run)
+
+    def cold_invoke(run):
+        fresh = provider.fresh_copy()
+        setup_start = time.perf_counter()
+        fresh.connect()
+        setup_time = time.perf_counter() - setup_start
+        if recorder:
+            recorder.attach(fresh)
+        try:
+            result = call(fresh, run)
+        finally:
+            fresh.close()
+        result["client_setup"] = setup_time
+        return result
+
+    log_path = log_filename(csv_filename)
+    log = ResultsLog(log_path, resume=resume)
+    recorder = None
+    client = provider.client
+    if recording and not provider.recorded_calls:
+        print(f"Warning: {provider.name} can't be recorded; running without --record")
+    elif recording:
+        recorder = Recorder(
+            recording_filename(csv_filename), provider, "stream" if stream else "blocking", concurrency, resume=resume
+        )
+        recorder.attach(provider)
+
+    def run_series(phase, invoke, runs, series_concurrency, series_duration=None, stop=None):
+        # One phase's load, logged as it goes. Runs from an earlier session
+        # are skipped (and fed to the stopping rule, which counts them too).
+        done = completed_runs(log_path, phase) if resume else set()
+        if phase == "warmup":
+            # Warm-up is about this session's connections, so it is always
+            # repeated, under new run numbers
+            first = max(done, default=-1) + 1
+            done, runs = set(range(first)), first + runs
+        elif done:
+            print(f"Resuming {provider.name} {phase}: {len(done)} run(s) already in {log_path}")
+            if stop is not None:
+                for result in read_log(log_path, phase):
+                    stop(result)
+
+        def record(run, result):
+            result["phase"] = phase
+            log.append(phase, run, result)
+            if recorder:
+                recorder.add(phase, run, result)
+            if phase != "warmup":
+                live_metrics.REGISTRY.observe(provider.key, provider.region, phase, result, model=provider.model, target=label)
+
+        series_label = label if phase == "warm" else " ".join(part for part in (label, phase) if part)
+        start_time = time.perf_counter()
+        try:
+            if stop is None or not stop.reason:
+                # Warm-up is never open-loop: it only has to open connections
+                rate = arrival_rate if phase != "warmup" else None
+                run_load(invoke, num_runs=runs, concurrency=max_in_flight if rate else series_concurrency,
+                         duration=series_duration, label=series_label, stop=stop, record=record, skip=done,
+                         arrival_rate=rate, arrival=arrival, verbose=verbose, quiet=dashboard)
+        finally:
+            # Logged even when interrupted, so a resumed run's throughput adds up
+            wall_time = time.perf_counter() - start_time
+            log.end_series(phase, wall_time)
+            if recorder:
+                recorder.end_series(phase, wall_time)
+
+    adaptive = target_ci_width is not None or max_cost is not None
+
+    def stopping_rule():
+        return StoppingRule(target_ci_width, target_percentile, max_cost) if adaptive else None
+
+    rule = stopping_rule()
+    cold_rule = stopping_rule() if cold else None
+    live_metrics.start(metrics_port, dashboard)
+    try:
+        if warmup > 0:
+            print(f"Warming up {provider.name} with {warmup} request(s)")
+            run_series("warmup", warm_invoke, warmup, min(concurrency, warmup))
+        run_series("warm", warm_invoke, num_runs, concurrency, duration, stop=rule)
+        if cold:
+            run_series("cold", cold_invoke, num_runs, concurrency, duration, stop=cold_rule)
+    finally:
+        live_metrics.release()
+        log.close()
+        if recorder:
+            recorder.close()
+            provider.client = client
+            print(f"Responses recorded to {recorder.path}")
+
+    return finish_benchmark(
+        provider, csv_filename, log_path, concurrency, stream, store,
+        sampling=rule.report() if rule else None,
+        cold_sampling=cold_rule.report() if cold_rule else None,
+        rate_limit={"rpm": rpm, "tpm": tpm, "max_retries": max_retries},
+        open_loop={"arrival_rate": arrival_rate, "arrival": arrival, "max_in_flight": max_in_flight} if arrival_rate else None,
+    )
+
+
+def finish_benchmark(provider, csv_filename, log_path, concurrency, stream, store=None, **csv_options):
+    # Turn a complete results log into the benchmark's outputs: token counts,
+    # the CSV and statistics (write_results_csv, given `csv_options`) and the
+    # results store. Returns the statistics.
+
+    # Token counts the provider didn't report, counted now that the timing is done
+    try:
+        estimated = finalize_log(log_path, provider.prompt, provider.cost)
+    except ImportError as e:
+        print(f"Warning: no tokenizer ({e}); runs without reported usage keep rough placeholder token counts")
+        estimated = 0
+    if estimated:
+        print(f"Counted tokens for {estimated} {provider.name} run(s) the provider reported no usage for")
+
+    stats = write_results_csv(
+        csv_filename, log_path, provider.region, concurrency, provider=provider.name, model=provider.model,
+        tokenizer=get_tokenizer().name if estimated else None, **csv_options
+    )
+    if store:
+        add_benchmark(
+            store, log_path, provider.key, provider.model, provider.region, provider.prompt,
+            "stream" if stream else "blocking", concurrency
+        )
+        print(f"Results added to {store}")
+    return stats
@@ -0,0 +1,236 @@
+# benchmark_stats.py
+# Summary statistics for benchmark runs: percentiles, spread and bootstrap
+# confidence intervals. Failed runs are counted separately and never mixed
+# into the latency, token or cost figures.
+
+import math
+import random
+import statistics
+
+# Percentiles reported for every metric
+PERCENTILES = [50, 90, 95, 99]
+
+# Per-run numeric metrics summarized for each provider
+RESULT_METRICS = ["response_time", "prompt_tokens", "completion_tokens", "total_tokens", "characters", "words", "cost"]
+
+# Streaming metrics, only present for --stream runs
+STREAM_METRICS = ["ttft", "mean_gap", "p50_gap", "p95_gap", "max_gap", "decode_tokens_per_s"]
+
+# Network phases, only present for --net-timing runs
+NETWORK_METRICS = ["client_prep", "dns", "connect", "tls", "upload", "server", "download", "new_connections"]
+
+# Throttling and rate-limit waits, recorded for every run (see rate_limit.py)
+RETRY_METRICS = ["throttles", "retry_time", "queue_time"]
+
+BOOTSTRAP_RESAMPLES = 1000
+CONFIDENCE = 0.95
+
+
+def percentile(values, pct):
+    # Linear interpolation between closest ranks (the same as numpy's default)
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def bootstrap_ci(values, statistic=statistics.fmean, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE, seed=0):
+    # Percentile bootstrap interval for statistic(values). The fixed seed keeps
+    # reports reproducible for the same input.
+    if not values:
+        return 0.0, 0.0
+    if len(values) == 1:
+        return values[0], values[0]
+    rng = random.Random(seed)
+    n = len(values)
+    estimates = sorted(statistic(rng.choices(values, k=n)) for _ in range(resamples))
+    alpha = (1 - confidence) / 2
+    return percentile(estimates, alpha * 100), percentile(estimates, (1 - alpha) * 100)
+
+
+def relative_ci_width(values, pct):
+    # Width of the bootstrap CI of the pct-th percentile, relative to the
+    # percentile itself (0.1 means the interval spans 10% of the estimate)
+    estimate = percentile(values, pct)
+    if len(values) < 2 or estimate <= 0:
+        return math.inf
+    low, high = bootstrap_ci(values, statistic=lambda sample: percentile(sample, pct))
+    return (high - low) / estimate
+
+
+def summarize(values):
+    # count/mean/stddev/min/percentiles/max and a bootstrap CI of the mean
+    values = [v for v in values if v is not None and not (isinstance(v, float) and math.isnan(v))]
+    if not values:
+        return {"count": 0}
+    ci_low, ci_high = bootstrap_ci(values)
+    summary = {
+        "count": len(values),
+        "mean": statistics.fmean(values),
+        "stddev": statistics.stdev(values) if len(values) > 1 else 0.0,
+        "min": min(values),
+        "max": max(values),
+        "ci_low": ci_low,
+        "ci_high": ci_high,
+    }
+    for pct in PERCENTILES:
+        summary[f"p{pct}"] = percentile(values, pct)
+    return summary
+
+
+def summarize_results(results, wall_time=None):
+    # Structured statistics for one provider's results (as built by
+    # benchmark_common.make_result), in one pass so `results` can be a stream
+    # read from the results log. Errors are counted, not averaged in.
+    runs = 0
+    throttles = 0
+    gave_up = 0
+    # Hedged requests (hedging.HedgedProvider): which provider won, how often
+    # a second one was asked, and what the losing requests cost
+    hedged = 0
+    winners = {}
+    # Where the token counts came from (see token_accounting.py)
+    token_sources = {}
+    columns = {name: [] for name in RESULT_METRICS + RETRY_METRICS}
+    for r in results:
+        runs += 1
+        throttles += r["throttles"]
+        source = r.get("token_source", "reported")
+        token_sources[source] = token_sources.get(source, 0) + 1
+        if r.get("hedged") is not None:
+            hedged += r["hedged"]
+            winners[r["winner"]] = winners.get(r["winner"], 0) + 1
+            columns.setdefault("duplicate_cost", []).append(r["duplicate_cost"])
+        if r["error"]:
+            gave_up += r["error"].startswith("ThrottledError")
+            continue
+        columns["response_time"].append(r["response_time"])
+        columns["prompt_tokens"].append(r["prompt_tokens"])
+        columns["completion_tokens"].append(r["completion_tokens"])
+        columns["total_tokens"].append(r["total_tokens"])
+        columns["characters"].append(len(r["response"]))
+        columns["words"].append(len(r["response"].split()))
+        columns["cost"].append(r["cost"])
+        for field in RETRY_METRICS:
+            columns[field].append(r[field])
+        if r["stream"]:
+            for field in STREAM_METRICS:
+                columns.setdefault(field, []).append(r["stream"][field])
+        if r.get("client_setup") is not None:
+            columns.setdefault("client_setup", []).append(r["client_setup"])
+        if r.get("network"):
+            for field in NETWORK_METRICS:
+                columns.setdefault(field, []).append(r["network"][field])
+        if r.get("schedule_delay") is not None:
+            # Everything between the intended send time and the response:
+            # falling behind schedule, the rate budget and throttled retries
+            behind = r["schedule_delay"] + r["queue_time"] + r["retry_time"]
+            columns.setdefault("schedule_delay", []).append(r["schedule_delay"])
+            columns.setdefault("corrected_response_time", []).append(behind + r["response_time"])
+            if r["stream"]:
+                columns.setdefault("corrected_ttft", []).append(behind + r["stream"]["ttft"])
+
+    successes = len(columns["response_time"])
+    stats = {
+        "runs": runs,
+        "successes": successes,
+        "errors": runs - successes,
+        "error_rate": (runs - successes) / runs if runs else 0.0,
+        "metrics": {name: summarize(values) for name, values in columns.items()},
+    }
+    # Throttling across all runs, failed ones included: every throttled attempt
+    # is a request the provider turned away
+    attempts = runs + throttles
+    stats["throttles"] = throttles
+    stats["attempts"] = attempts
+    stats["throttle_rate"] = throttles / attempts if attempts else 0.0
+    stats["gave_up"] = gave_up
+    stats["token_sources"] = token_sources
+    if winners:
+        stats["hedged_runs"] = hedged
+        stats["hedge_rate"] = hedged / runs
+        stats["winners"] = winners
+        stats["duplicate_cost"] = sum(columns["duplicate_cost"])
+        # Extra spend on losing requests, relative to what the answers cost
+        spend = sum(columns["cost"])
+        stats["duplicate_spend_ratio"] = stats["duplicate_cost"] / spend if spend else 0.0
+    if wall_time is not None:
+        stats["wall_time"] = wall_time
+        # Goodput: successful requests per second, against all attempts sent
+        stats["attempts_per_s"] = attempts / wall_time if wall_time > 0 else 0.0
+        stats["requests_per_s"] = successes / wall_time if wall_time > 0 else 0.0
+        stats["completion_tokens_per_s"] = sum(columns["completion_tokens"]) / wall_time if wall_time > 0 else 0.0
+    return stats
+
+
+def fit_linear(rows, targets):
+    # Ordinary least squares: coefficients [a, b1, b2, ...] of
+    # target ≈ a + b1*x1 + b2*x2 + ... for rows of features [x1, x2, ...],
+    # with R². Solved from the normal equations, which is plenty for a handful
+    # of features. Returns None if the features don't vary enough to separate.
+    rows = [[1.0] + list(row) for row in rows]
+    size = len(rows[0]) if rows else 0
+    if len(rows) < size or not rows:
+        return None
+    # Augmented normal-equation matrix [XᵀX | Xᵀy], by Gaussian elimination
+    matrix = [
+        [sum(row[i] * row[j] for row in rows) for j in range(size)] + [sum(row[i] * y for row, y in zip(rows, targets))]
+        for i in range(size)
+    ]
+    # A pivot that all but vanishes next to its column's scale means a feature
+    # is (nearly) a combination of the others
+    scale = [matrix[i][i] for i in range(size)]
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda r: abs(matrix[r][col]))
+        if abs(matrix[pivot][col]) <= 1e-9 * scale[col]:
+            return None
+        matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+        for r in range(size):
+            if r != col:
+                factor = matrix[r][col] / matrix[col][col]
+                matrix[r] = [a - factor * b for a, b in zip(matrix[r], matrix[col])]
+    coefficients = [matrix[i][size] / matrix[i][i] for i in range(size)]
+    mean = statistics.fmean(targets)
+    residual = sum((y - sum(c * x for c, x in zip(coefficients, row))) ** 2 for row, y in zip(rows, targets))
+    total = sum((y - mean) ** 2 for y in targets)
+    return {"coefficients": coefficients, "r2": 1 - residual / total if total else 1.0, "n": len(rows)}
+
+
+def mann_whitney(a, b):
+    # Two-sided Mann-Whitney U test of whether values in `b` tend to be larger
+    # or smaller than in `a`, without assuming any distribution (latencies are
+    # long-tailed, so a t-test would be led by the outliers). Uses the normal
+    # approximation with tie and continuity corrections, which is close for
+    # more than a handful of samples per side. Returns {"u": U of b, "z", "p",
+    # "effect"}, where effect is P(b > a) + P(b = a)/2 (0.5 for no shift), or
+    # None when either side is empty.
+    n1, n2 = len(a), len(b)
+    if not n1 or not n2:
+        return None
+    # Ranks of the pooled samples, ties sharing their average rank
+    pooled = sorted([(value, 0) for value in a] + [(value, 1) for value in b])
+    rank_sum_b = 0.0
+    tie_term = 0
+    i = 0
+    while i < len(pooled):
+        j = i
+        while j + 1 < len(pooled) and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        average_rank = (i + j) / 2 + 1
+        rank_sum_b += average_rank * sum(1 for _, side in pooled[i:j + 1] if side)
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        i = j + 1
+    n = n1 + n2
+    u = rank_sum_b - n2 * (n2 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))) if n > 1 else 0.0
+    if variance <= 0:
+        # Every value the same: no evidence of a shift
+        return {"u": u, "z": 0.0, "p": 1.0, "effect": 0.5}
+    z = (u - mean - math.copysign(0.5, u - mean) if u != mean else 0.0) / math.sqrt(variance)
+    p = math.erfc(abs(z) / math.sqrt(2))
+    return {"u": u, "z": z, "p": min(1.0, p), "effect": u / (n1 * n2)}
@@ -0,0 +1,399 @@
+# distributed.py
+# Coordinator/worker benchmarks: one benchmark plan split across several
+# worker processes, on this machine or on other hosts, so the load isn't
+# capped by one Python process (JSON decoding and SDK overhead hold the GIL)
+# and latency can be compared between network locations ("vantage points").
+#
+# The coordinator splits each provider's runs, concurrency, arrival rate and
+# rate limits between the workers and sends each its share. Workers run their
+# share with the same run_load() and rate_limit.Scheduler as run_provider()
+# and stream every result back as it completes. The coordinator writes them
+# all to one results log per provider, so the CSV, statistics and store cover
+# the merged samples exactly, and keeps a live_metrics.Histogram per provider
+# and vantage point, merged bucket by bucket (never by averaging averages)
+# for the per-vantage comparison in distributed_vantage.csv.
+#
+# On one machine, one worker per core:
+#
+#     python distributed.py coordinator --runs 400 --concurrency 64 --stream
+#
+# Across hosts, start the coordinator listening and expecting remote workers,
+# then a worker on each host (with that host's credentials):
+#
+#     DISTRIBUTED_AUTHKEY=<secret> python distributed.py coordinator --workers 0 --expect 3 --listen 0.0.0.0:7070 --stream
+#     DISTRIBUTED_AUTHKEY=<secret> python distributed.py worker --connect coordinator-host:7070 --vantage eu-west
+#
+# Connections are authenticated with --authkey (or DISTRIBUTED_AUTHKEY); use
+# them on trusted networks only, since messages are pickled. The key is
+# required whenever workers connect from outside: the coordinator only makes
+# up a random one when it listens on loopback and starts every worker itself.
+
+import argparse
+import csv
+import ipaddress
+import multiprocessing
+import os
+import secrets
+import socket
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import live_metrics
+from benchmark_common import ARRIVALS, DEFAULT_MAX_IN_FLIGHT, finish_benchmark, run_load
+from providers import DEFAULT_QUESTION, PROVIDERS, get_provider
+from rate_limit import DEFAULT_MAX_RETRIES, Scheduler, limit_for, parse_limits
+from results_log import ResultsLog, log_filename
+from results_store import DEFAULT_STORE
+from summary import summary_row, write_summary
+
+DEFAULT_ADDRESS = "127.0.0.1:7070"
+
+# Histograms kept per provider and vantage point: metric -> smallest distinguishable value
+VANTAGE_METRICS = {"response_time": 1e-6, "ttft": 1e-6}
+
+
+def parse_address(value):
+    host, _, port = value.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def authkey(value, local_only=False):
+    # The shared secret from --authkey or DISTRIBUTED_AUTHKEY. Without one, a
+    # coordinator whose workers are all its own children on loopback gets a
+    # random key; anything reachable from elsewhere refuses to start.
+    value = value or os.getenv("DISTRIBUTED_AUTHKEY")
+    if value:
+        return value.encode("utf-8")
+    if local_only:
+        return secrets.token_bytes(32)
+    raise SystemExit("Set --authkey or DISTRIBUTED_AUTHKEY: workers on other hosts or processes need a shared secret")
+
+
+def split(total, parts):
+    # `total` shared out between `parts` as evenly as whole numbers allow
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+def total_concurrency(args):
+    # Requests in flight per provider across all workers
+    return args.max_in_flight if args.arrival_rate else args.concurrency
+
+
+def make_plans(args, workers):
+    # Each worker's share of the benchmark, as a dict of run_load() settings
+    # per provider. A closed loop is split by concurrency (workers beyond the
+    # concurrency get nothing); an open loop splits the arrival rate.
+    keys = [key.strip() for key in args.providers.split(",") if key.strip()]
+    rpm_limits, tpm_limits = parse_limits(args.rpm), parse_limits(args.tpm)
+    active = workers if args.arrival_rate else min(workers, args.concurrency)
+    runs = split(args.runs, active)
+    concurrency = split(total_concurrency(args), active)
+    plans = []
+    for index in range(workers):
+        shares = {}
+        if index < active and (args.duration or runs[index]):
+            for key in keys:
+                rpm, tpm = limit_for(rpm_limits, key), limit_for(tpm_limits, key)
+                shares[key] = {
+                    "num_runs": runs[index],
+                    "concurrency": max(1, concurrency[index]),
+                    "duration": args.duration,
+                    "arrival_rate": args.arrival_rate / active if args.arrival_rate else None,
+                    "arrival": args.arrival,
+                    "rpm": rpm / active if rpm else None,
+                    "tpm": tpm / active if tpm else None,
+                }
+        plans.append({
+            "question": args.question, "stream": args.stream, "warmup": args.warmup, "max_retries": args.max_retries,
+            "mock": args.mock, "providers": shares,
+        })
+    return plans
+
+
+# --- worker ---
+
+def run_worker(address, key, vantage):
+    # Connect to the coordinator, run the plan it sends and stream back the results
+    connection = Client(address, authkey=key)
+    lock = threading.Lock()
+
+    def send(message):
+        with lock:
+            connection.send(message)
+
+    try:
+        send({"type": "hello", "vantage": vantage, "host": socket.gethostname(), "pid": os.getpid()})
+        plan = connection.recv()
+        endpoint = None
+        if plan["mock"]:
+            from mock_server import start_mock_server, use_mock_credentials
+
+            endpoint = start_mock_server().url
+            use_mock_credentials()
+
+        def run_provider_share(provider_key, share):
+            provider = get_provider(provider_key, plan["question"], endpoint=endpoint)
+            try:
+                provider.connect()
+            except Exception as e:
+                send({"type": "error", "provider": provider_key, "message": f"{type(e).__name__}: {e}"})
+                return
+            scheduler = Scheduler(
+                provider.is_throttled, provider.retry_after, rpm=share["rpm"], tpm=share["tpm"],
+                max_retries=plan["max_retries"]
+            )
+            invoke = provider.invoke_stream if plan["stream"] else provider.invoke
+
+            def call(run):
+                return scheduler.call(invoke, run)
+
+            phases = [("warmup", plan["warmup"], None, None), ("warm", share["num_runs"], share["duration"], share["arrival_rate"])]
+            try:
+                for phase, runs, duration, rate in phases:
+                    if not runs and not duration:
+                        continue
+
+                    def record(run, result, phase=phase):
+                        result["phase"] = phase
+                        send({"type": "result", "provider": provider_key, "phase": phase, "result": result})
+
+                    wall_time = run_load(
+                        call, num_runs=runs, concurrency=min(share["concurrency"], runs) if phase == "warmup" else share["concurrency"],
+                        duration=duration, record=record, arrival_rate=rate, arrival=share["arrival"], quiet=True
+                    )
+                    send({"type": "series", "provider": provider_key, "phase": phase, "wall_time": wall_time})
+            finally:
+                provider.close()
+
+        threads = [
+            threading.Thread(target=run_provider_share, args=(provider_key, share))
+            for provider_key, share in plan["providers"].items()
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        send({"type": "done"})
+    finally:
+        connection.close()
+
+
+# --- coordinator ---
+
+class Merge:
+    # The results of every worker for one provider: one results log, and a
+    # histogram per vantage point and metric
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.log_path = log_filename(f"distributed_{provider.key}_results.csv")
+        self.log = ResultsLog(self.log_path)
+        self.lock = threading.Lock()
+        self.next_run = {}
+        self.wall_times = {}
+        self.histograms = {}
+        self.counts = {}
+
+    def add(self, vantage, worker, phase, result):
+        with self.lock:
+            # Runs are numbered again across workers
+            run = self.next_run.get(phase, 0)
+            self.next_run[phase] = run + 1
+            result["vantage"] = vantage
+            result["worker"] = worker
+            self.log.append(phase, run, result)
+            if phase == "warmup":
+                return
+            counts = self.counts.setdefault(vantage, {"runs": 0, "errors": 0})
+            counts["runs"] += 1
+            if result["error"]:
+                counts["errors"] += 1
+                return
+            histograms = self.histograms.setdefault(
+                vantage, {metric: live_metrics.Histogram(unit) for metric, unit in VANTAGE_METRICS.items()}
+            )
+            histograms["response_time"].record(result["response_time"])
+            if result["stream"]:
+                histograms["ttft"].record(result["stream"]["ttft"])
+        live_metrics.REGISTRY.observe(self.provider.key, self.provider.region, phase, result, model=self.provider.model)
+
+    def end_series(self, phase, wall_time):
+        # The workers ran side by side, so the series took as long as the slowest
+        with self.lock:
+            self.wall_times[phase] = max(self.wall_times.get(phase, 0.0), wall_time)
+
+    def close(self):
+        for phase, wall_time in self.wall_times.items():
+            self.log.end_series(phase, wall_time)
+        self.log.close()
+
+    def merged(self):
+        # Every vantage point's histograms merged into one per metric
+        merged = {metric: live_metrics.Histogram(unit) for metric, unit in VANTAGE_METRICS.items()}
+        for histograms in self.histograms.values():
+            for metric, histogram in histograms.items():
+                merged[metric].merge(histogram)
+        return merged
+
+
+def _quantile(histogram, q):
+    value = histogram.quantile(q)
+    return "" if value is None else f"{value:.3f}"
+
+
+def write_vantage_csv(merges, filename):
+    with open(filename, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([
+            "Provider", "Vantage", "Runs", "Errors", "Response Time P50 (s)", "Response Time P90 (s)",
+            "Response Time P99 (s)", "TTFT P50 (s)", "TTFT P99 (s)",
+        ])
+        for merge in merges:
+            rows = [(vantage, merge.counts[vantage], merge.histograms.get(vantage)) for vantage in sorted(merge.counts)]
+            total = {"runs": sum(c["runs"] for c in merge.counts.values()), "errors": sum(c["errors"] for c in merge.counts.values())}
+            rows.append(("all", total, merge.merged()))
+            for vantage, counts, histograms in rows:
+                histograms = histograms or {metric: live_metrics.Histogram(unit) for metric, unit in VANTAGE_METRICS.items()}
+                writer.writerow([
+                    merge.provider.name, vantage, counts["runs"], counts["errors"],
+                    _quantile(histograms["response_time"], 0.5), _quantile(histograms["response_time"], 0.9),
+                    _quantile(histograms["response_time"], 0.99), _quantile(histograms["ttft"], 0.5),
+                    _quantile(histograms["ttft"], 0.99),
+                ])
+
+
+def coordinate(args):
+    address = parse_address(args.listen)
+    key = authkey(args.authkey, local_only=is_loopback(address[0]) and not args.expect)
+    workers = args.workers if args.workers is not None else (0 if args.expect else os.cpu_count() or 1)
+    total = workers + args.expect
+    if not total:
+        raise SystemExit("No workers: set --workers or --expect")
+
+    listener = Listener(address, authkey=key)
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, args=(listener.address, key, args.vantage or socket.gethostname()), daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    print(f"Coordinator on {args.listen}: waiting for {total} worker(s) ({workers} local, {args.expect} remote)")
+
+    connections = []
+    for _ in range(total):
+        connection = listener.accept()
+        hello = connection.recv()
+        connections.append((connection, hello))
+        print(f"Worker {len(connections)}/{total} connected: {hello['vantage']} ({hello['host']}, pid {hello['pid']})")
+    listener.close()
+
+    keys = [key_.strip() for key_ in args.providers.split(",") if key_.strip()]
+    merges = {provider_key: Merge(get_provider(provider_key, args.question)) for provider_key in keys}
+    live_metrics.start(args.metrics_port, args.dashboard)
+
+    def receive(connection, hello):
+        worker = f"{hello['host']}:{hello['pid']}"
+        while True:
+            try:
+                message = connection.recv()
+            except EOFError:
+                print(f"Worker {worker} disconnected before finishing")
+                return
+            if message["type"] == "done":
+                return
+            if message["type"] == "error":
+                print(f"Worker {worker} skipped {message['provider']}: {message['message']}")
+            elif message["type"] == "series":
+                merges[message["provider"]].end_series(message["phase"], message["wall_time"])
+            elif message["type"] == "result":
+                merges[message["provider"]].add(hello["vantage"], worker, message["phase"], message["result"])
+
+    start_time = time.time()
+    for (connection, _), plan in zip(connections, make_plans(args, total)):
+        connection.send(plan)
+    threads = [
+        threading.Thread(target=receive, args=(connection, hello)) for connection, hello in connections
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        live_metrics.release()
+        for connection, _ in connections:
+            connection.close()
+        for process in processes:
+            process.join(timeout=5)
+    print(f"\nAll workers finished in {time.time() - start_time:.2f} seconds.")
+
+    all_stats = []
+    for merge in merges.values():
+        merge.close()
+        csv_filename = f"distributed_{merge.provider.key}_results.csv"
+        all_stats.append(finish_benchmark(
+            merge.provider, csv_filename, merge.log_path, total_concurrency(args),
+            args.stream, "" if args.mock else args.store,
+            open_loop={"arrival_rate": args.arrival_rate, "arrival": args.arrival, "max_in_flight": args.max_in_flight} if args.arrival_rate else None,
+        ))
+    write_summary(
+        [(stats["provider"],) for stats in all_stats], [summary_row(stats) for stats in all_stats],
+        "distributed_summary.csv", "distributed_summary_transposed.csv"
+    )
+    write_vantage_csv(merges.values(), "distributed_vantage.csv")
+    print("Summary written to distributed_summary.csv; per-vantage percentiles to distributed_vantage.csv")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a benchmark across worker processes and hosts, and merge their results.")
+    roles = parser.add_subparsers(dest="role", required=True)
+
+    coordinator = roles.add_parser("coordinator", help="Plan the benchmark, hand it out and merge the results.")
+    coordinator.add_argument("--listen", type=str, default=DEFAULT_ADDRESS, help="host:port workers connect to.")
+    coordinator.add_argument("--workers", type=int, default=None, help="Local worker processes to start (default: one per core, or none with --expect).")
+    coordinator.add_argument("--expect", type=int, default=0, help="Remote workers to wait for, in addition to the local ones.")
+    coordinator.add_argument("--authkey", type=str, default=None, help="Shared secret workers authenticate with (default: DISTRIBUTED_AUTHKEY; required with --expect or a non-loopback --listen).")
+    coordinator.add_argument("--vantage", type=str, default=None, help="Name of this host's vantage point (default: its hostname).")
+    coordinator.add_argument("--question", type=str, default=DEFAULT_QUESTION, help="The question to send to every provider.")
+    coordinator.add_argument("--providers", type=str, default=",".join(PROVIDERS), help="Comma-separated providers to benchmark (gcp, aws, azure).")
+    coordinator.add_argument("--runs", type=int, default=100, help="Requests per provider across all workers (ignored with --duration).")
+    coordinator.add_argument("--concurrency", type=int, default=16, help="Requests in flight per provider across all workers.")
+    coordinator.add_argument("--duration", type=float, default=None, help="Seconds every worker keeps its providers under load instead of a fixed number of runs.")
+    coordinator.add_argument("--stream", action="store_true", help="Use the streaming APIs and record time-to-first-token.")
+    coordinator.add_argument("--warmup", type=int, default=1, help="Requests each worker sends to each provider before its measured runs.")
+    coordinator.add_argument("--arrival-rate", type=float, default=None, help="Open loop: requests per second per provider across all workers.")
+    coordinator.add_argument("--arrival", type=str, choices=ARRIVALS, default="poisson", help="Spacing of open-loop requests.")
+    coordinator.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT, help="Most open-loop requests in flight per provider across all workers.")
+    coordinator.add_argument("--rpm", type=str, default=None, help="Requests per minute per provider across all workers (60, or aws=60,azure=120).")
+    coordinator.add_argument("--tpm", type=str, default=None, help="Tokens per minute per provider across all workers.")
+    coordinator.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES, help="Times to retry a throttled request.")
+    coordinator.add_argument("--store", type=str, default=DEFAULT_STORE, help="SQLite results store to add the merged runs to; an empty string skips it.")
+    coordinator.add_argument("--metrics-port", type=int, default=None, help="Serve the merged live histograms on http://127.0.0.1:PORT/metrics.")
+    coordinator.add_argument("--dashboard", action="store_true", help="Show a live table of the merged results while the workers run.")
+    coordinator.add_argument("--mock", action="store_true", help="Have every worker start its own mock_server.py instead of calling the real endpoints.")
+
+    worker = roles.add_parser("worker", help="Run a share of a coordinator's benchmark and stream the results back.")
+    worker.add_argument("--connect", type=str, default=DEFAULT_ADDRESS, help="host:port of the coordinator.")
+    worker.add_argument("--authkey", type=str, default=None, help="Shared secret, as given to the coordinator (default: DISTRIBUTED_AUTHKEY).")
+    worker.add_argument("--vantage", type=str, default=None, help="Name of this worker's vantage point (default: its hostname).")
+    args = parser.parse_args()
+
+    if args.role == "coordinator":
+        coordinate(args)
+    else:
+        run_worker(parse_address(args.connect), authkey(args.authkey), args.vantage or socket.gethostname())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import argparse
+import csv
+import datetime
+import itertools
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+from benchmark_common import run_load
+from mock_server import use_mock_credentials
+from providers import DEFAULT_QUESTION, PROVIDERS, TRANSPORTS, get_provider
+from rate_limit import Scheduler
+from results_log import ResultsLog
+
+# Measures the benchmark harness itself rather than the providers: each
+# adapter's full call path (SDK request building and signing, JSON encoding
+# and decoding, response parsing, the rate-limit scheduler and the results
+# log) against a mock_server.py that answers instantly. For every provider
+# and mode it reports
+#   - client CPU time per request (this process only; the mock server runs in
+#     a process of its own so its work isn't counted)
+#   - wall time per request, one at a time
+#   - memory per request: the peak allocated while a request is in flight,
+#     and what stays allocated afterwards (tracemalloc)
+#   - the highest request rate the harness reaches with --concurrency
+#     requests in flight, a ceiling on what any benchmark can measure
+# and appends them to harness_overhead.csv with the git commit, so a harness
+# change can be compared with the runs before it:
+#
+#     python harness_overhead.py --requests 500 --duration 10 --concurrency 16
+#
+# With --transports sdk,raw each provider is measured through its SDK and
+# through raw_http.py, which shows how much of the overhead is the SDK's.
+#
+# With --max-regression it exits with status 1 if CPU time per request grew
+# by more than that share since the last saved run on the same machine.
+
+HISTORY_COLUMNS = [
+    "Timestamp (GMT)", "Commit", "Host", "Python", "Provider", "Transport", "Mode", "Requests", "CPU per Request (ms)",
+    "Wall per Request (ms)", "Peak Memory per Request (KiB)", "Retained per Request (B)", "Concurrency",
+    "Max Requests/s",
+]
+
+parser = argparse.ArgumentParser(description="Measure the harness's own CPU, memory and rate ceiling per provider adapter.")
+parser.add_argument("--providers", type=str, default=",".join(PROVIDERS), help="Comma-separated adapters to measure (gcp, aws, azure).")
+parser.add_argument("--transports", type=str, default="sdk", help=f"Comma-separated transports to measure each adapter over ({', '.join(TRANSPORTS)}).")
+parser.add_argument("--modes", type=str, default="blocking,stream", help="Comma-separated call modes to measure (blocking, stream).")
+parser.add_argument("--requests", type=int, default=300, help="Requests sent one at a time for the CPU and memory figures.")
+parser.add_argument("--warmup", type=int, default=20, help="Requests sent first and not measured.")
+parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight for the rate ceiling.")
+parser.add_argument("--duration", type=float, default=5.0, help="Seconds of load for the rate ceiling.")
+parser.add_argument("--output-tokens", type=int, default=200, help="Tokens in each mock response.")
+parser.add_argument("--history", type=str, default="harness_overhead.csv", help="CSV the results are appended to.")
+parser.add_argument("--max-regression", type=float, default=None, help="Exit with status 1 if CPU per request grew by more than this share (e.g. 0.2) since the last saved run.")
+args = parser.parse_args()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_instant_mock():
+    # A mock_server.py process with no prefill or decode delay and no jitter
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_server.py"),
+         "--port", str(port), "--prefill-ms", "0", "--prefill-ms-per-token", "0", "--decode-tokens-per-s", "0",
+         "--jitter", "0", "--output-tokens", str(args.output_tokens)],
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"{url}/stats", timeout=1).read()
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("The mock server did not start")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def last_saved(history, host, provider, transport, mode):
+    # The most recent saved row for this machine, provider, transport and
+    # mode, if any (rows from before the Transport column are SDK runs)
+    if not os.path.exists(history):
+        return None
+    with open(history, newline="", encoding="utf-8") as f:
+        rows = [
+            row for row in csv.DictReader(f)
+            if row["Host"] == host and row["Provider"] == provider and (row.get("Transport") or "sdk") == transport
+            and row["Mode"] == mode
+        ]
+    return rows[-1] if rows else None
+
+
+def measure(provider, stream, log):
+    # The harness path of one request, as run_provider() takes it: the
+    # scheduler around the adapter call, then the results log
+    scheduler = Scheduler(provider.is_throttled, provider.retry_after, max_retries=0)
+    invoke = provider.invoke_stream if stream else provider.invoke
+
+    def harness_invoke(run):
+        result = scheduler.call(invoke, run)
+        log.append("warm", run, result)
+        return result
+
+    for run in range(args.warmup):
+        harness_invoke(run)
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for run in range(args.requests):
+        harness_invoke(run)
+    cpu = (time.process_time() - cpu_start) / args.requests
+    wall = (time.perf_counter() - wall_start) / args.requests
+
+    # Memory in a separate pass, since tracing allocations slows them down
+    reset_peak = getattr(tracemalloc, "reset_peak", None)
+    peaks = []
+    tracemalloc.start()
+    try:
+        retained_start = tracemalloc.get_traced_memory()[0]
+        for run in range(args.requests):
+            if reset_peak:
+                reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            harness_invoke(run)
+            if reset_peak:
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        retained = (tracemalloc.get_traced_memory()[0] - retained_start) / args.requests
+    finally:
+        tracemalloc.stop()
+    if not reset_peak:
+        # Python 3.8 has no tracemalloc.reset_peak(), so each request's peak
+        # is traced from a fresh start in a pass of its own
+        for run in range(args.requests):
+            tracemalloc.start()
+            try:
+                harness_invoke(run)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+
+    completed = [0]
+
+    def count(run, result):
+        completed[0] += 1
+
+    wall_time = run_load(harness_invoke, concurrency=args.concurrency, duration=args.duration, record=count, quiet=True)
+    return {
+        "cpu": cpu, "wall": wall, "peak": sum(peaks) / len(peaks), "retained": retained,
+        "rate": completed[0] / wall_time if wall_time else 0.0,
+    }
+
+
+use_mock_credentials()
+mock, url = start_instant_mock()
+timestamp = datetime.datetime.utcnow().isoformat() + "Z"
+commit = git_commit()
+host = socket.gethostname()
+rows = []
+regressions = []
+try:
+    with tempfile.TemporaryDirectory() as directory:
+        for key, transport in itertools.product(args.providers.split(","), args.transports.split(",")):
+            provider = get_provider(key.strip(), DEFAULT_QUESTION, endpoint=url, max_tokens=args.output_tokens, transport=transport.strip())
+            try:
+                provider.connect()
+            except Exception as e:
+                print(f"Skipping {provider.name}: {e}")
+                continue
+            for mode in args.modes.split(","):
+                mode = mode.strip()
+                log = ResultsLog(os.path.join(directory, f"{provider.key}_{mode}_runs.jsonl"))
+                try:
+                    figures = measure(provider, mode == "stream", log)
+                finally:
+                    log.close()
+                row = [
+                    timestamp, commit, host, platform.python_version(), provider.key, provider.transport, mode, args.requests,
+                    f"{figures['cpu'] * 1000:.3f}", f"{figures['wall'] * 1000:.3f}", f"{figures['peak'] / 1024:.1f}",
+                    f"{figures['retained']:.0f}", args.concurrency, f"{figures['rate']:.1f}",
+                ]
+                line = (
+                    f"{provider.name} {mode}: {figures['cpu'] * 1000:.2f} ms CPU and {figures['wall'] * 1000:.2f} ms "
+                    f"wall per request, {figures['peak'] / 1024:.0f} KiB peak, {figures['retained']:.0f} B retained, "
+                    f"up to {figures['rate']:.0f} requests/s"
+                )
+                previous = last_saved(args.history, host, provider.key, provider.transport, mode)
+                if previous and float(previous["CPU per Request (ms)"]):
+                    change = figures["cpu"] * 1000 / float(previous["CPU per Request (ms)"]) - 1
+                    line += f" (CPU {change:+.0%} since {previous['Commit'] or previous['Timestamp (GMT)']})"
+                    if args.max_regression is not None and change > args.max_regression:
+                        regressions.append(f"{provider.name} {provider.transport} {mode}")
+                print(line)
+                rows.append(row)
+            provider.close()
+finally:
+    mock.terminate()
+    mock.wait()
+
+if os.path.exists(args.history):
+    with open(args.history, newline="", encoding="utf-8") as f:
+        saved = csv.DictReader(f)
+        old_columns = saved.fieldnames != HISTORY_COLUMNS
+        saved_rows = [[row.get(column) or ("sdk" if column == "Transport" else "") for column in HISTORY_COLUMNS] for row in saved]
+    # A history from before a column was added is rewritten with it first
+    if old_columns:
+        rows = saved_rows + rows
+new_file = not os.path.exists(args.history) or old_columns
+with open(args.history, mode="w" if new_file else "a", newline="", encoding="utf-8") as f:
+    writer = csv.writer(f)
+    if new_file:
+        writer.writerow(HISTORY_COLUMNS)
+    writer.writerows(rows)
+print(f"Results appended to {args.history}")
+if regressions:
+    print(f"CPU per request grew by more than {args.max_regression:.0%} for: {', '.join(regressions)}")
+    sys.exit(1)
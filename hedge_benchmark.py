@@ -0,0 +1,100 @@
+import argparse
+import csv
+
+from benchmark_common import add_load_arguments, load_options, run_provider
+from hedging import DEFAULT_HEDGE_PERCENTILE, DEFAULT_WINDOW, HedgedProvider
+from providers import DEFAULT_QUESTION, PROVIDERS, get_provider
+
+# Measures what hedging buys: the same load is sent to each provider on its
+# own, then through latency-aware routing alone, then with hedging, and the
+# tail latencies are compared against the spend on duplicated requests.
+
+parser = argparse.ArgumentParser(description="Benchmark hedged and latency-routed requests across the Llama providers.")
+parser.add_argument("--question", type=str, default=DEFAULT_QUESTION, help="The question to send.")
+parser.add_argument("--providers", type=str, default=",".join(PROVIDERS), help="Comma-separated providers to race (gcp, aws, azure).")
+parser.add_argument("--hedge-percentile", type=int, default=DEFAULT_HEDGE_PERCENTILE, help="Hedge once the first choice is slower than this percentile of its recent latency.")
+parser.add_argument("--hedge-after", type=float, default=None, help="Hedge after this many seconds instead of a percentile.")
+parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Recent requests per provider used for routing and hedge deadlines.")
+parser.add_argument("--mock", action="store_true", help="Point every provider at a local mock_server.py instead of the real endpoints.")
+parser.add_argument("--summary-csv", type=str, default="hedge_summary.csv", help="The CSV filename to write the comparison to.")
+add_load_arguments(parser)
+args = parser.parse_args()
+
+mock_url = None
+if args.mock:
+    from mock_server import start_mock_server, use_mock_credentials
+
+    mock_url = start_mock_server().url
+    use_mock_credentials()
+    print(f"Using mock inference server at {mock_url}")
+    # Mock latencies would mix into the history and the regression baselines
+    args.store = ""
+
+providers = []
+for key in args.providers.split(","):
+    provider = get_provider(key.strip(), args.question, endpoint=mock_url)
+    provider.net_timing = args.net_timing
+    try:
+        provider.connect()
+    except Exception as e:
+        print(f"Skipping {provider.name}: {e}")
+        continue
+    providers.append(provider)
+if len(providers) < 2:
+    raise SystemExit("Hedging needs at least two providers that connect.")
+
+hedge_options = {"hedge_percentile": args.hedge_percentile, "hedge_after": args.hedge_after, "window": args.window}
+series = [(provider.name, provider, f"hedge_{provider.key}_results.csv") for provider in providers]
+series.append(("Routed", HedgedProvider(providers, args.question, hedge=False, **hedge_options), "hedge_routed_results.csv"))
+series.append(("Hedged", HedgedProvider(providers, args.question, hedge=True, **hedge_options), "hedge_hedged_results.csv"))
+
+all_stats = []
+for label, provider, csv_filename in series:
+    print(f"\n=== {label} ===\n")
+    provider.connect()
+    stats = run_provider(provider, csv_filename, **load_options(args, provider.key))
+    if isinstance(provider, HedgedProvider):
+        # Losing blocking requests still running when their race returned
+        # aren't in the per-run duplicate spend
+        late = provider.settle()
+        if late:
+            stats["duplicate_cost"] += late
+            spend = stats["metrics"].get("cost", {})
+            answers = spend.get("mean", 0.0) * spend.get("count", 0)
+            stats["duplicate_spend_ratio"] = stats["duplicate_cost"] / answers if answers else 0.0
+    all_stats.append((label, stats))
+
+
+def metric(stats, name, statistic):
+    value = stats["metrics"].get(name, {}).get(statistic)
+    return "" if value is None else f"{value:.3f}"
+
+
+# The tail a single provider gives on its own, to measure hedging against
+latency = "ttft" if args.stream else "response_time"
+single_p99 = [stats["metrics"][latency]["p99"] for _, stats in all_stats[:len(providers)] if stats["successes"]]
+best_p99 = min(single_p99) if single_p99 else None
+
+with open(args.summary_csv, mode="w", newline="", encoding="utf-8") as f:
+    writer = csv.writer(f)
+    writer.writerow([
+        "Series", "Runs", "Errors", "Response Time P50 (s)", "Response Time P90 (s)", "Response Time P99 (s)",
+        "TTFT P50 (s)", "TTFT P90 (s)", "TTFT P99 (s)", "P99 vs Best Single Provider", "Hedge Rate", "Winners",
+        "Cost of Answers (USD)", "Duplicate Spend (USD)", "Duplicate Spend (%)"
+    ])
+    for label, stats in all_stats:
+        p99 = stats["metrics"].get(latency, {}).get("p99")
+        answers = stats["metrics"].get("cost", {})
+        writer.writerow([
+            label, stats["runs"], stats["errors"],
+            metric(stats, "response_time", "p50"), metric(stats, "response_time", "p90"), metric(stats, "response_time", "p99"),
+            metric(stats, "ttft", "p50"), metric(stats, "ttft", "p90"), metric(stats, "ttft", "p99"),
+            f"{p99 / best_p99 - 1:+.1%}" if p99 is not None and best_p99 else "",
+            f"{stats['hedge_rate']:.1%}" if "hedge_rate" in stats else "",
+            " ".join(f"{key}={count}" for key, count in sorted(stats.get("winners", {}).items())),
+            f"{answers['mean'] * answers['count']:.6f}" if answers.get("count") else "",
+            f"{stats['duplicate_cost']:.6f}" if "duplicate_cost" in stats else "",
+            f"{stats['duplicate_spend_ratio']:.1%}" if "duplicate_spend_ratio" in stats else "",
+        ])
+
+print(f"\nHedging comparison written to {args.summary_csv}")
@@ -0,0 +1,293 @@
+# hedging.py
+# A client that serves each request from whichever of several providers (the
+# same Llama model on Bedrock, Vertex AI and Azure) is fastest right now.
+#
+# Routing: providers are ranked by the median latency in a rolling window of
+# recent requests (time to first token when streaming, response time
+# otherwise); providers with too few samples go first so everyone gets
+# measured. Hedging: if the first choice hasn't produced its first token (or,
+# for blocking calls, its response) within the hedge percentile of its recent
+# latency, the request is also sent to the next provider. The first to produce
+# a token wins and the other stream is cancelled at its next chunk. What the
+# losing request cost is reported as duplicate spend.
+#
+# A request returns as soon as its winner has finished. A blocking call can't
+# be cancelled, so a losing one keeps running in the background and what it
+# cost is only known once it ends: that is added to the provider's
+# stragglers (settle() waits for them and returns it) rather than to the
+# request's duplicate_cost.
+#
+# HedgedProvider has the providers.Provider interface, so it runs through
+# benchmark_common.run_provider like any single provider (see hedge_benchmark.py).
+
+import collections
+import queue
+import threading
+import time
+
+from benchmark_common import make_result
+from benchmark_stats import percentile
+from providers import DEFAULT_QUESTION, Provider
+
+DEFAULT_WINDOW = 50          # recent requests remembered per provider
+DEFAULT_MIN_SAMPLES = 3      # requests before a provider is ranked on its latency
+DEFAULT_HEDGE_PERCENTILE = 90
+DEFAULT_HEDGE_AFTER = 2.0    # seconds, until the first choice has enough samples
+
+
+class LatencyWindow:
+    # Rolling window of recent latencies per provider key, shared by all threads
+
+    def __init__(self, size=DEFAULT_WINDOW):
+        self.samples = collections.defaultdict(lambda: collections.deque(maxlen=size))
+        self.lock = threading.Lock()
+
+    def add(self, key, seconds):
+        with self.lock:
+            self.samples[key].append(seconds)
+
+    def count(self, key):
+        with self.lock:
+            return len(self.samples[key])
+
+    def percentile(self, key, pct):
+        with self.lock:
+            values = list(self.samples[key])
+        return percentile(values, pct) if values else None
+
+
+class Stragglers:
+    # Losing attempts still running after their race returned, and what the
+    # ones that have ended cost. Shared by a provider and its fresh copies.
+
+    def __init__(self):
+        self.cost = 0.0
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def add(self, owner, collector):
+        with self.lock:
+            self.collectors = [(o, c) for o, c in self.collectors if c.is_alive()]
+            self.collectors.append((owner, collector))
+
+    def charge(self, cost):
+        with self.lock:
+            self.cost += cost
+
+    def wait(self, owner=None):
+        # Wait for the losers of `owner`'s races (or everyone's); returns the
+        # cost of every loser that has ended
+        with self.lock:
+            collectors = [c for o, c in self.collectors if owner is None or o is owner]
+        for collector in collectors:
+            collector.join()
+        with self.lock:
+            return self.cost
+
+
+class HedgedProvider(Provider):
+    key = "hedged"
+    name = "Hedged Llama"
+    csv_filename = "hedged_llama_results.csv"
+
+    def __init__(self, providers, prompt=DEFAULT_QUESTION, hedge=True, hedge_percentile=DEFAULT_HEDGE_PERCENTILE,
+                 hedge_after=None, window=DEFAULT_WINDOW, min_samples=DEFAULT_MIN_SAMPLES):
+        # `providers` are connected adapters. Without `hedge` requests are only
+        # routed; `hedge_after` fixes the hedge deadline in seconds instead of
+        # deriving it from hedge_percentile.
+        super().__init__(prompt, region="+".join(p.region or "?" for p in providers), model="+".join(p.model or "?" for p in providers))
+        self.providers = list(providers)
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_after = hedge_after
+        self.window_size = window
+        self.min_samples = min_samples
+        self.latencies = {"stream": LatencyWindow(window), "blocking": LatencyWindow(window)}
+        self.stragglers = Stragglers()
+        self.name = f"{'Hedged' if hedge else 'Routed'} Llama ({', '.join(p.key for p in self.providers)})"
+
+    def connect(self):
+        for provider in self.providers:
+            if provider.client is None:
+                provider.connect()
+        self.client = self.providers
+
+    def fresh_copy(self):
+        copy = HedgedProvider(
+            [provider.fresh_copy() for provider in self.providers], self.prompt, hedge=self.hedge,
+            hedge_percentile=self.hedge_percentile, hedge_after=self.hedge_after, window=self.window_size,
+            min_samples=self.min_samples
+        )
+        copy.stragglers = self.stragglers
+        return copy
+
+    def settle(self):
+        # Duplicate spend on losing requests that were still running when
+        # their race returned, once they have all ended
+        return self.stragglers.wait()
+
+    def close(self):
+        # The clients stay open until this provider's losers have ended
+        self.stragglers.wait(self)
+        for provider in self.providers:
+            provider.close()
+
+    def is_throttled(self, error):
+        # A throttle from whichever adapter raised it, passed on by _race()
+        # once every attempt has failed, so the Scheduler retries and counts it
+        return any(provider.is_throttled(error) for provider in self.providers)
+
+    def retry_after(self, error):
+        for provider in self.providers:
+            if provider.is_throttled(error):
+                return provider.retry_after(error)
+        return None
+
+    def ranked(self, mode):
+        # Providers by recent median latency, the least-measured first
+        window = self.latencies[mode]
+
+        def rank(provider):
+            samples = window.count(provider.key)
+            if samples < self.min_samples:
+                return (0, samples)
+            return (1, window.percentile(provider.key, 50))
+
+        return sorted(self.providers, key=rank)
+
+    def deadline(self, provider, mode):
+        # Seconds to wait for `provider` before hedging
+        if self.hedge_after is not None:
+            return self.hedge_after
+        if self.latencies[mode].count(provider.key) < self.min_samples:
+            return DEFAULT_HEDGE_AFTER
+        return self.latencies[mode].percentile(provider.key, self.hedge_percentile)
+
+    def invoke(self, run):
+        return self._race(run, stream=False)
+
+    def invoke_stream(self, run, cancel=None, on_first_token=None):
+        return self._race(run, stream=True)
+
+    def _race(self, run, stream):
+        mode = "stream" if stream else "blocking"
+        window = self.latencies[mode]
+        order = self.ranked(mode)
+        primary = order[0]
+        backup = order[1] if self.hedge and len(order) > 1 else None
+
+        events = queue.Queue()
+        results = {}
+        exceptions = {}
+        offsets = {}
+        cancels = {}
+        threads = {}
+        start = time.perf_counter()
+
+        def attempt(provider):
+            try:
+                if stream:
+                    result = provider.invoke_stream(
+                        run, cancel=cancels[provider.key],
+                        on_first_token=lambda: events.put(("first", provider.key))
+                    )
+                else:
+                    result = provider.invoke(run)
+            except Exception as e:
+                exceptions[provider.key] = e
+                result = make_result(0, 0, 0, 0, 0, "", error=f"{type(e).__name__}: {e}")
+            results[provider.key] = result
+            events.put(("done", provider.key))
+
+        def launch(provider):
+            offsets[provider.key] = time.perf_counter() - start
+            cancels[provider.key] = threading.Event()
+            if winner is not None:
+                cancels[provider.key].set()
+            thread = threading.Thread(target=attempt, args=(provider,), daemon=True)
+            threads[provider.key] = thread
+            thread.start()
+
+        winner = None
+        launch(primary)
+        hedge_at = start + self.deadline(primary, mode)
+        finished = set()
+        while True:
+            # The hedge is only armed until some attempt wins
+            timeout = None
+            if winner is None and backup is not None and backup.key not in offsets:
+                timeout = max(0.0, hedge_at - time.perf_counter())
+            try:
+                kind, key = events.get(timeout=timeout)
+            except queue.Empty:
+                launch(backup)
+                continue
+            if kind == "done":
+                finished.add(key)
+            if winner is None and (kind == "first" or not results[key]["error"]):
+                winner = key
+                for other, cancel in cancels.items():
+                    if other != key:
+                        cancel.set()
+            if winner is not None and winner in finished:
+                # Anything still running lost; stop it at its next chunk
+                for other, cancel in cancels.items():
+                    if other != winner:
+                        cancel.set()
+                break
+            if winner is None and kind == "done":
+                # This attempt failed: fall back to the backup now, or give up
+                # once every attempt has failed
+                if backup is not None and backup.key not in offsets:
+                    launch(backup)
+                elif finished == set(offsets):
+                    winner = key
+                    break
+
+        def sample(key):
+            result = results[key]
+            if result["error"] == "Cancelled":
+                # Censored: it was at least this slow
+                window.add(key, result["response_time"])
+            elif not result["error"]:
+                window.add(key, result["stream"]["ttft"] if stream else result["response_time"])
+
+        # Don't make the caller wait for the losers: a cancelled stream stops
+        # at its next chunk, but a blocking call runs to the end. What the
+        # ones still running cost is collected once they have ended.
+        duplicate_cost = 0.0
+        running = []
+        for key in offsets:
+            if key in finished:
+                sample(key)
+                if key != winner:
+                    duplicate_cost += results[key]["cost"]
+            else:
+                running.append(key)
+
+        def collect():
+            for key in running:
+                threads[key].join()
+                sample(key)
+                self.stragglers.charge(results[key]["cost"])
+
+        if running:
+            collector = threading.Thread(target=collect, daemon=True)
+            collector.start()
+            self.stragglers.add(self, collector)
+
+        # Every attempt failed: a throttle goes back to the Scheduler to be
+        # retried and counted, like a single provider's
+        if results[winner]["error"] and winner in exceptions and self.is_throttled(exceptions[winner]):
+            raise exceptions[winner]
+
+        # Latency as the caller saw it: from the start of the race
+        result = results[winner]
+        offset = offsets[winner]
+        result["response_time"] += offset
+        if result["stream"]:
+            result["stream"]["ttft"] += offset
+        result["winner"] = winner
+        result["hedged"] = len(offsets) > 1
+        result["duplicate_cost"] = duplicate_cost
+        return result
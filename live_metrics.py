@@ -0,0 +1,376 @@
+# live_metrics.py
+# Live view of a benchmark while it runs: every completed request is added
+# to in-memory histograms (latency, time to first token, decode tokens/s)
+# and counters, labelled by provider, model, region and phase, and by target
+# when the benchmark has a label (run_targets.py's target names, as one
+# provider and region can have several endpoints). They can be scraped
+# from a local Prometheus/OpenMetrics endpoint (--metrics-port) or watched on
+# a compact terminal dashboard (--dashboard):
+#
+#     python run_all_benchmarks.py --stream --duration 3600 --metrics-port 9464 --dashboard
+#     curl http://127.0.0.1:9464/metrics
+#
+# The histograms are log-linear, like HdrHistogram: each power of two is
+# split into equal steps, so every value is kept to within 1/2**(bits-1)
+# (under 1% by default) in memory that grows with the range of the values,
+# not their number. Recording is a lock and a dict increment, cheap enough
+# to leave on in the request loop.
+
+import math
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Quantiles exported for every histogram
+QUANTILES = [0.5, 0.9, 0.95, 0.99]
+
+# Prefix of every exported metric name
+PREFIX = "llm_benchmark"
+
+# Histograms kept per label set: (name, help, smallest distinguishable value)
+HISTOGRAMS = [
+    ("response_time_seconds", "Time from sending a request to its complete response.", 1e-6),
+    ("ttft_seconds", "Time from sending a streaming request to its first content.", 1e-6),
+    ("decode_tokens_per_second", "Generation rate after the first token of a streamed response.", 1e-3),
+]
+
+
+class Histogram:
+    # Log-linear histogram of non-negative values. Values are counted in
+    # multiples of `unit`; below 2**bits they are exact, above it each power
+    # of two has 2**(bits-1) buckets.
+
+    def __init__(self, unit=1e-6, bits=8):
+        self.unit = unit
+        self.bits = bits
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        units = max(0, int(value / self.unit))
+        shift = units.bit_length() - self.bits
+        if shift <= 0:
+            return units
+        return (shift << self.bits) + (units >> shift)
+
+    def _value(self, index):
+        # Middle of the bucket at `index`
+        shift = index >> self.bits
+        if not shift:
+            return index * self.unit
+        mantissa = index - (shift << self.bits)
+        return ((mantissa << shift) + (1 << shift) / 2) * self.unit
+
+    def record(self, value):
+        if value is None or value < 0 or math.isnan(value):
+            return
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        # Add another histogram's values (same unit and bits) to this one
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        # The value at quantile q (0-1), to the histogram's precision, clamped
+        # to the exact minimum and maximum
+        if not self.count:
+            return None
+        target = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "unit": self.unit, "bits": self.bits, "counts": {str(k): v for k, v in self.counts.items()},
+            "count": self.count, "sum": self.sum, "min": self.min, "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data["unit"], data["bits"])
+        histogram.counts = {int(k): v for k, v in data["counts"].items()}
+        histogram.count = data["count"]
+        histogram.sum = data["sum"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
+
+
+class _Series:
+    # Everything recorded for one (provider, model, region, target, phase)
+
+    def __init__(self):
+        self.histograms = {name: Histogram(unit) for name, _, unit in HISTOGRAMS}
+        self.successes = 0
+        self.errors = 0
+        self.throttles = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+
+
+class Metrics:
+    # Thread-safe registry of the live series
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+        self.started = time.time()
+
+    def observe(self, provider, region, phase, result, model=None, target=None):
+        # Add one completed benchmark_common.make_result() result. `target`
+        # names the endpoint when a provider, model and region isn't enough.
+        key = (provider, model, region, target, phase)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = _Series()
+            series.throttles += result.get("throttles") or 0
+            if result["error"]:
+                series.errors += 1
+                return
+            series.successes += 1
+            series.prompt_tokens += result["prompt_tokens"]
+            series.completion_tokens += result["completion_tokens"]
+            series.cost += result["cost"]
+            series.histograms["response_time_seconds"].record(result["response_time"])
+            if result["stream"]:
+                series.histograms["ttft_seconds"].record(result["stream"]["ttft"])
+                series.histograms["decode_tokens_per_second"].record(result["stream"]["decode_tokens_per_s"])
+
+    def rotate(self, provider=None):
+        # Start the histograms (of one provider, or all) afresh, so their
+        # quantiles cover the time since, like a Prometheus client's max-age
+        # window; the counters keep counting. soak.py rotates at every roll.
+        with self.lock:
+            for (series_provider, _, _, _, _), series in self.series.items():
+                if provider is None or series_provider == provider:
+                    series.histograms = {name: Histogram(unit) for name, _, unit in HISTOGRAMS}
+
+    def snapshot(self):
+        # [(labels, counters, {name: (quantiles, sum, count)})] for every
+        # series, all taken at the same moment
+        with self.lock:
+            rows = []
+            for (provider, model, region, target, phase), series in sorted(self.series.items(), key=lambda item: [str(v) for v in item[0]]):
+                labels = {"provider": provider, "model": model, "region": region}
+                if target is not None:
+                    labels["target"] = target
+                labels["phase"] = phase
+                counters = {
+                    "successes": series.successes, "errors": series.errors, "throttles": series.throttles,
+                    "prompt_tokens": series.prompt_tokens, "completion_tokens": series.completion_tokens,
+                    "cost": series.cost,
+                }
+                histograms = {
+                    name: ({q: h.quantile(q) for q in QUANTILES}, h.sum, h.count)
+                    for name, h in series.histograms.items()
+                }
+                rows.append((labels, counters, histograms))
+            return rows
+
+
+# The registry run_provider() records into
+REGISTRY = Metrics()
+
+
+def _labels(labels, **extra):
+    pairs = dict(labels, **extra)
+    escaped = (
+        f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in pairs.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def exposition(metrics=REGISTRY, openmetrics=False):
+    # The metrics in the Prometheus text format, or OpenMetrics (which names
+    # counter families without _total and ends with # EOF)
+    rows = metrics.snapshot()
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+    counters = [
+        ("requests", "Completed requests by outcome.", None),
+        ("throttles", "Throttled attempts retried or given up on.", "throttles"),
+        ("tokens", "Tokens processed by successful requests.", None),
+        ("cost_usd", "Estimated spend of successful requests.", "cost"),
+    ]
+    for name, help_text, field in counters:
+        family(name if openmetrics else f"{name}_total", "counter", help_text)
+        for labels, values, _ in rows:
+            if name == "requests":
+                samples = [({"outcome": "success"}, values["successes"]), ({"outcome": "error"}, values["errors"])]
+            elif name == "tokens":
+                samples = [({"kind": "prompt"}, values["prompt_tokens"]), ({"kind": "completion"}, values["completion_tokens"])]
+            else:
+                samples = [({}, values[field])]
+            for extra, value in samples:
+                lines.append(f"{PREFIX}_{name}_total{_labels(labels, **extra)} {value}")
+
+    for name, help_text, _ in HISTOGRAMS:
+        family(name, "summary", help_text)
+        for labels, _, histograms in rows:
+            quantiles, total, count = histograms[name]
+            if not count:
+                continue
+            for q, value in quantiles.items():
+                lines.append(f"{PREFIX}_{name}{_labels(labels, quantile=q)} {value:.6g}")
+            lines.append(f"{PREFIX}_{name}_sum{_labels(labels)} {total:.6g}")
+            lines.append(f"{PREFIX}_{name}_count{_labels(labels)} {count}")
+
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        body = exposition(self.server.metrics, openmetrics).encode("utf-8")
+        self.send_response(200)
+        self.send_header(
+            "Content-Type",
+            "application/openmetrics-text; version=1.0.0; charset=utf-8" if openmetrics
+            else "text/plain; version=0.0.4; charset=utf-8"
+        )
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(metrics=REGISTRY, host="127.0.0.1", port=9464):
+    # Serve GET /metrics on a background thread; port 0 picks a free port.
+    # The server's base URL is server.url; stop it with server.shutdown().
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.metrics = metrics
+    server.url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _seconds(value):
+    return "-" if value is None else f"{value:.3f}"
+
+
+class Dashboard:
+    # Redraws a table of the live series every `interval` seconds, in place
+    # when the output is a terminal
+
+    def __init__(self, metrics=REGISTRY, interval=2.0, out=None):
+        self.metrics = metrics
+        self.interval = interval
+        self.out = out or sys.stdout
+        self.stopped = threading.Event()
+        self.previous = {}
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+
+    def start(self):
+        self.last = time.perf_counter()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.draw()
+
+    def _loop(self):
+        while not self.stopped.wait(self.interval):
+            self.draw()
+
+    def render(self):
+        now = time.perf_counter()
+        elapsed = max(1e-9, now - self.last)
+        self.last = now
+        rows = self.metrics.snapshot()
+        # Labelled benchmarks (run_targets.py's targets) are listed by label
+        name = "Target" if any("target" in labels for labels, _, _ in rows) else "Provider"
+        header = f"{name:<16} {'Model':<32} {'Region':<14} {'Phase':<7} {'OK':>7} {'Err':>5} {'Thr':>5} {'Req/s':>7} " \
+                 f"{'p50 s':>8} {'p90 s':>8} {'p99 s':>8} {'TTFT p50':>9} {'TTFT p99':>9} {'Tok/s p50':>10} {'USD':>9}"
+        lines = [f"Live benchmark metrics ({time.strftime('%H:%M:%S')})", header, "-" * len(header)]
+        for labels, counters, histograms in rows:
+            key = tuple(labels.values())
+            done = counters["successes"] + counters["errors"]
+            rate = (done - self.previous.get(key, 0)) / elapsed
+            self.previous[key] = done
+            latency = histograms["response_time_seconds"][0]
+            ttft = histograms["ttft_seconds"][0]
+            decode = histograms["decode_tokens_per_second"][0][0.5]
+            lines.append(
+                f"{labels.get('target', labels['provider']):<16} {str(labels['model']):<32} {str(labels['region']):<14} "
+                f"{labels['phase']:<7} {counters['successes']:>7} "
+                f"{counters['errors']:>5} {counters['throttles']:>5} {rate:>7.2f} {_seconds(latency[0.5]):>8} "
+                f"{_seconds(latency[0.9]):>8} {_seconds(latency[0.99]):>8} {_seconds(ttft[0.5]):>9} "
+                f"{_seconds(ttft[0.99]):>9} {'-' if decode is None else f'{decode:.1f}':>10} {counters['cost']:>9.4f}"
+            )
+        return "\n".join(lines)
+
+    def draw(self):
+        text = self.render()
+        if self.out.isatty():
+            # Cursor home and clear, so the table stays in place
+            text = "\x1b[H\x1b[2J" + text
+        self.out.write(text + "\n")
+        self.out.flush()
+
+
+# Exporters started by start(), shared by every benchmark in the process
+_lock = threading.Lock()
+_server = None
+_dashboard = None
+_users = 0
+
+
+def start(port=None, dashboard=False):
+    # Start the endpoint and/or dashboard for REGISTRY, once per process
+    # however many benchmarks ask; each call is paired with release()
+    global _server, _dashboard, _users
+    with _lock:
+        _users += 1
+        if port is not None and _server is None:
+            _server = start_metrics_server(REGISTRY, port=port)
+            print(f"Metrics at {_server.url}/metrics")
+        if dashboard and _dashboard is None:
+            _dashboard = Dashboard(REGISTRY).start()
+
+
+def release():
+    # The dashboard stops (after a final frame) when its last benchmark is
+    # done; the endpoint stays up for a last scrape until the process exits
+    global _dashboard, _users
+    with _lock:
+        _users -= 1
+        if _users == 0 and _dashboard is not None:
+            _dashboard.stop()
+            _dashboard = None
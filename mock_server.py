@@ -0,0 +1,1087 @@
+# mock_server.py
+# Local stand-in for the Bedrock runtime, Vertex AI and Azure AI Inference
+# endpoints used by the benchmarks, so the harness (concurrency, streaming,
+# statistics) can be exercised offline without spending money or quota.
+#
+# It speaks enough of each API for the provider adapters to point at it:
+#   Bedrock  POST /model/<model-id>/invoke
+#            POST /model/<model-id>/invoke-with-response-stream  (AWS event stream)
+#   Vertex   POST /v1/projects/<p>/locations/<l>/.../models/<model>:generateContent
+#            POST ...:streamGenerateContent  (JSON array, or SSE with ?alt=sse)
+#   Azure    POST /chat/completions  (optionally streamed as SSE)
+#
+# Latency is modelled as a prefill delay (fixed + per prompt token) followed by
+# decoding at a configurable tokens/s, both scaled by log-normal jitter. Requests
+# can also be throttled (429) or failed (500). Randomness comes from a seeded
+# generator per request, so runs are reproducible.
+#
+#   python mock_server.py --port 8080 --prefill-ms 400 --decode-tokens-per-s 40
+#
+# With --replay, latency and output come from a recording made with --record
+# (recording.py) instead: each request gets the next recorded response, in
+# turn, with its time to first chunk, chunk gaps and text, sped up or slowed
+# down by --replay-speed. Throttling and errors are still injected as
+# configured.
+#
+#   python mock_server.py --replay aws_llama_results_recording.jsonl.gz --replay-speed 2
+#
+# It also emulates the batch APIs batch.py uses, with objects and files kept
+# in memory:
+#   S3       PUT/GET /<bucket>/<key>, and multipart uploads (path-style)
+#   Bedrock  POST /model-invocation-job, GET /model-invocation-job/<arn>
+#   GCS      POST /upload/storage/v1/b/<bucket>/o (multipart or resumable),
+#            GET /storage/v1/b/<bucket>/o, GET /download/storage/v1/b/<bucket>/o/<name>
+#   Vertex   POST/GET /v1/projects/<p>/locations/<l>/batchPredictionJobs[/<id>]
+#   Azure    POST /openai/files, GET /openai/files/<id>[/content],
+#            POST /openai/batches, GET /openai/batches/<id>
+# A job waits in the queue for --batch-queue-s, then works through its
+# records at --batch-records-per-s; its output is written to storage when a
+# poll finds it finished. Each record fails with --error-rate.
+
+import argparse
+import base64
+import hashlib
+import io
+import itertools
+import json
+import math
+import os
+import posixpath
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, quote, unquote
+
+# Filler text the mock "model" generates, one word per token
+WORDS = (
+    "enterprise cloud providers compare on reliability security pricing regional coverage "
+    "managed services support and the maturity of their machine learning platforms"
+).split()
+
+DEFAULT_CONFIG = {
+    "prefill_ms": 300.0,             # fixed time before the first token
+    "prefill_ms_per_token": 0.05,    # extra prefill time per prompt token
+    "decode_tokens_per_s": 50.0,     # decode rate after the first token
+    "jitter": 0.1,                   # sigma of the log-normal multiplier on every delay
+    "output_tokens": 200,            # tokens generated when the request allows it
+    "chunk_tokens": 4,               # tokens per streamed chunk
+    "throttle_rate": 0.0,            # probability of answering 429
+    "max_rps": 0.0,                  # server-wide request rate above which requests get 429 (0 = off)
+    "retry_after_s": 1.0,            # Retry-After sent with 429s
+    "error_rate": 0.0,               # probability of answering 500
+    "seed": 0,
+    "replay": "",                    # recording whose timing and text to serve instead (recording.py)
+    "replay_speed": 1.0,             # replayed delays are divided by this
+    "batch_queue_s": 2.0,            # time a batch job waits before it starts
+    "batch_records_per_s": 200.0,    # rate a running batch job works through its records
+}
+
+
+def count_words(text):
+    # The mock tokenizer: whitespace-separated words
+    return len(text.split())
+
+
+def generate_words(count, rng):
+    return [rng.choice(WORDS) for _ in range(count)]
+
+
+def _crc32c_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+CRC32C_TABLE = _crc32c_table()
+
+
+def crc32c(data):
+    # The Castagnoli CRC Cloud Storage reports for every object
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc = CRC32C_TABLE[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+
+def iso_time(seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(seconds))
+
+
+def split_multipart(body, content_type):
+    # The parts of a multipart/related or multipart/form-data body, as
+    # (headers dict with lower-case names, content bytes)
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not match:
+        return []
+    parts = []
+    for chunk in body.split(b"--" + match.group(1).encode())[1:]:
+        if chunk.startswith(b"--"):
+            break
+        head, _, content = chunk[2:].partition(b"\r\n\r\n")
+        headers = {}
+        for line in head.decode("latin-1").split("\r\n"):
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        parts.append((headers, content[:-2] if content.endswith(b"\r\n") else content))
+    return parts
+
+
+class MockJob:
+    # A batch job moving through its lifecycle on the clock: queued for
+    # batch_queue_s, then running at batch_records_per_s until every record
+    # is done. `info` holds the provider-specific request fields.
+
+    def __init__(self, job_id, records, config, **info):
+        self.id = job_id
+        self.records = records
+        self.submitted = time.time()
+        self.queue_s = config["batch_queue_s"]
+        self.rate = config["batch_records_per_s"]
+        self.info = info
+        self.finished = None  # time the output was written
+        self.writing = False  # a poll is writing the output
+        self.error = None     # the whole job failed, with this message
+        self.failed = 0
+
+    def progress(self):
+        # ("queued" | "running" | "done", records done so far)
+        elapsed = time.time() - self.submitted
+        if self.error or elapsed < self.queue_s:
+            return "queued", 0
+        done = len(self.records) if self.rate <= 0 else min(len(self.records), int((elapsed - self.queue_s) * self.rate))
+        return ("running" if done < len(self.records) else "done"), done
+
+    def started(self):
+        return self.submitted + self.queue_s
+
+    def ended(self):
+        return self.started() + (len(self.records) / self.rate if self.rate > 0 else 0.0)
+
+
+class MockState:
+    # Configuration plus the counters shared by all handler threads
+
+    def __init__(self, config):
+        self.config = dict(DEFAULT_CONFIG, **config)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        # Token bucket for max_rps
+        self.tokens = self.config["max_rps"]
+        self.last_refill = time.monotonic()
+        # Recorded responses to serve in turn, with replay
+        self.traces = []
+        self.replayed = 0
+        if self.config["replay"]:
+            from recording import load_traces
+
+            self.traces = load_traces(self.config["replay"])
+            if not self.traces:
+                raise ValueError(f"{self.config['replay']} has no successful responses to replay")
+        # Batch emulation: stored objects by (bucket, key), uploads in
+        # progress, Azure files and jobs by id
+        self.objects = {}
+        self.uploads = {}
+        self.files = {}
+        self.jobs = {}
+        self.ids = itertools.count(1)
+
+    def next_request(self):
+        # A generator seeded per request keeps the latency and output of the
+        # n-th request the same from one run to the next
+        with self.lock:
+            self.requests += 1
+            number = self.requests
+        return random.Random(f"{self.config['seed']}-{number}")
+
+    def next_trace(self):
+        # The next recorded response, or None without replay
+        if not self.traces:
+            return None
+        with self.lock:
+            trace = self.traces[self.replayed % len(self.traces)]
+            self.replayed += 1
+        return trace
+
+    def over_rate_limit(self):
+        max_rps = self.config["max_rps"]
+        if max_rps <= 0:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(max_rps, self.tokens + (now - self.last_refill) * max_rps)
+            self.last_refill = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return False
+            return True
+
+    def outcome(self, rng):
+        # "throttle", "error" or None for a normal response
+        if self.over_rate_limit() or rng.random() < self.config["throttle_rate"]:
+            with self.lock:
+                self.throttled += 1
+            return "throttle"
+        if rng.random() < self.config["error_rate"]:
+            with self.lock:
+                self.errors += 1
+            return "error"
+        return None
+
+    def jitter(self, rng):
+        sigma = self.config["jitter"]
+        return math.exp(rng.gauss(0, sigma)) if sigma > 0 else 1.0
+
+    def prefill_delay(self, prompt_tokens, rng):
+        base = self.config["prefill_ms"] + self.config["prefill_ms_per_token"] * prompt_tokens
+        return base / 1000 * self.jitter(rng)
+
+    def decode_delay(self, tokens, rng):
+        rate = self.config["decode_tokens_per_s"]
+        return tokens / rate * self.jitter(rng) if rate > 0 else 0.0
+
+    def snapshot(self):
+        with self.lock:
+            return {"requests": self.requests, "throttled": self.throttled, "errors": self.errors, "batch_jobs": len(self.jobs)}
+
+    def next_id(self):
+        with self.lock:
+            return next(self.ids)
+
+    def batch_outcome(self, job_id, index, max_tokens):
+        # (error message or None, generated words) for one record of a batch job
+        rng = random.Random(f"{self.config['seed']}-batch-{job_id}-{index}")
+        if rng.random() < self.config["error_rate"]:
+            return "Injected error.", []
+        output_tokens = int(self.config["output_tokens"])
+        if max_tokens:
+            output_tokens = min(output_tokens, int(max_tokens))
+        return None, generate_words(output_tokens, rng)
+
+
+def event_stream_message(payload, event_type="chunk"):
+    # Encode one message in the AWS event stream framing used by
+    # invoke_model_with_response_stream: prelude, CRC, headers, payload, CRC
+    headers = b""
+    for name, value in ((":event-type", event_type), (":content-type", "application/json"), (":message-type", "event")):
+        name_bytes = name.encode()
+        value_bytes = value.encode()
+        headers += struct.pack("!B", len(name_bytes)) + name_bytes + struct.pack("!BH", 7, len(value_bytes)) + value_bytes
+    total_length = 12 + len(headers) + len(payload) + 4
+    prelude = struct.pack("!II", total_length, len(headers))
+    message = prelude + struct.pack("!I", zlib.crc32(prelude)) + headers + payload
+    return message + struct.pack("!I", zlib.crc32(message))
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without TCP_NODELAY the
+    # body waits for the client's delayed ACK (~40 ms) on a kept-alive connection
+    disable_nagle_algorithm = True
+
+    # The recorded response this request replays, if any (set per request)
+    trace = None
+
+    def log_message(self, format, *args):
+        # Per-request logging would slow the server down under load
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    # --- plumbing ---
+
+    def read_chunks(self, stream):
+        # The payload of a chunked body (HTTP chunked transfer encoding, or
+        # the aws-chunked encoding botocore uses for trailing checksums)
+        data = b""
+        while True:
+            line = stream.readline()
+            size = int(line.split(b";")[0].strip() or b"0", 16)
+            if not size:
+                # Trailer headers, up to the blank line
+                while stream.readline().strip():
+                    pass
+                return data
+            data += stream.read(size)
+            stream.readline()
+
+    def read_body(self):
+        if "chunked" in self.headers.get("Transfer-Encoding", ""):
+            body = self.read_chunks(self.rfile)
+        else:
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length) if length else b""
+        if "aws-chunked" in self.headers.get("Content-Encoding", ""):
+            body = self.read_chunks(io.BytesIO(body))
+        return body
+
+    def read_json(self):
+        body = self.read_body()
+        return json.loads(body) if body else {}
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_bytes(self, status, body, content_type="application/octet-stream", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_xml(self, status, element, fields):
+        # An S3-style XML document: <element> with one child per field
+        children = "".join(f"<{name}>{value}</{name}>" for name, value in fields.items())
+        body = (
+            f'<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<{element} xmlns="http://s3.amazonaws.com/doc/2006-03-01/">{children}</{element}>'
+        ).encode()
+        self.send_bytes(status, body, "application/xml")
+
+    def start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def stream_tokens(self, words, rng):
+        # Yield the generated words a chunk at a time, sleeping for the decode time.
+        # The prefill delay has already been spent by the caller.
+        if self.trace:
+            yield from self.replay_chunks(words)
+            return
+        chunk_tokens = max(1, int(self.state.config["chunk_tokens"]))
+        for start in range(0, len(words), chunk_tokens):
+            piece = words[start:start + chunk_tokens]
+            if start:
+                time.sleep(self.state.decode_delay(len(piece), rng))
+            yield (" " if start else "") + " ".join(piece), start + len(piece)
+
+    def replay_chunks(self, words):
+        # The recorded chunks at their recorded gaps, as stream_tokens() yields
+        # them; the last one accounts for all of `words`
+        speed = self.state.config["replay_speed"]
+        chunks = self.trace["chunks"] or [[self.trace["returned"], ""]]
+        if not self.trace["stream"]:
+            # A blocking response replayed as a stream arrives all at once
+            chunks = [[self.trace["returned"], "".join(text for _, text in chunks)]]
+        generated = 0
+        for index, (t, text) in enumerate(chunks):
+            if index:
+                time.sleep(max(0.0, t - chunks[index - 1][0]) / speed)
+            generated = len(words) if index == len(chunks) - 1 else min(len(words), generated + count_words(text))
+            yield text, generated
+
+    def simulate(self, prompt_tokens, max_tokens, rng, stream):
+        # Sleep through prefill (and decode, for blocking calls); return the generated words
+        if self.trace:
+            # Replay: time to the first chunk (or to the whole response) as recorded
+            chunks = self.trace["chunks"]
+            first = chunks[0][0] if chunks and self.trace["stream"] else self.trace["returned"]
+            last = chunks[-1][0] if chunks and self.trace["stream"] else self.trace["returned"]
+            time.sleep((first if stream else last) / self.state.config["replay_speed"])
+            return "".join(text for _, text in chunks).split()
+        output_tokens = int(self.state.config["output_tokens"])
+        if max_tokens:
+            output_tokens = min(output_tokens, int(max_tokens))
+        words = generate_words(output_tokens, rng)
+        delay = self.state.prefill_delay(prompt_tokens, rng)
+        if not stream:
+            delay += self.state.decode_delay(max(0, output_tokens - 1), rng)
+        time.sleep(delay)
+        return words
+
+    # --- routing ---
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            return self.send_json(200, self.state.snapshot())
+        query = parse_qs(url.query)
+        match = re.match(r"^/model-invocation-job/(?P<job>[^/]+)$", url.path)
+        if match:
+            return self.bedrock_job(unquote(match.group("job")))
+        match = re.match(r"^/v1(beta1)?/projects/[^/]+/locations/[^/]+/batchPredictionJobs/(?P<job>[^/:]+)$", url.path)
+        if match:
+            return self.send_vertex_job(match.group("job"))
+        match = re.match(r"^/storage/v1/b/(?P<bucket>[^/]+)/o$", url.path)
+        if match:
+            return self.gcs_list(match.group("bucket"), query.get("prefix", [""])[0])
+        match = re.match(r"^/(download/)?storage/v1/b/(?P<bucket>[^/]+)/o/(?P<name>.+)$", url.path)
+        if match:
+            return self.gcs_get(match.group("bucket"), unquote(match.group("name")), query.get("alt") == ["media"])
+        match = re.match(r"^/openai/batches/(?P<batch>[^/]+)$", url.path)
+        if match:
+            return self.azure_batch(match.group("batch"))
+        match = re.match(r"^/openai/files/(?P<file>[^/]+)(?P<content>/content)?$", url.path)
+        if match:
+            return self.azure_file(match.group("file"), bool(match.group("content")))
+        match = re.match(r"^/(?P<bucket>[^/]+)/(?P<key>.+)$", url.path)
+        if match:
+            return self.s3_get(match.group("bucket"), unquote(match.group("key")))
+        self.send_json(404, {"message": f"No route for GET {self.path}"})
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query, keep_blank_values=True)
+        if url.path.startswith("/upload/storage/v1/b/") and "upload_id" in query:
+            return self.gcs_resumable_chunk(query["upload_id"][0])
+        match = re.match(r"^/(?P<bucket>[^/]+)/(?P<key>.+)$", url.path)
+        if match:
+            return self.s3_put(match.group("bucket"), unquote(match.group("key")), query)
+        self.send_json(404, {"message": f"No route for PUT {self.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        path = url.path
+        if self.batch_post(url):
+            return
+        request = self.read_json()
+        rng = self.state.next_request()
+        self.trace = self.state.next_trace()
+
+        match = re.match(r"^/model/(?P<model>[^/]+)/(?P<action>invoke|invoke-with-response-stream)$", path)
+        if match:
+            return self.bedrock(request, match.group("model"), match.group("action") != "invoke", rng)
+        match = re.match(r"^/.*/models/(?P<model>[^/:]+):(?P<action>generateContent|streamGenerateContent)$", path)
+        if match:
+            stream = match.group("action") == "streamGenerateContent"
+            sse = parse_qs(url.query).get("alt") == ["sse"]
+            return self.vertex(request, match.group("model"), stream, sse, rng)
+        if path.endswith("/chat/completions"):
+            return self.azure(request, rng)
+        self.send_json(404, {"message": f"No route for POST {path}"})
+
+    # --- Bedrock runtime ---
+
+    def bedrock(self, request, model_id, stream, rng):
+        outcome = self.state.outcome(rng)
+        if outcome == "throttle":
+            return self.send_json(
+                429, {"message": "Too many requests, please wait before trying again."},
+                {"x-amzn-ErrorType": "ThrottlingException", "Retry-After": str(self.state.config["retry_after_s"])}
+            )
+        if outcome == "error":
+            return self.send_json(500, {"message": "Injected error."}, {"x-amzn-ErrorType": "InternalServerException"})
+
+        started = time.monotonic()
+        prompt_tokens = count_words(request.get("prompt", ""))
+        words = self.simulate(prompt_tokens, request.get("max_gen_len"), rng, stream)
+
+        if not stream:
+            return self.send_json(200, {
+                "generation": " ".join(words),
+                "prompt_token_count": prompt_tokens,
+                "generation_token_count": len(words),
+                "stop_reason": "stop",
+            })
+
+        self.start_chunked("application/vnd.amazon.eventstream")
+        first_byte = None
+        for text, generated in self.stream_tokens(words, rng):
+            first_byte = first_byte or time.monotonic()
+            chunk = {
+                "generation": text,
+                "prompt_token_count": prompt_tokens if generated <= self.state.config["chunk_tokens"] else None,
+                "generation_token_count": generated,
+                "stop_reason": "stop" if generated == len(words) else None,
+            }
+            if generated == len(words):
+                chunk["amazon-bedrock-invocationMetrics"] = {
+                    "inputTokenCount": prompt_tokens,
+                    "outputTokenCount": len(words),
+                    "invocationLatency": int((time.monotonic() - started) * 1000),
+                    "firstByteLatency": int((first_byte - started) * 1000),
+                }
+            payload = json.dumps({"bytes": base64.b64encode(json.dumps(chunk).encode()).decode()}).encode()
+            self.write_chunk(event_stream_message(payload))
+        self.end_chunked()
+
+    # --- Vertex AI ---
+
+    def vertex(self, request, model, stream, sse, rng):
+        outcome = self.state.outcome(rng)
+        if outcome == "throttle":
+            return self.send_json(
+                429, {"error": {"code": 429, "message": "Quota exceeded.", "status": "RESOURCE_EXHAUSTED"}},
+                {"Retry-After": str(self.state.config["retry_after_s"])}
+            )
+        if outcome == "error":
+            return self.send_json(500, {"error": {"code": 500, "message": "Injected error.", "status": "INTERNAL"}})
+
+        prompt = " ".join(
+            part.get("text", "")
+            for content in request.get("contents", [])
+            for part in content.get("parts", [])
+        )
+        prompt_tokens = count_words(prompt)
+        max_tokens = request.get("generationConfig", {}).get("maxOutputTokens")
+        words = self.simulate(prompt_tokens, max_tokens, rng, stream)
+
+        def response(text, generated, finished):
+            candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+            if finished:
+                candidate["finishReason"] = "STOP"
+            return {
+                "candidates": [candidate],
+                "usageMetadata": {
+                    "promptTokenCount": prompt_tokens,
+                    "candidatesTokenCount": generated,
+                    "totalTokenCount": prompt_tokens + generated,
+                },
+                "modelVersion": model,
+            }
+
+        if not stream:
+            return self.send_json(200, response(" ".join(words), len(words), True))
+
+        # Without alt=sse the REST API streams one JSON array
+        self.start_chunked("text/event-stream" if sse else "application/json")
+        first = True
+        for text, generated in self.stream_tokens(words, rng):
+            body = json.dumps(response(text, generated, generated == len(words)))
+            if sse:
+                self.write_chunk(f"data: {body}\r\n\r\n".encode())
+            else:
+                self.write_chunk(("[" if first else ",\r\n").encode() + body.encode())
+            first = False
+        if not sse:
+            self.write_chunk(b"]")
+        self.end_chunked()
+
+    # --- Azure AI Inference ---
+
+    def azure(self, request, rng):
+        outcome = self.state.outcome(rng)
+        if outcome == "throttle":
+            return self.send_json(
+                429, {"error": {"code": "429", "message": "Rate limit is exceeded. Try again later."}},
+                {"Retry-After": str(self.state.config["retry_after_s"])}
+            )
+        if outcome == "error":
+            return self.send_json(500, {"error": {"code": "InternalServerError", "message": "Injected error."}})
+
+        prompt = " ".join(m.get("content", "") for m in request.get("messages", []) if isinstance(m.get("content"), str))
+        prompt_tokens = count_words(prompt)
+        stream = bool(request.get("stream"))
+        words = self.simulate(prompt_tokens, request.get("max_tokens"), rng, stream)
+        model = request.get("model", "mock-llama")
+        created = int(time.time())
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+
+        if not stream:
+            return self.send_json(200, {
+                "id": f"mock-{created}",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        self.start_chunked("text/event-stream")
+        for text, generated in self.stream_tokens(words, rng):
+            chunk = {
+                "id": f"mock-{created}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": "stop" if generated == len(words) else None}],
+            }
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        if request.get("stream_options", {}).get("include_usage"):
+            final = {"id": f"mock-{created}", "object": "chat.completion.chunk", "created": created, "model": model, "choices": [], "usage": usage}
+            self.write_chunk(f"data: {json.dumps(final)}\n\n".encode())
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.end_chunked()
+
+    # --- batch jobs ---
+
+    def batch_post(self, url):
+        # Handle a POST to one of the batch APIs; False if it is for another route
+        query = parse_qs(url.query, keep_blank_values=True)
+        if url.path == "/model-invocation-job":
+            self.bedrock_submit(self.read_json())
+        elif re.match(r"^/v1(beta1)?/projects/[^/]+/locations/[^/]+/batchPredictionJobs$", url.path):
+            self.vertex_submit(self.read_json(), url.path)
+        elif re.match(r"^/upload/storage/v1/b/[^/]+/o$", url.path):
+            self.gcs_upload(url.path.split("/")[5], query)
+        elif url.path == "/openai/files":
+            self.azure_upload()
+        elif url.path == "/openai/batches":
+            self.azure_submit(self.read_json())
+        elif "uploads" in query or "uploadId" in query:
+            bucket, _, key = url.path[1:].partition("/")
+            self.s3_multipart(bucket, unquote(key), query)
+        else:
+            return False
+        return True
+
+    def base_url(self):
+        return f"http://{self.headers.get('Host', '%s:%d' % self.server.server_address)}"
+
+    def read_lines(self, data):
+        return [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+
+    def finish_job(self, job, write):
+        # Write a finished job's output once, on the first poll that finds it
+        # done. The job only reads as finished once the output is written, so
+        # a poll in the meantime still sees it running.
+        with self.state.lock:
+            if job.finished or job.writing:
+                return
+            job.writing = True
+        write(job)
+        with self.state.lock:
+            job.finished = time.time()
+
+    # S3
+
+    def s3_put(self, bucket, key, query):
+        body = self.read_body()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if "uploadId" in query:
+            upload = self.state.uploads.get(query["uploadId"][0])
+            if upload is None:
+                return self.send_xml(404, "Error", {"Code": "NoSuchUpload", "Message": "The upload does not exist."})
+            with self.state.lock:
+                upload[int(query["partNumber"][0])] = body
+        else:
+            with self.state.lock:
+                self.state.objects[(bucket, key)] = body
+        self.send_bytes(200, b"", headers={"ETag": etag})
+
+    def s3_multipart(self, bucket, key, query):
+        body = self.read_body()
+        if "uploads" in query:
+            upload_id = f"mock-upload-{self.state.next_id()}"
+            with self.state.lock:
+                self.state.uploads[upload_id] = {}
+            return self.send_xml(200, "InitiateMultipartUploadResult", {"Bucket": bucket, "Key": key, "UploadId": upload_id})
+        with self.state.lock:
+            parts = self.state.uploads.pop(query["uploadId"][0], None)
+            if parts is not None:
+                self.state.objects[(bucket, key)] = b"".join(parts[number] for number in sorted(parts))
+        if parts is None:
+            return self.send_xml(404, "Error", {"Code": "NoSuchUpload", "Message": "The upload does not exist."})
+        self.send_xml(200, "CompleteMultipartUploadResult", {
+            "Location": f"{self.base_url()}/{bucket}/{quote(key)}", "Bucket": bucket, "Key": key,
+            "ETag": f'"{hashlib.md5(body).hexdigest()}-{len(parts)}"',
+        })
+
+    def s3_get(self, bucket, key):
+        body = self.state.objects.get((bucket, key))
+        if body is None:
+            return self.send_xml(404, "Error", {"Code": "NoSuchKey", "Message": "The specified key does not exist.", "Key": key})
+        self.send_bytes(200, body, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+
+    # Bedrock model invocation jobs
+
+    def bedrock_submit(self, request):
+        source = urlparse(request["inputDataConfig"]["s3InputDataConfig"]["s3Uri"])
+        data = self.state.objects.get((source.netloc, source.path.lstrip("/")))
+        job_id = f"mock{self.state.next_id():08d}"
+        job = MockJob(job_id, self.read_lines(data) if data is not None else [], self.state.config, request=request)
+        if data is None:
+            job.error = f"Input {request['inputDataConfig']['s3InputDataConfig']['s3Uri']} not found."
+        arn = f"arn:aws:bedrock:us-east-1:123456789012:model-invocation-job/{job_id}"
+        with self.state.lock:
+            self.state.jobs[arn] = job
+        self.send_json(200, {"jobArn": arn})
+
+    def bedrock_job(self, arn):
+        job = self.state.jobs.get(arn)
+        if job is None:
+            return self.send_json(404, {"message": f"Job {arn} not found."}, {"x-amzn-ErrorType": "ResourceNotFoundException"})
+        phase, done = job.progress()
+        if phase == "done":
+            self.finish_job(job, self.write_bedrock_output)
+        if job.error:
+            status = "Failed"
+        elif job.finished:
+            status = "PartiallyCompleted" if job.failed else "Completed"
+        else:
+            status = "Scheduled" if phase == "queued" else "InProgress"
+        request = job.info["request"]
+        response = {
+            "jobArn": arn, "jobName": request.get("jobName"), "modelId": request.get("modelId"),
+            "roleArn": request.get("roleArn"), "status": status, "submitTime": iso_time(job.submitted),
+            "lastModifiedTime": iso_time(time.time()), "inputDataConfig": request["inputDataConfig"],
+            "outputDataConfig": request["outputDataConfig"],
+        }
+        if job.error:
+            response["message"] = job.error
+        if job.finished:
+            response["endTime"] = iso_time(job.finished)
+        self.send_json(200, response)
+
+    def write_bedrock_output(self, job):
+        # <output prefix>/<job id>/<input file>.out, and the job manifest
+        request = job.info["request"]
+        source = urlparse(request["inputDataConfig"]["s3InputDataConfig"]["s3Uri"])
+        output = urlparse(request["outputDataConfig"]["s3OutputDataConfig"]["s3Uri"])
+        prefix = posixpath.join(output.path.strip("/"), job.id)
+        lines = []
+        input_tokens = output_tokens = 0
+        for index, record in enumerate(job.records):
+            model_input = record.get("modelInput", {})
+            error, words = self.state.batch_outcome(job.id, index, model_input.get("max_gen_len"))
+            line = {"recordId": record.get("recordId"), "modelInput": model_input}
+            if error:
+                job.failed += 1
+                line["error"] = {"errorCode": 500, "errorMessage": error}
+            else:
+                prompt_tokens = count_words(model_input.get("prompt", ""))
+                input_tokens += prompt_tokens
+                output_tokens += len(words)
+                line["modelOutput"] = {
+                    "generation": " ".join(words), "prompt_token_count": prompt_tokens,
+                    "generation_token_count": len(words), "stop_reason": "stop",
+                }
+            lines.append(json.dumps(line))
+        manifest = {
+            "totalRecordCount": len(job.records), "processedRecordCount": len(job.records),
+            "successRecordCount": len(job.records) - job.failed, "errorRecordCount": job.failed,
+            "inputTokenCount": input_tokens, "outputTokenCount": output_tokens,
+        }
+        with self.state.lock:
+            self.state.objects[(output.netloc, f"{prefix}/{posixpath.basename(source.path)}.out")] = "\n".join(lines).encode() + b"\n"
+            self.state.objects[(output.netloc, f"{prefix}/manifest.json.out")] = json.dumps(manifest).encode()
+
+    # Cloud Storage
+
+    def gcs_resource(self, bucket, name, data, checksums=True):
+        # Object metadata; the client checks an upload against its checksums,
+        # which listings leave out to save hashing every object
+        resource = {
+            "kind": "storage#object", "id": f"{bucket}/{name}/1", "name": name, "bucket": bucket,
+            "generation": "1", "metageneration": "1", "contentType": "application/octet-stream",
+            "size": str(len(data)), "timeCreated": iso_time(time.time()), "updated": iso_time(time.time()),
+        }
+        if checksums:
+            resource["md5Hash"] = base64.b64encode(hashlib.md5(data).digest()).decode()
+            resource["crc32c"] = base64.b64encode(struct.pack(">I", crc32c(data))).decode()
+        return resource
+
+    def gcs_store(self, bucket, name, data):
+        with self.state.lock:
+            self.state.objects[(bucket, name)] = data
+        self.send_json(200, self.gcs_resource(bucket, name, data))
+
+    def gcs_upload(self, bucket, query):
+        upload_type = query.get("uploadType", ["media"])[0]
+        body = self.read_body()
+        if upload_type == "multipart":
+            (_, metadata), (_, data) = split_multipart(body, self.headers.get("Content-Type", ""))[:2]
+            return self.gcs_store(bucket, json.loads(metadata)["name"], data)
+        if upload_type == "resumable":
+            name = json.loads(body)["name"] if body else query["name"][0]
+            upload_id = f"mock-upload-{self.state.next_id()}"
+            with self.state.lock:
+                self.state.uploads[upload_id] = {"bucket": bucket, "name": name, "data": b""}
+            location = f"{self.base_url()}/upload/storage/v1/b/{bucket}/o?uploadType=resumable&upload_id={upload_id}"
+            return self.send_bytes(200, b"", headers={"Location": location})
+        self.gcs_store(bucket, query["name"][0], body)
+
+    def gcs_resumable_chunk(self, upload_id):
+        # A chunk of a resumable upload: 308 with the range received so far
+        # until the last one, which stores the object
+        body = self.read_body()
+        upload = self.state.uploads.get(upload_id)
+        if upload is None:
+            return self.send_json(404, {"error": {"code": 404, "message": "No such upload."}})
+        upload["data"] += body
+        total = self.headers.get("Content-Range", "").rpartition("/")[2]
+        if total == "*" or len(upload["data"]) < int(total or 0):
+            headers = {"Range": f"bytes=0-{len(upload['data']) - 1}"} if upload["data"] else {}
+            self.send_response(308)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        with self.state.lock:
+            self.state.uploads.pop(upload_id, None)
+        self.gcs_store(upload["bucket"], upload["name"], upload["data"])
+
+    def gcs_list(self, bucket, prefix):
+        with self.state.lock:
+            items = [
+                self.gcs_resource(bucket, name, data, checksums=False) for (b, name), data in sorted(self.state.objects.items())
+                if b == bucket and name.startswith(prefix)
+            ]
+        self.send_json(200, {"kind": "storage#objects", "items": items})
+
+    def gcs_get(self, bucket, name, media):
+        data = self.state.objects.get((bucket, name))
+        if data is None:
+            return self.send_json(404, {"error": {"code": 404, "message": f"No such object: {bucket}/{name}"}})
+        if not media:
+            return self.send_json(200, self.gcs_resource(bucket, name, data))
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if not match:
+            return self.send_bytes(200, data)
+        start = int(match.group(1))
+        if start >= len(data):
+            return self.send_bytes(416, b"", headers={"Content-Range": f"bytes */{len(data)}"})
+        end = min(len(data) - 1, int(match.group(2))) if match.group(2) else len(data) - 1
+        self.send_bytes(206, data[start:end + 1], headers={"Content-Range": f"bytes {start}-{end}/{len(data)}"})
+
+    # Vertex AI batch prediction jobs
+
+    def vertex_submit(self, request, path):
+        source = urlparse(request["inputConfig"]["gcsSource"]["uris"][0])
+        data = self.state.objects.get((source.netloc, source.path.lstrip("/")))
+        job_id = str(self.state.next_id())
+        name = f"{path.split('/', 2)[2]}/{job_id}"
+        job = MockJob(job_id, self.read_lines(data) if data is not None else [], self.state.config, request=request, name=name)
+        if data is None:
+            job.error = f"Input {request['inputConfig']['gcsSource']['uris'][0]} not found."
+        with self.state.lock:
+            self.state.jobs[job_id] = job
+        self.send_vertex_job(job_id)
+
+    def send_vertex_job(self, job_id):
+        job = self.state.jobs.get(job_id)
+        if job is None:
+            return self.send_json(404, {"error": {"code": 404, "message": f"Job {job_id} not found.", "status": "NOT_FOUND"}})
+        phase, done = job.progress()
+        if phase == "done":
+            self.finish_job(job, self.write_vertex_output)
+        request = job.info["request"]
+        response = {
+            "name": job.info["name"], "displayName": request.get("displayName", ""), "model": request.get("model", ""),
+            "inputConfig": request["inputConfig"], "outputConfig": request["outputConfig"],
+            "createTime": iso_time(job.submitted), "updateTime": iso_time(time.time()),
+        }
+        if job.error:
+            response.update(state="JOB_STATE_FAILED", error={"code": 5, "message": job.error})
+        elif phase == "queued":
+            response["state"] = "JOB_STATE_PENDING"
+        else:
+            response.update(state="JOB_STATE_RUNNING", startTime=iso_time(job.started()))
+            response["completionStats"] = {"successfulCount": str(done), "failedCount": "0"}
+        if job.finished and not job.error:
+            response.update(
+                state="JOB_STATE_SUCCEEDED", endTime=iso_time(job.finished),
+                outputInfo={"gcsOutputDirectory": job.info["output"]},
+                completionStats={"successfulCount": str(len(job.records) - job.failed), "failedCount": str(job.failed)},
+            )
+        self.send_json(200, response)
+
+    def write_vertex_output(self, job):
+        # <output prefix>/prediction-model-<time>/predictions.jsonl
+        prefix = job.info["request"]["outputConfig"]["gcsDestination"]["outputUriPrefix"].rstrip("/")
+        job.info["output"] = f"{prefix}/prediction-model-{time.strftime('%Y-%m-%dT%H:%M:%S.000000Z', time.gmtime())}"
+        lines = []
+        for index, record in enumerate(job.records):
+            request = record.get("request", {})
+            prompt = " ".join(
+                part.get("text", "") for content in request.get("contents", []) for part in content.get("parts", [])
+            )
+            error, words = self.state.batch_outcome(job.id, index, request.get("generationConfig", {}).get("maxOutputTokens"))
+            line = {"status": error or "", "processed_time": iso_time(time.time()), "request": request}
+            if error:
+                job.failed += 1
+            else:
+                prompt_tokens = count_words(prompt)
+                line["response"] = {
+                    "candidates": [{"content": {"role": "model", "parts": [{"text": " ".join(words)}]}, "finishReason": "STOP"}],
+                    "usageMetadata": {
+                        "promptTokenCount": prompt_tokens, "candidatesTokenCount": len(words),
+                        "totalTokenCount": prompt_tokens + len(words),
+                    },
+                    "modelVersion": job.info["request"].get("model", ""),
+                }
+            lines.append(json.dumps(line))
+        output = urlparse(job.info["output"])
+        with self.state.lock:
+            self.state.objects[(output.netloc, f"{output.path.strip('/')}/predictions.jsonl")] = "\n".join(lines).encode() + b"\n"
+
+    # Azure OpenAI batch API
+
+    def azure_file_object(self, file_id):
+        filename, purpose, data, created = self.state.files[file_id]
+        return {
+            "id": file_id, "object": "file", "bytes": len(data), "created_at": int(created),
+            "filename": filename, "purpose": purpose, "status": "processed",
+        }
+
+    def azure_store_file(self, filename, purpose, data):
+        file_id = f"file-mock{self.state.next_id():08d}"
+        with self.state.lock:
+            self.state.files[file_id] = (filename, purpose, data, time.time())
+        return file_id
+
+    def azure_upload(self):
+        fields = {}
+        filename = "upload.jsonl"
+        for headers, content in split_multipart(self.read_body(), self.headers.get("Content-Type", "")):
+            match = re.search(r'name="([^"]*)"', headers.get("content-disposition", ""))
+            if match:
+                fields[match.group(1)] = content
+                name = re.search(r'filename="([^"]*)"', headers["content-disposition"])
+                if name:
+                    filename = name.group(1)
+        if "file" not in fields:
+            return self.send_json(400, {"error": {"code": "invalidPayload", "message": "No file in the upload."}})
+        file_id = self.azure_store_file(filename, fields.get("purpose", b"batch").decode(), fields["file"])
+        self.send_json(200, self.azure_file_object(file_id))
+
+    def azure_file(self, file_id, content):
+        if file_id not in self.state.files:
+            return self.send_json(404, {"error": {"code": "notFound", "message": f"File {file_id} not found."}})
+        if content:
+            return self.send_bytes(200, self.state.files[file_id][2], "application/octet-stream")
+        self.send_json(200, self.azure_file_object(file_id))
+
+    def azure_submit(self, request):
+        source = self.state.files.get(request.get("input_file_id"))
+        batch_id = f"batch_mock{self.state.next_id():08d}"
+        job = MockJob(batch_id, self.read_lines(source[2]) if source else [], self.state.config, request=request)
+        if source is None:
+            job.error = f"Input file {request.get('input_file_id')} not found."
+        with self.state.lock:
+            self.state.jobs[batch_id] = job
+        self.azure_batch(batch_id)
+
+    def azure_batch(self, batch_id):
+        job = self.state.jobs.get(batch_id)
+        if job is None:
+            return self.send_json(404, {"error": {"code": "notFound", "message": f"Batch {batch_id} not found."}})
+        phase, done = job.progress()
+        if phase == "done":
+            self.finish_job(job, self.write_azure_output)
+        request = job.info["request"]
+        response = {
+            "id": batch_id, "object": "batch", "endpoint": request.get("endpoint"), "errors": None,
+            "input_file_id": request.get("input_file_id"), "completion_window": request.get("completion_window"),
+            "status": {"queued": "validating", "running": "in_progress", "done": "in_progress"}[phase],
+            "output_file_id": None, "error_file_id": None, "created_at": int(job.submitted),
+            "request_counts": {"total": len(job.records), "completed": done, "failed": 0}, "metadata": None,
+        }
+        if phase != "queued":
+            response["in_progress_at"] = int(job.started())
+        if job.error:
+            response.update(status="failed", errors={"object": "list", "data": [{"code": "invalid_file", "message": job.error}]})
+        elif job.finished:
+            response.update(
+                status="completed", completed_at=int(job.finished), output_file_id=job.info["output_file_id"],
+                error_file_id=job.info["error_file_id"],
+                request_counts={"total": len(job.records), "completed": len(job.records) - job.failed, "failed": job.failed},
+            )
+        self.send_json(200, response)
+
+    def write_azure_output(self, job):
+        # Successful requests go to the output file, failed ones to the error file
+        outputs, errors = [], []
+        for index, record in enumerate(job.records):
+            body = record.get("body", {})
+            error, words = self.state.batch_outcome(job.id, index, body.get("max_tokens"))
+            line = {"id": f"batch_req_{index}", "custom_id": record.get("custom_id"), "error": None}
+            if error:
+                job.failed += 1
+                line["response"] = {"status_code": 500, "request_id": f"mock-{index}", "body": {"error": {"code": "server_error", "message": error}}}
+                errors.append(json.dumps(line))
+                continue
+            prompt = " ".join(m.get("content", "") for m in body.get("messages", []) if isinstance(m.get("content"), str))
+            prompt_tokens = count_words(prompt)
+            line["response"] = {"status_code": 200, "request_id": f"mock-{index}", "body": {
+                "id": f"chatcmpl-mock-{index}", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "mock-llama"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)},
+            }}
+            outputs.append(json.dumps(line))
+        job.info["output_file_id"] = self.azure_store_file(f"{job.id}_output.jsonl", "batch_output", "".join(line + "\n" for line in outputs).encode()) if outputs else None
+        job.info["error_file_id"] = self.azure_store_file(f"{job.id}_error.jsonl", "batch_output", "".join(line + "\n" for line in errors).encode()) if errors else None
+
+
+def start_mock_server(config=None, host="127.0.0.1", port=0):
+    # Start the mock on a background thread; port 0 picks a free port.
+    # The server's base URL is server.url; stop it with server.shutdown().
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.state = MockState(config or {})
+    server.url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def use_mock_credentials():
+    # Placeholder credentials, so the SDKs don't go looking for real ones when
+    # pointed at the mock
+    for name, value in [
+        ("AWS_ACCESS_KEY_ID", "mock"), ("AWS_SECRET_ACCESS_KEY", "mock"),
+        ("GOOGLE_CLOUD_PROJECT", "mock-project"),
+        ("AZURE_LLAMAC3_API_KEY", "mock"), ("AZURE_LLAMAC3_MODEL_NAME", "mock-llama"),
+        ("BEDROCK_BATCH_BUCKET", "mock-bucket"), ("BEDROCK_BATCH_ROLE_ARN", "arn:aws:iam::123456789012:role/mock-batch"),
+        ("VERTEX_BATCH_BUCKET", "mock-bucket"),
+    ]:
+        os.environ.setdefault(name, value)
+
+
+def add_mock_arguments(parser):
+    # One option per DEFAULT_CONFIG entry, e.g. --decode-tokens-per-s
+    for key, default in DEFAULT_CONFIG.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(default), default=default)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock of the Bedrock, Vertex AI and Azure inference endpoints.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    config = {key: getattr(args, key) for key in DEFAULT_CONFIG}
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    server.daemon_threads = True
+    server.state = MockState(config)
+    url = f"http://{args.host}:{server.server_address[1]}"
+    print(f"Mock inference server listening on {url}")
+    print("Point the benchmarks at it with:")
+    print(f"  export AWS_ENDPOINT_URL_BEDROCK_RUNTIME={url}")
+    print(f"  export VERTEX_API_ENDPOINT={url}")
+    print(f"  export AZURE_LLAMAC3_ENDPOINT={url}")
+    print("and the batch benchmark at it with:")
+    print(f"  export AWS_ENDPOINT_URL_BEDROCK={url} AWS_ENDPOINT_URL_S3={url}")
+    print(f"  export AZURE_BATCH_ENDPOINT={url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print("Requests served:", server.state.snapshot())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# net_timing.py
+# Per-request network timing. Splits each run's wall time into client-side
+# preparation, DNS lookup, TCP connect, TLS handshake, request upload, server
+# time (waiting for the response headers) and download, using perf_counter().
+#
+# All three SDKs send their HTTP requests through urllib3 (boto3 directly,
+# azure-core and the Vertex REST transport via requests), so the connection
+# phases are measured by wrapping urllib3's connection class and
+# socket.getaddrinfo. The SDK hooks (a botocore event handler and an Azure
+# pipeline policy) mark the moment the SDK hands the signed request to the
+# transport. Phases are recorded on a thread-local trace, so concurrent runs on
+# different worker threads don't mix.
+
+import socket
+import threading
+import time
+
+# Phases in the order they happen; "download" is whatever remains of the run's
+# wall time after the others (reading the body and decoding it)
+PHASES = ["client_prep", "dns", "connect", "tls", "upload", "server", "download"]
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+
+class RequestTrace:
+    # Timings for one run, which may span several HTTP requests (retries)
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.end = None
+        self.first_send = None
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.new_connections = 0
+        self.http_requests = 0
+
+    def mark_send(self):
+        # First moment a request leaves the SDK for the network
+        if self.first_send is None:
+            self.first_send = time.perf_counter()
+
+    def add(self, phase, seconds):
+        self.durations[phase] += seconds
+
+    def phases(self):
+        # Seconds spent in each phase, plus connection and request counts
+        end = self.end or time.perf_counter()
+        total = end - self.start
+        phases = dict(self.durations)
+        phases["client_prep"] = (self.first_send - self.start) if self.first_send else 0.0
+        phases["download"] = max(0.0, total - sum(phases[p] for p in PHASES if p != "download"))
+        phases["new_connections"] = self.new_connections
+        phases["http_requests"] = self.http_requests
+        return phases
+
+
+def current():
+    return getattr(_local, "trace", None)
+
+
+class trace:
+    # Context manager that records the network phases of the calls made inside it
+    #     with net_timing.trace() as t:
+    #         provider.invoke(run)
+    #     t.phases()
+
+    def __enter__(self):
+        self.previous = current()
+        _local.trace = RequestTrace()
+        return _local.trace
+
+    def __exit__(self, *exc):
+        _local.trace.end = time.perf_counter()
+        _local.trace = self.previous
+        return False
+
+
+def _timed(phase, function, before=None):
+    # Wrap function so the time spent in it is added to `phase` of the current
+    # trace. Time already credited to nested phases (e.g. the TCP connect made
+    # lazily inside a request) is taken back out, so nothing is counted twice.
+    def wrapper(*args, **kwargs):
+        active = current()
+        if active is None:
+            return function(*args, **kwargs)
+        if before:
+            before(active)
+        nested_before = sum(active.durations.values())
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = sum(active.durations.values()) - nested_before
+            active.add(phase, elapsed - nested)
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def _count_connection(active):
+    active.new_connections += 1
+    active.mark_send()
+
+
+def _count_request(active):
+    active.http_requests += 1
+    active.mark_send()
+
+
+def install():
+    # Wrap socket.getaddrinfo and urllib3's connections (once per process).
+    # The wrappers only record anything inside a trace(), so untraced calls
+    # just pay for one thread-local lookup.
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        socket.getaddrinfo = _timed("dns", socket.getaddrinfo, before=RequestTrace.mark_send)
+        _installed = True
+        try:
+            import urllib3.connection
+            import urllib3.util.connection
+        except ImportError:
+            # Only the raw-HTTP adapters (raw_http.py) then, which record their own phases
+            return
+
+        # create_connection resolves the host too; that part stays under "dns"
+        urllib3.util.connection.create_connection = _timed(
+            "connect", urllib3.util.connection.create_connection, before=_count_connection
+        )
+        # HTTPSConnection.connect opens the socket and then does the handshake
+        https_class = urllib3.connection.HTTPSConnection
+        https_class.connect = _timed("tls", https_class.connect)
+
+        connection_class = urllib3.connection.HTTPConnection
+        connection_class.request = _timed("upload", connection_class.request, before=_count_request)
+        connection_class.getresponse = _timed("server", connection_class.getresponse)
+
+
+def mark_send(**kwargs):
+    # botocore event handler for "before-send": the request is signed and about
+    # to go out. Returning None lets botocore send it as usual.
+    active = current()
+    if active is not None:
+        active.mark_send()
+
+
+def register_botocore(client):
+    client.meta.events.register("before-send.bedrock-runtime", mark_send)
+
+
+def azure_policy():
+    # An azure-core pipeline policy that marks the send, built lazily so
+    # azure-core is only imported when Azure is benchmarked
+    from azure.core.pipeline.policies import SansIOHTTPPolicy
+
+    class TimingPolicy(SansIOHTTPPolicy):
+        def on_request(self, request):
+            mark_send()
+
+    return TimingPolicy()
@@ -0,0 +1,1059 @@
+# providers.py
+# Provider adapters for the benchmarks. Each adapter wraps one provider's
+# client behind the same interface (connect / invoke / invoke_stream), so one
+# runner can drive any of them in-process. SDKs are imported in connect(), so
+# only the selected providers pay for their imports, and the client is built
+# once and reused for every run.
+
+import base64
+import hashlib
+import json
+import os
+import time
+from urllib.parse import quote
+
+import net_timing
+from benchmark_common import make_result, stream_metrics
+from token_accounting import PENDING, placeholder_tokens
+
+# Shared default question for every provider
+DEFAULT_QUESTION = "I'd like to compare hyperscalers to assess which one is the best choice for enterprise use, in about 600 words?"
+
+
+class Provider:
+    # Short key used on the command line, display name and default output file
+    key = None
+    name = None
+    csv_filename = None
+
+    default_region = None
+    default_model = None
+
+    # Generation settings used unless a workload sets its own
+    default_max_tokens = None
+    default_temperature = None
+
+    # USD per 1K tokens
+    input_token_price = 0.0
+    output_token_price = 0.0
+
+    # Class settings an instance may override (e.g. a targets.py registry
+    # entry's name and prices), which fresh_copy() carries over
+    overridable = ("name", "input_token_price", "output_token_price", "api_key_env")
+
+    # Set before connect() to install the net_timing hooks in the client
+    net_timing = False
+
+    # Print every raw response payload (blocking calls)
+    verbose = False
+
+    # Timer for response times and chunk arrivals; recording.replay() swaps in
+    # the recorded timeline
+    clock = staticmethod(time.perf_counter)
+
+    # Client methods whose responses recording.py captures and replays
+    recorded_calls = ()
+
+    # How requests are sent: through the provider's SDK, or "raw" (RawHTTP)
+    transport = "sdk"
+
+    def __init__(self, prompt=DEFAULT_QUESTION, region=None, model=None, endpoint=None, max_tokens=None, temperature=None):
+        self.prompt = prompt
+        self.region = region or self.default_region
+        self.model = model or self.default_model
+        # Base URL overriding the provider's public endpoint (e.g. mock_server.py)
+        self.endpoint = endpoint
+        # Output cap and sampling temperature sent with every request
+        self.max_tokens = max_tokens or self.default_max_tokens
+        self.temperature = temperature if temperature is not None else self.default_temperature
+        self.client = None
+
+    def connect(self):
+        # Import the SDK and build the client; called once before the first run
+        raise NotImplementedError
+
+    def invoke(self, run):
+        # Send one blocking request and return benchmark_common.make_result(...)
+        raise NotImplementedError
+
+    def invoke_stream(self, run, cancel=None, on_first_token=None):
+        # Send one streaming request and return make_result(..., stream=stream_metrics(...)).
+        # on_first_token() is called when the first content arrives; once the
+        # `cancel` event is set the stream is abandoned at the next chunk and
+        # cancelled_result() returned (used by hedging.HedgedProvider).
+        raise NotImplementedError
+
+    def pending_result(self, elapsed, text, error=None, stream_times=None):
+        # A result without usage figures from the provider. Tokenizing here
+        # would add CPU time to the measurement, so it carries placeholder
+        # counts until token_accounting.finalize_log() counts them after the
+        # load. `stream_times` are stream_metrics()'s start, chunk and end times.
+        prompt_tokens = placeholder_tokens(self.prompt)
+        completion_tokens = placeholder_tokens(text)
+        return make_result(
+            elapsed, prompt_tokens, completion_tokens, prompt_tokens + completion_tokens,
+            self.cost(prompt_tokens, completion_tokens), text, error=error,
+            stream=stream_metrics(*stream_times, completion_tokens) if stream_times else None,
+            token_source=PENDING
+        )
+
+    def cancelled_result(self, start_time, pieces):
+        # A stream abandoned part way: what it cost up to that point, estimated
+        # from the prompt and the text received, marked as an error
+        return self.pending_result(self.clock() - start_time, "".join(pieces), error="Cancelled")
+
+    def is_throttled(self, error):
+        # Whether an exception from invoke() means the provider is rate limiting us
+        return False
+
+    def retry_after(self, error):
+        # Seconds the provider asked us to wait before retrying, if it said
+        return None
+
+    def is_stream_call(self, method, kwargs):
+        # Whether a recorded client call returns a stream of chunks
+        return bool(kwargs.get("stream"))
+
+    def record_response(self, method, kwargs, response, event):
+        # Hand back `response` unchanged to the caller, calling event(item) with
+        # each raw payload (the body, or each stream chunk) as it is read
+        raise NotImplementedError
+
+    def payload_dict(self, item):
+        # A raw payload passed to event(), as JSON-able data for the recording
+        raise NotImplementedError
+
+    def replay_response(self, method, kwargs, payloads):
+        # The response the client would have returned, rebuilt from the
+        # recorded payload dicts (an iterator, read one chunk at a time)
+        raise NotImplementedError
+
+    def payload_text(self, payload):
+        # Generated text in one recorded payload dict
+        raise NotImplementedError
+
+    def fresh_copy(self):
+        # An unconnected adapter with the same settings, for cold-start runs
+        copy = type(self)(
+            self.prompt, region=self.region, model=self.model, endpoint=self.endpoint,
+            max_tokens=self.max_tokens, temperature=self.temperature
+        )
+        copy.net_timing = self.net_timing
+        copy.verbose = self.verbose
+        for setting in self.overridable:
+            if setting in vars(self):
+                setattr(copy, setting, vars(self)[setting])
+        return copy
+
+    def close(self):
+        # Release the client's connection pool
+        close = getattr(self.client, "close", None)
+        if close:
+            close()
+
+    def cost(self, prompt_tokens, completion_tokens):
+        input_cost = (prompt_tokens / 1000) * self.input_token_price
+        output_cost = (completion_tokens / 1000) * self.output_token_price
+        return input_cost + output_cost
+
+
+def _close_stream(stream):
+    # Stop reading a response stream and release its connection
+    close = getattr(stream, "close", None)
+    if close:
+        close()
+
+
+class _RecordedBody:
+    # A response body that hands its bytes to `event` when read
+    def __init__(self, body, event):
+        self.body = body
+        self.event = event
+
+    def read(self, *args):
+        data = self.body.read(*args) if hasattr(self.body, "read") else self.body
+        self.event(data)
+        return data
+
+    def close(self):
+        _close_stream(self.body)
+
+
+class _RecordedStream:
+    # A response stream that hands every item (or the part of it `payload`
+    # picks out, if any) to `event` as it is read
+    def __init__(self, stream, event, payload=None):
+        self.stream = stream
+        self.event = event
+        self.payload = payload
+
+    def __iter__(self):
+        for item in self.stream:
+            data = self.payload(item) if self.payload else item
+            if data is not None:
+                self.event(data)
+            yield item
+
+    def close(self):
+        _close_stream(self.stream)
+
+
+def _retry_after_header(headers):
+    # Retry-After in seconds (or Azure's retry-after-ms), if present and numeric
+    if not headers:
+        return None
+    headers = {name.lower(): value for name, value in headers.items()}
+    for name, scale in (("retry-after-ms", 0.001), ("x-ms-retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers[name]) * scale
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+class BedrockProvider(Provider):
+    key = "aws"
+    name = "AWS Bedrock Llama"
+    csv_filename = "aws_llama_results.csv"
+
+    default_region = "us-east-2"
+    default_model = "meta.llama3-3-70b-instruct-v1:0"  # Llama 3 70B Instruct
+    default_max_tokens = 1100
+    default_temperature = 1.0
+
+    # Pricing for Llama 3 70B Instruct (as of June 2025, update if needed)
+    input_token_price = 0.00072
+    output_token_price = 0.00072
+
+    # Error codes Bedrock uses when a request is over quota
+    throttle_codes = {"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException"}
+
+    def connect(self):
+        import boto3
+        from botocore.config import Config
+
+        # Set up Bedrock runtime client. Without an explicit endpoint boto3 still
+        # honours AWS_ENDPOINT_URL_BEDROCK_RUNTIME. botocore's own retries are
+        # off; throttles are retried (and counted) by rate_limit.Scheduler.
+        self.client = boto3.client(
+            "bedrock-runtime", region_name=self.region, endpoint_url=self.endpoint,
+            config=Config(retries={"mode": "standard", "total_max_attempts": 1})
+        )
+        self.region = self.client.meta.region_name
+        if self.net_timing:
+            net_timing.register_botocore(self.client)
+
+        # Request payload for Llama
+        self.native_request = {
+            "prompt": self.prompt,
+            "max_gen_len": self.max_tokens,
+            "temperature": self.temperature,
+            "top_p": 0.9
+        }
+
+    def is_throttled(self, error):
+        # botocore ClientError (and the EventStreamError raised mid-stream)
+        response = getattr(error, "response", None)
+        if not isinstance(response, dict):
+            return False
+        code = response.get("Error", {}).get("Code")
+        status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        return code in self.throttle_codes or status == 429
+
+    def retry_after(self, error):
+        return _retry_after_header(error.response.get("ResponseMetadata", {}).get("HTTPHeaders"))
+
+    recorded_calls = ("invoke_model", "invoke_model_with_response_stream")
+
+    def is_stream_call(self, method, kwargs):
+        return method == "invoke_model_with_response_stream"
+
+    def record_response(self, method, kwargs, response, event):
+        if method == "invoke_model":
+            return dict(response, body=_RecordedBody(response["body"], event))
+        # Only the chunk events carry payloads
+        return dict(response, body=_RecordedStream(response["body"], event, payload=lambda item: item.get("chunk", {}).get("bytes")))
+
+    def payload_dict(self, item):
+        return json.loads(item)
+
+    def replay_response(self, method, kwargs, payloads):
+        if method == "invoke_model":
+            return {"body": json.dumps(next(payloads)).encode("utf-8")}
+        return {"body": ({"chunk": {"bytes": json.dumps(payload).encode("utf-8")}} for payload in payloads)}
+
+    def payload_text(self, payload):
+        return payload.get("generation") or ""
+
+    def invoke(self, run):
+        # Send the request and measure response time
+        start_time = self.clock()
+        response = self.client.invoke_model(
+            modelId=self.model,
+            body=json.dumps(self.native_request)
+        )
+        end_time = self.clock()
+        elapsed = end_time - start_time
+
+        # Decode the response body
+        body_bytes = response["body"].read() if hasattr(response["body"], "read") else response["body"]
+        model_response = json.loads(body_bytes.decode("utf-8"))
+
+        if self.verbose:
+            print(f"[{self.name}] run {run + 1} payload: {json.dumps(model_response)}")
+
+        # Extract the response text
+        resp_text = model_response.get("generation", "")
+
+        # Token counts come at the top level of the body (or in 'usage' for
+        # some model versions); without either they are counted afterwards
+        usage = model_response.get("usage", {})
+        if usage:
+            prompt_tokens = usage.get("prompt_tokens", usage.get("input_tokens", 0))
+            completion_tokens = usage.get("generation_tokens", usage.get("output_tokens", 0))
+        elif "generation_token_count" in model_response:
+            prompt_tokens = model_response.get("prompt_token_count", 0)
+            completion_tokens = model_response["generation_token_count"]
+        else:
+            return self.pending_result(elapsed, resp_text)
+        total_tokens = prompt_tokens + completion_tokens
+
+        return make_result(
+            elapsed, prompt_tokens, completion_tokens, total_tokens,
+            self.cost(prompt_tokens, completion_tokens), resp_text
+        )
+
+    def invoke_stream(self, run, cancel=None, on_first_token=None):
+        # Stream the response and record when each generated chunk arrives
+        start_time = self.clock()
+        response = self.client.invoke_model_with_response_stream(
+            modelId=self.model,
+            body=json.dumps(self.native_request)
+        )
+
+        pieces = []
+        chunk_times = []
+        prompt_tokens = 0
+        completion_tokens = 0
+        for event in response["body"]:
+            if cancel is not None and cancel.is_set():
+                _close_stream(response["body"])
+                return self.cancelled_result(start_time, pieces)
+            chunk = json.loads(event["chunk"]["bytes"])
+            if chunk.get("generation"):
+                chunk_times.append(self.clock())
+                pieces.append(chunk["generation"])
+                if on_first_token and len(chunk_times) == 1:
+                    on_first_token()
+            # Token counts arrive on the chunks themselves; the last one carries the totals
+            prompt_tokens = chunk.get("prompt_token_count") or prompt_tokens
+            completion_tokens = chunk.get("generation_token_count") or completion_tokens
+            metrics = chunk.get("amazon-bedrock-invocationMetrics")
+            if metrics:
+                prompt_tokens = metrics.get("inputTokenCount", prompt_tokens)
+                completion_tokens = metrics.get("outputTokenCount", completion_tokens)
+        end_time = self.clock()
+        elapsed = end_time - start_time
+
+        resp_text = "".join(pieces)
+        if not completion_tokens:
+            return self.pending_result(elapsed, resp_text, stream_times=(start_time, chunk_times, end_time))
+        total_tokens = prompt_tokens + completion_tokens
+
+        return make_result(
+            elapsed, prompt_tokens, completion_tokens, total_tokens,
+            self.cost(prompt_tokens, completion_tokens), resp_text,
+            stream=stream_metrics(start_time, chunk_times, end_time, completion_tokens)
+        )
+
+
+def _vertex_usage(usage_metadata):
+    # (prompt, completion, total) tokens from Vertex usage metadata, or None
+    # if it reported none. Completion tokens are candidates_token_count; older
+    # responses only have the total, so they are what is left of it.
+    total_tokens = getattr(usage_metadata, "total_token_count", 0)
+    if not total_tokens:
+        return None
+    prompt_tokens = getattr(usage_metadata, "prompt_token_count", 0)
+    completion_tokens = getattr(usage_metadata, "candidates_token_count", 0) or total_tokens - prompt_tokens
+    return prompt_tokens, completion_tokens, total_tokens
+
+
+class VertexProvider(Provider):
+    key = "gcp"
+    name = "GCP Llama"
+    csv_filename = "gcp_llama_results.csv"
+
+    default_region = "us-central1"
+    default_model = "llama-3.3-70b-instruct-maas"
+    default_max_tokens = 3000  # Allow enough tokens for 600+ words
+    default_temperature = 1.0
+
+    # Llama 3.3 70B pricing: $0.72 / million tokens = $0.00072 / 1k tokens
+    input_token_price = 0.00072
+    output_token_price = 0.00072
+
+    def connect(self):
+        import vertexai
+        from vertexai.preview.generative_models import GenerativeModel
+
+        # Get the GCP project ID from environment variable
+        project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
+        if not project_id:
+            raise ValueError("GOOGLE_CLOUD_PROJECT environment variable is not set.")
+
+        # Initialize the Vertex AI client for Llama models. A custom endpoint
+        # (e.g. the mock server) is reached over REST rather than gRPC.
+        # Network timing also needs REST, since gRPC doesn't go through urllib3.
+        endpoint = self.endpoint or os.getenv("VERTEX_API_ENDPOINT")
+        if endpoint:
+            vertexai.init(project=project_id, location=self.region, api_endpoint=endpoint, api_transport="rest")
+        elif self.net_timing:
+            vertexai.init(project=project_id, location=self.region, api_transport="rest")
+        else:
+            vertexai.init(project=project_id, location=self.region)
+        self.client = GenerativeModel(self.model)
+
+        # Configure generation parameters
+        self.generation_config = {
+            "temperature": self.temperature,
+            "top_p": 1,
+            "max_output_tokens": self.max_tokens,
+        }
+
+    def is_throttled(self, error):
+        # google.api_core ResourceExhausted / TooManyRequests carry the HTTP status as .code
+        return getattr(error, "code", None) == 429
+
+    def retry_after(self, error):
+        response = getattr(error, "response", None)
+        return _retry_after_header(getattr(response, "headers", None))
+
+    recorded_calls = ("generate_content",)
+
+    def record_response(self, method, kwargs, response, event):
+        if not kwargs.get("stream"):
+            event(response)
+            return response
+        return _RecordedStream(response, event)
+
+    def payload_dict(self, item):
+        return item.to_dict()
+
+    def replay_response(self, method, kwargs, payloads):
+        from vertexai.preview.generative_models import GenerationResponse
+
+        if not kwargs.get("stream"):
+            return GenerationResponse.from_dict(next(payloads))
+        return (GenerationResponse.from_dict(payload) for payload in payloads)
+
+    def payload_text(self, payload):
+        candidates = payload.get("candidates") or [{}]
+        return "".join(part.get("text", "") for part in candidates[0].get("content", {}).get("parts", []))
+
+    def invoke(self, run):
+        start_time = self.clock()  # Start timing
+        # Generate content using the Llama model
+        response = self.client.generate_content(
+            self.prompt,
+            generation_config=self.generation_config,
+            stream=False  # Disable streaming for simpler token counting
+        )
+        end_time = self.clock()  # End timing
+        elapsed = end_time - start_time
+        if self.verbose:
+            print(f"[{self.name}] run {run + 1} payload: {json.dumps(self.payload_dict(response))}")
+
+        # Extract the response text
+        full_response = response.text
+
+        usage = _vertex_usage(getattr(response, "usage_metadata", None))
+        if usage is None:
+            return self.pending_result(elapsed, full_response)
+        prompt_tokens, completion_tokens, total_tokens = usage
+
+        return make_result(
+            elapsed, prompt_tokens, completion_tokens, total_tokens,
+            self.cost(prompt_tokens, completion_tokens), full_response
+        )
+
+    def invoke_stream(self, run, cancel=None, on_first_token=None):
+        # Stream the response and record when each text chunk arrives
+        start_time = self.clock()
+        responses = self.client.generate_content(
+            self.prompt,
+            generation_config=self.generation_config,
+            stream=True
+        )
+
+        pieces = []
+        chunk_times = []
+        usage_metadata = None
+        for chunk in responses:
+            if cancel is not None and cancel.is_set():
+                _close_stream(responses)
+                return self.cancelled_result(start_time, pieces)
+            # Chunks without candidates (e.g. a trailing usage-only chunk) have no text
+            text = chunk.text if chunk.candidates and chunk.candidates[0].content.parts else ""
+            if text:
+                chunk_times.append(self.clock())
+                pieces.append(text)
+                if on_first_token and len(chunk_times) == 1:
+                    on_first_token()
+            # Usage is cumulative, so the last chunk that reports it has the totals
+            if getattr(chunk, "usage_metadata", None):
+                usage_metadata = chunk.usage_metadata
+        end_time = self.clock()
+        elapsed = end_time - start_time
+
+        full_response = "".join(pieces)
+        usage = _vertex_usage(usage_metadata)
+        if usage is None:
+            return self.pending_result(elapsed, full_response, stream_times=(start_time, chunk_times, end_time))
+        prompt_tokens, completion_tokens, total_tokens = usage
+
+        return make_result(
+            elapsed, prompt_tokens, completion_tokens, total_tokens,
+            self.cost(prompt_tokens, completion_tokens), full_response,
+            stream=stream_metrics(start_time, chunk_times, end_time, completion_tokens)
+        )
+
+
+class AzureProvider(Provider):
+    key = "azure"
+    name = "Azure Llama"
+    csv_filename = "azure_llama_results.csv"
+
+    # Pricing for Llama-3-70B-Instruct (as of June 2025, pay-as-you-go)
+    input_token_price = 0.00071
+    output_token_price = 0.00071
+
+    default_max_tokens = 2048
+    default_temperature = 0.8
+
+    # Environment variable the API key is read from; each deployment in a
+    # target registry (targets.py) can name its own
+    api_key_env = "AZURE_LLAMAC3_API_KEY"
+
+    def __init__(self, prompt=DEFAULT_QUESTION, region=None, model=None, endpoint=None, max_tokens=None, temperature=None):
+        super().__init__(prompt, region, model, endpoint, max_tokens, temperature)
+        # The region isn't part of the endpoint, so it comes from the environment
+        self.region = region or os.getenv("AZURE_LLAMAC3_REGION", "unknown")
+
+    def connect(self):
+        from azure.ai.inference import ChatCompletionsClient
+        from azure.ai.inference.models import SystemMessage, UserMessage
+        from azure.core.credentials import AzureKeyCredential
+
+        # Load endpoint, model name, and API key from environment variables
+        endpoint = self.endpoint or os.getenv("AZURE_LLAMAC3_ENDPOINT")
+        if endpoint is None:
+            raise ValueError("AZURE_LLAMAC3_ENDPOINT environment variable is not set.")
+
+        self.model = self.model or os.getenv("AZURE_LLAMAC3_MODEL_NAME")
+        if self.model is None:
+            raise ValueError("AZURE_LLAMAC3_MODEL_NAME environment variable is not set.")
+
+        api_key = os.getenv(self.api_key_env)
+        if api_key is None:
+            raise ValueError(f"{self.api_key_env} environment variable is not set.")
+
+        self.client = ChatCompletionsClient(
+            endpoint=endpoint,
+            credential=AzureKeyCredential(api_key),
+            api_version="2024-05-01-preview",
+            per_retry_policies=[net_timing.azure_policy()] if self.net_timing else [],
+            # azure-core's retries are off; rate_limit.Scheduler retries throttles
+            retry_total=0
+        )
+        self.messages = [
+            SystemMessage(content="You are a helpful assistant."),
+            UserMessage(content=self.prompt),
+        ]
+
+    def is_throttled(self, error):
+        # azure.core.exceptions.HttpResponseError
+        return getattr(error, "status_code", None) == 429
+
+    def retry_after(self, error):
+        response = getattr(error, "response", None)
+        return _retry_after_header(getattr(response, "headers", None))
+
+    recorded_calls = ("complete",)
+
+    def record_response(self, method, kwargs, response, event):
+        if not kwargs.get("stream"):
+            event(response)
+            return response
+        return _RecordedStream(response, event)
+
+    def payload_dict(self, item):
+        return item.as_dict()
+
+    def replay_response(self, method, kwargs, payloads):
+        from azure.ai.inference.models import ChatCompletions, StreamingChatCompletionsUpdate
+
+        if not kwargs.get("stream"):
+            return ChatCompletions(next(payloads))
+        return (StreamingChatCompletionsUpdate(payload) for payload in payloads)
+
+    def payload_text(self, payload):
+        choices = payload.get("choices") or [{}]
+        content = choices[0].get("delta") or choices[0].get("message") or {}
+        return content.get("content") or ""
+
+    def invoke(self, run):
+        start_time = self.clock()
+        response = self.client.complete(
+            messages=self.messages,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            top_p=0.1,
+            model=self.model,
+            #timeout=60  # timeout in seconds
+        )
+        end_time = self.clock()
+        elapsed = end_time - start_time
+        if self.verbose:
+            print(f"[{self.name}] run {run + 1} payload: {json.dumps(self.payload_dict(response))}")
+
+        # Get the response text
+        resp_text = response.choices[0].message.content or ""
+
+        # Extract token usage information if available
+        usage = getattr(response, "usage", None)
+        if not usage:
+            return self.pending_result(elapsed, resp_text)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0)
+        completion_tokens = getattr(usage, "completion_tokens", 0)
+        total_tokens = getattr(usage, "total_tokens", 0)
+
+        return make_result(
+            elapsed, prompt_tokens, completion_tokens, total_tokens,
+            self.cost(prompt_tokens, completion_tokens), resp_text
+        )
+
+    def invoke_stream(self, run, cancel=None, on_first_token=None):
+        # Stream the response and record when each content delta arrives
+        start_time = self.clock()
+        response = self.client.complete(
+            messages=self.messages,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            top_p=0.1,
+            model=self.model,
+            stream=True,
+            # Ask for a final usage update so streamed runs still get token counts
+            model_extras={"stream_options": {"include_usage": True}},
+        )
+
+        pieces = []
+        chunk_times = []
+        usage = None
+        for update in response:
+            if cancel is not None and cancel.is_set():
+                _close_stream(response)
+                return self.cancelled_result(start_time, pieces)
+            if update.choices and update.choices[0].delta and update.choices[0].delta.content:
+                chunk_times.append(self.clock())
+                pieces.append(update.choices[0].delta.content)
+                if on_first_token and len(chunk_times) == 1:
+                    on_first_token()
+            if getattr(update, "usage", None):
+                usage = update.usage
+        end_time = self.clock()
+        elapsed = end_time - start_time
+
+        # Deployments that ignore include_usage send none
+        if not usage:
+            return self.pending_result(elapsed, "".join(pieces), stream_times=(start_time, chunk_times, end_time))
+        prompt_tokens = getattr(usage, "prompt_tokens", 0)
+        completion_tokens = getattr(usage, "completion_tokens", 0)
+        total_tokens = getattr(usage, "total_tokens", 0)
+
+        return make_result(
+            elapsed, prompt_tokens, completion_tokens, total_tokens,
+            self.cost(prompt_tokens, completion_tokens), "".join(pieces),
+            stream=stream_metrics(start_time, chunk_times, end_time, completion_tokens)
+        )
+
+
+class RawHTTP:
+    # Mixed into a provider's adapter to send the same API calls through
+    # raw_http.py instead of the SDK: same model, settings and prices, with
+    # the request body encoded once in connect(). Warm runs share the
+    # process-wide pool; a cold-start copy gets a pool of its own, so it
+    # opens a new connection as a new SDK client would.
+
+    transport = "raw"
+    recorded_calls = ()
+
+    # Send through the HTTP/2 pool (needs httpx[http2])
+    http2 = False
+
+    # Set by fresh_copy() for cold-start runs
+    private_pool = False
+
+    def fresh_copy(self):
+        copy = super().fresh_copy()
+        copy.http2 = self.http2
+        copy.private_pool = True
+        return copy
+
+    def connect_pool(self):
+        import raw_http
+
+        if self.private_pool:
+            self.client = raw_http.HTTP2Pool() if self.http2 else raw_http.ConnectionPool()
+        else:
+            self.client = raw_http.shared_pool(self.http2)
+
+    def close(self):
+        # The shared pool outlives any one adapter
+        if self.private_pool and self.client is not None:
+            self.client.close()
+
+    def is_throttled(self, error):
+        import raw_http
+
+        if not isinstance(error, raw_http.HTTPError):
+            return False
+        return error.status_code == 429 or error.error_type in getattr(self, "throttle_codes", ())
+
+    def retry_after(self, error):
+        return _retry_after_header(getattr(error, "headers", None))
+
+    def request_headers(self, url, body):
+        # Headers for one request, auth included
+        return self.headers
+
+    def post(self, url, body):
+        # Send `body` and return the response once its headers are in
+        import raw_http
+
+        response = self.client.request("POST", url, self.request_headers(url, body), body)
+        if response.status >= 300:
+            raise raw_http.HTTPError(response.status, response.headers, response.read())
+        return response
+
+    def print_payload(self, run, payload):
+        if self.verbose:
+            print(f"[{self.name}] run {run + 1} payload: {json.dumps(payload)}")
+
+
+class RawBedrockProvider(RawHTTP, BedrockProvider):
+    key = "aws-raw"
+    name = "AWS Bedrock Llama (raw HTTP)"
+    csv_filename = "aws_llama_raw_results.csv"
+
+    def connect(self):
+        import raw_http
+
+        endpoint = (
+            self.endpoint or os.getenv("AWS_ENDPOINT_URL_BEDROCK_RUNTIME") or os.getenv("AWS_ENDPOINT_URL")
+            or f"https://bedrock-runtime.{self.region}.amazonaws.com"
+        ).rstrip("/")
+        self.connect_pool()
+        # bedrock-runtime is signed as "bedrock"
+        self.signer = raw_http.SigV4Signer("bedrock", self.region)
+        self.signer.credentials()
+        path = f"{endpoint}/model/{quote(self.model, safe='')}"
+        self.invoke_url = f"{path}/invoke"
+        self.stream_url = f"{path}/invoke-with-response-stream"
+        self.native_request = {
+            "prompt": self.prompt,
+            "max_gen_len": self.max_tokens,
+            "temperature": self.temperature,
+            "top_p": 0.9
+        }
+        self.body = json.dumps(self.native_request).encode("utf-8")
+        self.body_hash = hashlib.sha256(self.body).hexdigest()
+        self.headers = {"Host": raw_http.host_header(endpoint), "Content-Type": "application/json", "Accept": "application/json"}
+
+    def request_headers(self, url, body):
+        # Signed per request, since the signature covers the time
+        return self.signer.headers("POST", url, self.headers, self.body_hash)
+
+    def invoke(self, run):
+        # Timed as the SDK path is: invoke_model returns before the body is read
+        start_time = self.clock()
+        response = self.post(self.invoke_url, self.body)
+        end_time = self.clock()
+        elapsed = end_time - start_time
+        payload = json.loads(response.read())
+        self.print_payload(run, payload)
+
+        resp_text = payload.get("generation", "")
+        usage = payload.get("usage", {})
+        if usage:
+            prompt_tokens = usage.get("prompt_tokens", usage.get("input_tokens", 0))
+            completion_tokens = usage.get("generation_tokens", usage.get("output_tokens", 0))
+        elif "generation_token_count" in payload:
+            prompt_tokens = payload.get("prompt_token_count", 0)
+            completion_tokens = payload["generation_token_count"]
+        else:
+            return self.pending_result(elapsed, resp_text)
+        return make_result(
+            elapsed, prompt_tokens, completion_tokens, prompt_tokens + completion_tokens,
+            self.cost(prompt_tokens, completion_tokens), resp_text
+        )
+
+    def invoke_stream(self, run, cancel=None, on_first_token=None):
+        import raw_http
+
+        start_time = self.clock()
+        response = self.post(self.stream_url, self.body)
+
+        pieces = []
+        chunk_times = []
+        prompt_tokens = 0
+        completion_tokens = 0
+        for headers, message in raw_http.event_stream_messages(response.iter_chunks()):
+            if cancel is not None and cancel.is_set():
+                response.close()
+                return self.cancelled_result(start_time, pieces)
+            if headers.get(":message-type") == "exception":
+                # An error part way through the stream, e.g. a ThrottlingException
+                response.close()
+                error_type = headers.get(":exception-type", "")
+                raise raw_http.HTTPError(429 if error_type in self.throttle_codes else 500, {"x-amzn-errortype": error_type}, message)
+            chunk = json.loads(base64.b64decode(json.loads(message)["bytes"]))
+            if chunk.get("generation"):
+                chunk_times.append(self.clock())
+                pieces.append(chunk["generation"])
+                if on_first_token and len(chunk_times) == 1:
+                    on_first_token()
+            prompt_tokens = chunk.get("prompt_token_count") or prompt_tokens
+            completion_tokens = chunk.get("generation_token_count") or completion_tokens
+            metrics = chunk.get("amazon-bedrock-invocationMetrics")
+            if metrics:
+                prompt_tokens = metrics.get("inputTokenCount", prompt_tokens)
+                completion_tokens = metrics.get("outputTokenCount", completion_tokens)
+        end_time = self.clock()
+        elapsed = end_time - start_time
+
+        resp_text = "".join(pieces)
+        if not completion_tokens:
+            return self.pending_result(elapsed, resp_text, stream_times=(start_time, chunk_times, end_time))
+        return make_result(
+            elapsed, prompt_tokens, completion_tokens, prompt_tokens + completion_tokens,
+            self.cost(prompt_tokens, completion_tokens), resp_text,
+            stream=stream_metrics(start_time, chunk_times, end_time, completion_tokens)
+        )
+
+
+def _vertex_payload(payload):
+    # (text, (prompt, completion, total) tokens or None) from a generateContent response dict
+    candidates = payload.get("candidates") or [{}]
+    text = "".join(part.get("text", "") for part in candidates[0].get("content", {}).get("parts", []))
+    usage = payload.get("usageMetadata") or {}
+    total_tokens = usage.get("totalTokenCount", 0)
+    if not total_tokens:
+        return text, None
+    prompt_tokens = usage.get("promptTokenCount", 0)
+    completion_tokens = usage.get("candidatesTokenCount", 0) or total_tokens - prompt_tokens
+    return text, (prompt_tokens, completion_tokens, total_tokens)
+
+
+class RawVertexProvider(RawHTTP, VertexProvider):
+    key = "gcp-raw"
+    name = "GCP Llama (raw HTTP)"
+    csv_filename = "gcp_llama_raw_results.csv"
+
+    def connect(self):
+        import raw_http
+
+        project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
+        if not project_id:
+            raise ValueError("GOOGLE_CLOUD_PROJECT environment variable is not set.")
+        endpoint = (self.endpoint or os.getenv("VERTEX_API_ENDPOINT") or f"https://{self.region}-aiplatform.googleapis.com").rstrip("/")
+        if "://" not in endpoint:
+            endpoint = f"https://{endpoint}"
+        self.connect_pool()
+        # The mock server takes no credentials; everything else gets an OAuth token
+        self.token = None if self.endpoint else raw_http.GoogleToken()
+        if self.token:
+            self.token.header()
+        # The resource GenerativeModel resolves a bare model name to, on the same API version
+        model = self.model if "/" in self.model else f"publishers/google/models/{self.model}"
+        base = f"{endpoint}/v1beta1/projects/{project_id}/locations/{self.region}/{model}"
+        self.invoke_url = f"{base}:generateContent"
+        self.stream_url = f"{base}:streamGenerateContent?alt=sse"
+        self.body = json.dumps({
+            "contents": [{"role": "user", "parts": [{"text": self.prompt}]}],
+            "generationConfig": {"temperature": self.temperature, "topP": 1, "maxOutputTokens": self.max_tokens},
+        }).encode("utf-8")
+        self.headers = {"Host": raw_http.host_header(endpoint), "Content-Type": "application/json"}
+
+    def request_headers(self, url, body):
+        if self.token is None:
+            return self.headers
+        return dict(self.headers, Authorization=self.token.header())
+
+    def invoke(self, run):
+        start_time = self.clock()
+        payload = json.loads(self.post(self.invoke_url, self.body).read())
+        end_time = self.clock()
+        elapsed = end_time - start_time
+        self.print_payload(run, payload)
+
+        resp_text, usage = _vertex_payload(payload)
+        if usage is None:
+            return self.pending_result(elapsed, resp_text)
+        prompt_tokens, completion_tokens, total_tokens = usage
+        return make_result(
+            elapsed, prompt_tokens, completion_tokens, total_tokens,
+            self.cost(prompt_tokens, completion_tokens), resp_text
+        )
+
+    def invoke_stream(self, run, cancel=None, on_first_token=None):
+        import raw_http
+
+        start_time = self.clock()
+        response = self.post(self.stream_url, self.body)
+
+        pieces = []
+        chunk_times = []
+        usage = None
+        for event in raw_http.sse_events(response.iter_chunks()):
+            if cancel is not None and cancel.is_set():
+                response.close()
+                return self.cancelled_result(start_time, pieces)
+            text, chunk_usage = _vertex_payload(json.loads(event))
+            if text:
+                chunk_times.append(self.clock())
+                pieces.append(text)
+                if on_first_token and len(chunk_times) == 1:
+                    on_first_token()
+            usage = chunk_usage or usage
+        end_time = self.clock()
+        elapsed = end_time - start_time
+
+        if usage is None:
+            return self.pending_result(elapsed, "".join(pieces), stream_times=(start_time, chunk_times, end_time))
+        prompt_tokens, completion_tokens, total_tokens = usage
+        return make_result(
+            elapsed, prompt_tokens, completion_tokens, total_tokens,
+            self.cost(prompt_tokens, completion_tokens), "".join(pieces),
+            stream=stream_metrics(start_time, chunk_times, end_time, completion_tokens)
+        )
+
+
+class RawAzureProvider(RawHTTP, AzureProvider):
+    key = "azure-raw"
+    name = "Azure Llama (raw HTTP)"
+    csv_filename = "azure_llama_raw_results.csv"
+
+    def connect(self):
+        import raw_http
+
+        endpoint = self.endpoint or os.getenv("AZURE_LLAMAC3_ENDPOINT")
+        if endpoint is None:
+            raise ValueError("AZURE_LLAMAC3_ENDPOINT environment variable is not set.")
+        self.model = self.model or os.getenv("AZURE_LLAMAC3_MODEL_NAME")
+        if self.model is None:
+            raise ValueError("AZURE_LLAMAC3_MODEL_NAME environment variable is not set.")
+        api_key = os.getenv(self.api_key_env)
+        if api_key is None:
+            raise ValueError(f"{self.api_key_env} environment variable is not set.")
+
+        self.connect_pool()
+        # The same api-version and request the SDK sends
+        self.url = f"{endpoint.rstrip('/')}/chat/completions?api-version=2024-05-01-preview"
+        request = {
+            "messages": [
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": self.prompt},
+            ],
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "top_p": 0.1,
+            "model": self.model,
+        }
+        self.body = json.dumps(request).encode("utf-8")
+        self.stream_body = json.dumps(dict(request, stream=True, stream_options={"include_usage": True})).encode("utf-8")
+        self.headers = {
+            "Host": raw_http.host_header(self.url), "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        }
+
+    def invoke(self, run):
+        start_time = self.clock()
+        payload = json.loads(self.post(self.url, self.body).read())
+        end_time = self.clock()
+        elapsed = end_time - start_time
+        self.print_payload(run, payload)
+
+        resp_text = payload["choices"][0]["message"].get("content") or ""
+        usage = payload.get("usage")
+        if not usage:
+            return self.pending_result(elapsed, resp_text)
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        return make_result(
+            elapsed, prompt_tokens, completion_tokens, usage.get("total_tokens", 0),
+            self.cost(prompt_tokens, completion_tokens), resp_text
+        )
+
+    def invoke_stream(self, run, cancel=None, on_first_token=None):
+        import raw_http
+
+        start_time = self.clock()
+        response = self.post(self.url, self.stream_body)
+
+        pieces = []
+        chunk_times = []
+        usage = None
+        for event in raw_http.sse_events(response.iter_chunks()):
+            if cancel is not None and cancel.is_set():
+                response.close()
+                return self.cancelled_result(start_time, pieces)
+            if event == b"[DONE]":
+                continue
+            update = json.loads(event)
+            choices = update.get("choices")
+            content = choices[0].get("delta", {}).get("content") if choices else None
+            if content:
+                chunk_times.append(self.clock())
+                pieces.append(content)
+                if on_first_token and len(chunk_times) == 1:
+                    on_first_token()
+            usage = update.get("usage") or usage
+        end_time = self.clock()
+        elapsed = end_time - start_time
+
+        if not usage:
+            return self.pending_result(elapsed, "".join(pieces), stream_times=(start_time, chunk_times, end_time))
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        return make_result(
+            elapsed, prompt_tokens, completion_tokens, usage.get("total_tokens", 0),
+            self.cost(prompt_tokens, completion_tokens), "".join(pieces),
+            stream=stream_metrics(start_time, chunk_times, end_time, completion_tokens)
+        )
+
+
+# Adapters by command-line key, in the order run_all_benchmarks runs them
+PROVIDERS = {
+    "gcp": VertexProvider,
+    "aws": BedrockProvider,
+    "azure": AzureProvider,
+}
+
+# The same providers over raw_http.py instead of their SDKs
+RAW_PROVIDERS = {
+    "gcp": RawVertexProvider,
+    "aws": RawBedrockProvider,
+    "azure": RawAzureProvider,
+}
+
+# Ways to reach the providers: their SDKs, or raw HTTP
+TRANSPORTS = {"sdk": PROVIDERS, "raw": RAW_PROVIDERS}
+
+
+def get_provider(key, prompt=DEFAULT_QUESTION, region=None, model=None, endpoint=None, max_tokens=None, temperature=None,
+                 transport="sdk"):
+    adapters = TRANSPORTS[transport]
+    if key not in adapters:
+        raise ValueError(f"Unknown provider '{key}'. Choose from: {', '.join(adapters)}")
+    return adapters[key](prompt, region=region, model=model, endpoint=endpoint, max_tokens=max_tokens, temperature=temperature)
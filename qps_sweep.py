@@ -0,0 +1,94 @@
+import argparse
+import csv
+
+from benchmark_common import add_load_arguments, load_options, run_provider
+from providers import DEFAULT_QUESTION, PROVIDERS, get_provider
+
+# Finds the highest request rate each provider sustains: open-loop load at
+# increasing arrival rates, with latency measured from the intended send time,
+# until p99 passes the SLO (or too many requests fail). A closed-loop run can't
+# answer this, since it slows down to whatever rate the provider manages.
+
+parser = argparse.ArgumentParser(description="Find the highest request rate each Llama provider sustains within a p99 latency SLO.")
+parser.add_argument("--question", type=str, default=DEFAULT_QUESTION, help="The question to send.")
+parser.add_argument("--providers", type=str, default=",".join(PROVIDERS), help="Comma-separated providers to test (gcp, aws, azure).")
+parser.add_argument("--rates", type=str, default="0.5,1,2,4,8", help="Comma-separated arrival rates (requests/s) to try, lowest first.")
+parser.add_argument("--slo-p99", type=float, required=True, help="p99 latency (seconds from the intended send time) a rate must stay within: TTFT with --stream, response time otherwise.")
+parser.add_argument("--max-error-rate", type=float, default=0.01, help="Highest share of failed requests a rate may have.")
+parser.add_argument("--keep-going", action="store_true", help="Try every rate, not just up to the first one that breaks the SLO.")
+parser.add_argument("--mock", action="store_true", help="Point every provider at a local mock_server.py instead of the real endpoints.")
+parser.add_argument("--summary-csv", type=str, default="qps_sweep.csv", help="The CSV filename to write the sweep to.")
+add_load_arguments(parser)
+args = parser.parse_args()
+
+rates = sorted(float(rate) for rate in args.rates.split(","))
+latency = "corrected_ttft" if args.stream else "corrected_response_time"
+
+mock_url = None
+if args.mock:
+    from mock_server import start_mock_server, use_mock_credentials
+
+    mock_url = start_mock_server().url
+    use_mock_credentials()
+    print(f"Using mock inference server at {mock_url}")
+    # Mock latencies would mix into the history and the regression baselines
+    args.store = ""
+
+rows = []
+sustainable = {}
+for key in args.providers.split(","):
+    provider = get_provider(key.strip(), args.question, endpoint=mock_url)
+    provider.net_timing = args.net_timing
+    try:
+        provider.connect()
+    except Exception as e:
+        print(f"Skipping {provider.name}: {e}")
+        continue
+    sustainable[provider.name] = None
+    broken = False
+    for rate in rates:
+        print(f"\n=== {provider.name} at {rate:g} requests/s ===\n")
+        options = load_options(args, provider.key)
+        options["arrival_rate"] = rate
+        stats = run_provider(provider, f"qps_{provider.key}_{rate:g}_results.csv", **options)
+        p99 = stats["metrics"].get(latency, {}).get("p99")
+        meets = p99 is not None and p99 <= args.slo_p99 and stats["error_rate"] <= args.max_error_rate
+        rows.append((provider.name, rate, stats, p99, meets))
+        print(f"{provider.name} at {rate:g} requests/s: p99 {'n/a' if p99 is None else f'{p99:.3f}s'}, "
+              f"{stats['error_rate']:.1%} errors, {'within' if meets else 'breaks'} the SLO")
+        if meets and not broken:
+            sustainable[provider.name] = rate
+        elif not meets:
+            # With --keep-going the higher rates are still measured, but only
+            # the rates below the first failure count as sustainable
+            broken = True
+            if not args.keep_going:
+                break
+
+
+def metric(stats, name, statistic):
+    value = stats["metrics"].get(name, {}).get(statistic)
+    return "" if value is None else f"{value:.3f}"
+
+
+service = "ttft" if args.stream else "response_time"
+with open(args.summary_csv, mode="w", newline="", encoding="utf-8") as f:
+    writer = csv.writer(f)
+    writer.writerow([
+        "Provider", "Arrival Rate (req/s)", "Achieved Rate (req/s)", "Runs", "Errors", "Error Rate",
+        "Schedule Delay P99 (s)", "Service P99 (s)", "P50 (s)", "P90 (s)", "P99 (s)", "SLO P99 (s)", "Meets SLO"
+    ])
+    for name, rate, stats, p99, meets in rows:
+        writer.writerow([
+            name, f"{rate:g}", f"{stats['attempts_per_s']:.3f}", stats["runs"], stats["errors"], f"{stats['error_rate']:.4f}",
+            metric(stats, "schedule_delay", "p99"), metric(stats, service, "p99"), metric(stats, latency, "p50"),
+            metric(stats, latency, "p90"), metric(stats, latency, "p99"), args.slo_p99, "yes" if meets else "no",
+        ])
+
+print()
+for name, rate in sustainable.items():
+    if rate is None:
+        print(f"{name}: no tested rate kept p99 within {args.slo_p99:g}s")
+    else:
+        print(f"{name}: max sustainable rate {rate:g} requests/s (p99 within {args.slo_p99:g}s)")
+print(f"\nSweep written to {args.summary_csv}")
@@ -0,0 +1,143 @@
+# rate_limit.py
+# Client-side rate limiting and throttle handling for the benchmarks. Each
+# provider gets a Scheduler that holds its requests to a requests/min and
+# tokens/min budget (token buckets shared by all of the provider's worker
+# threads) and retries throttled requests (429 / ThrottlingException) after the
+# provider's Retry-After, or with exponential backoff when there is none.
+# The SDKs' own retries are turned off (see providers.py), so every throttle is
+# seen and counted here instead of disappearing into a slower response time.
+
+import random
+import threading
+import time
+
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BASE_BACKOFF = 1.0   # seconds before the first retry without Retry-After
+DEFAULT_MAX_BACKOFF = 60.0
+
+# Per-run fields filled in by Scheduler.call (see benchmark_common.make_result)
+RETRY_FIELDS = ["throttles", "retry_time", "queue_time"]
+
+
+class TokenBucket:
+    # Refills at per_minute / 60 per second, up to `burst` (one second's worth,
+    # and at least 1, by default). take() reserves capacity up front and sleeps
+    # until the reservation is covered, so waiting threads are served in order
+    # and the bucket can go into debt when a charge exceeds what is left.
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self, amount):
+        # Take `amount` and return how long to wait before it is covered
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def take(self, amount=1):
+        # Block until `amount` is available; returns the seconds waited
+        wait = self._reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def charge(self, amount):
+        # Use up `amount` after the fact (e.g. tokens, once the response says how many)
+        self._reserve(amount)
+
+
+class ThrottledError(Exception):
+    # Raised when a request is still throttled after the last retry
+    pass
+
+
+def parse_limits(value):
+    # "--rpm 60" applies to every provider; "--rpm aws=60,azure=120" sets them
+    # one by one. Returns {provider key or None: per-minute limit}.
+    if not value:
+        return {}
+    limits = {}
+    for part in str(value).split(","):
+        key, _, number = part.rpartition("=")
+        limits[key.strip() or None] = float(number)
+    return limits
+
+
+def limit_for(limits, key):
+    # The limit for one provider from parse_limits(), falling back to the
+    # provider's base key (a raw-HTTP adapter's "aws-raw" shares "aws"'s
+    # quota) and then to the shared one
+    return limits.get(key, limits.get(key.split("-")[0], limits.get(None)))
+
+
+class Scheduler:
+    # Wraps one provider's invoke(run). `is_throttled(error)` and
+    # `retry_after(error)` come from the provider adapter.
+
+    def __init__(self, is_throttled, retry_after, rpm=None, tpm=None, max_retries=DEFAULT_MAX_RETRIES,
+                 base_backoff=DEFAULT_BASE_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF):
+        self.is_throttled = is_throttled
+        self.retry_after = retry_after
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+    def backoff(self, attempt):
+        # Exponential backoff with jitter, so throttled threads don't retry in lockstep
+        delay = min(self.max_backoff, self.base_backoff * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    def wait_for_budget(self):
+        waited = 0.0
+        if self.tokens:
+            # Token use is only known afterwards, so wait until earlier requests are paid for
+            waited += self.tokens.take(0)
+        if self.requests:
+            waited += self.requests.take(1)
+        return waited
+
+    def call(self, invoke, run):
+        # invoke(run) within the budget, retrying throttles. The result gets the
+        # number of throttled attempts, the time they and the backoff took
+        # (retry_time) and the time spent waiting for the budget (queue_time).
+        # Errors carry the same fields as attributes.
+        throttles = 0
+        retry_time = 0.0
+        queue_time = 0.0
+        while True:
+            queue_time += self.wait_for_budget()
+            attempt_start = time.perf_counter()
+            try:
+                result = invoke(run)
+            except Exception as e:
+                if not self.is_throttled(e):
+                    e.throttles, e.retry_time, e.queue_time = throttles, retry_time, queue_time
+                    raise
+                throttles += 1
+                if throttles > self.max_retries:
+                    error = ThrottledError(f"still throttled after {self.max_retries} retries: {e}")
+                    error.throttles, error.retry_time, error.queue_time = throttles, retry_time, queue_time
+                    raise error from e
+                delay = self.retry_after(e)
+                if delay is None:
+                    delay = self.backoff(throttles - 1)
+                time.sleep(delay)
+                retry_time += time.perf_counter() - attempt_start
+                continue
+            if self.tokens:
+                self.tokens.charge(result["total_tokens"])
+            result["throttles"] = throttles
+            result["retry_time"] = retry_time
+            result["queue_time"] = queue_time
+            return result
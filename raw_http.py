@@ -0,0 +1,437 @@
+# raw_http.py
+# A lean HTTP transport for the providers' inference APIs, used by the raw
+# adapters in providers.py (RawBedrockProvider and friends) to tell provider
+# latency apart from client-library overhead. Compared with the SDKs:
+#   - one connection pool is shared by every provider and thread: HTTP/1.1
+#     keep-alive over http.client, or HTTP/2 through httpx when it is
+#     installed with h2 (pip install "httpx[http2]")
+#   - there are no retries and no request or response model objects: a body
+#     is one json.dumps and one json.loads
+#   - auth is worked out once and cached: the SigV4 signing key for a day,
+#     the OAuth access token until shortly before it expires, the API key
+#     header for good
+#   - streamed bodies are parsed as the bytes come off the socket: SSE events
+#     and AWS event-stream messages are sliced straight out of one buffer,
+#     without decoding the stream as text first
+# Inside a net_timing.trace() the HTTP/1.1 pool records the DNS, connect,
+# TLS, upload and server phases of its own requests.
+
+import collections
+import datetime
+import hashlib
+import hmac
+import http.client
+import os
+import socket
+import ssl
+import struct
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+import net_timing
+
+DEFAULT_TIMEOUT = 120.0     # seconds to wait on a socket
+DEFAULT_MAX_IDLE = 64       # idle connections kept per host
+READ_SIZE = 64 * 1024
+
+# Errors a kept-alive connection the server has since closed fails with
+# before any of the response has arrived
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class HTTPError(Exception):
+    # A response outside 2xx. status_code, headers and the error type AWS
+    # puts in x-amzn-ErrorType are what the raw adapters' is_throttled() and
+    # retry_after() look at.
+
+    def __init__(self, status, headers, body):
+        self.status_code = status
+        self.headers = headers
+        self.body = body
+        self.error_type = headers.get("x-amzn-errortype", "").split(":")[0]
+        error_type = f" {self.error_type}" if self.error_type else ""
+        super().__init__(f"HTTP {status}{error_type}: {body[:500].decode('utf-8', 'replace')}")
+
+
+class Response:
+    # A response from the HTTP/1.1 pool. Read the body with read() or
+    # iter_chunks(); the connection goes back to the pool once the body has
+    # been read to the end, and is dropped by close() before that.
+
+    def __init__(self, pool, key, connection, raw):
+        self.pool = pool
+        self.key = key
+        self.connection = connection
+        self.raw = raw
+        self.status = raw.status
+        self.headers = {name.lower(): value for name, value in raw.getheaders()}
+
+    def read(self):
+        body = self.raw.read()
+        self._release()
+        return body
+
+    def iter_chunks(self):
+        # The body as it arrives; for chunked responses, about one chunk at a time
+        while True:
+            chunk = self.raw.read1(READ_SIZE)
+            if not chunk:
+                break
+            yield chunk
+        self._release()
+
+    def _release(self):
+        if self.connection is not None:
+            self.pool.release(self.key, self.connection, reusable=not self.raw.will_close)
+            self.connection = None
+
+    def close(self):
+        # Abandon the body (e.g. a cancelled stream) and the connection with it
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class ConnectionPool:
+    # Idle keep-alive connections per (scheme, host, port), shared by every
+    # thread. A request takes an idle connection (or opens one) and the
+    # response puts it back when its body has been read.
+
+    def __init__(self, max_idle=DEFAULT_MAX_IDLE, timeout=DEFAULT_TIMEOUT):
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.idle = collections.defaultdict(list)
+        self.lock = threading.Lock()
+        self.ssl_context = ssl.create_default_context()
+
+    def _connect(self, scheme, host, port):
+        # A new connection, with its DNS, connect and TLS time recorded in
+        # the current net_timing trace if there is one
+        active = net_timing.current()
+        if active is not None:
+            active.new_connections += 1
+            active.mark_send()
+        started = time.perf_counter()
+        # net_timing.install() may have wrapped getaddrinfo; time it here only
+        getaddrinfo = getattr(socket.getaddrinfo, "__wrapped__", socket.getaddrinfo)
+        family, kind, protocol, _, address = getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0]
+        resolved = time.perf_counter()
+        sock = socket.socket(family, kind, protocol)
+        try:
+            sock.settimeout(self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.connect(address)
+            connected = time.perf_counter()
+            if scheme == "https":
+                sock = self.ssl_context.wrap_socket(sock, server_hostname=host)
+        except BaseException:
+            sock.close()
+            raise
+        if active is not None:
+            active.add("dns", resolved - started)
+            active.add("connect", connected - resolved)
+            active.add("tls", time.perf_counter() - connected)
+        connection = http.client.HTTPConnection(host, port, timeout=self.timeout)
+        connection.sock = sock
+        return connection
+
+    def _take(self, key):
+        with self.lock:
+            idle = self.idle[key]
+            return idle.pop() if idle else None
+
+    def release(self, key, connection, reusable=True):
+        with self.lock:
+            idle = self.idle[key]
+            if reusable and len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def request(self, method, url, headers, body=b""):
+        # Send one request and return its Response once the headers are in.
+        # `headers` must include Host. A kept-alive connection the server has
+        # closed is replaced once; nothing else is retried.
+        parts = urlsplit(url)
+        scheme = parts.scheme
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        target = parts.path + ("?" + parts.query if parts.query else "")
+        connection = self._take(key)
+        reused = connection is not None
+        while True:
+            if connection is None:
+                connection = self._connect(scheme, parts.hostname, port)
+            active = net_timing.current()
+            if active is not None:
+                active.http_requests += 1
+                active.mark_send()
+            try:
+                started = time.perf_counter()
+                connection.request(method, target, body=body, headers=headers)
+                sent = time.perf_counter()
+                raw = connection.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                connection.close()
+                if not reused:
+                    raise
+                connection, reused = None, False
+                continue
+            except BaseException:
+                connection.close()
+                raise
+            if active is not None:
+                active.add("upload", sent - started)
+                active.add("server", time.perf_counter() - sent)
+            return Response(self, key, connection, raw)
+
+    def close(self):
+        with self.lock:
+            connections = [connection for idle in self.idle.values() for connection in idle]
+            self.idle.clear()
+        for connection in connections:
+            connection.close()
+
+
+class HTTP2Response:
+    # The Response interface over an httpx streamed response
+
+    def __init__(self, response):
+        self.response = response
+        self.status = response.status_code
+        self.headers = {name.lower(): value for name, value in response.headers.items()}
+
+    def read(self):
+        try:
+            return self.response.read()
+        finally:
+            self.response.close()
+
+    def iter_chunks(self):
+        try:
+            yield from self.response.iter_raw()
+        finally:
+            self.response.close()
+
+    def close(self):
+        self.response.close()
+
+
+class HTTP2Pool:
+    # The ConnectionPool interface over an httpx client speaking HTTP/2, so
+    # every request to a host is multiplexed over one connection. httpx
+    # doesn't expose connection phases, so net_timing only sees the total.
+
+    def __init__(self, max_idle=DEFAULT_MAX_IDLE, timeout=DEFAULT_TIMEOUT):
+        import httpx
+
+        self.client = httpx.Client(
+            http2=True, timeout=timeout,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=max_idle)
+        )
+
+    def request(self, method, url, headers, body=b""):
+        headers = {name: value for name, value in headers.items() if name.lower() != "host"}
+        request = self.client.build_request(method, url, headers=headers, content=body)
+        return HTTP2Response(self.client.send(request, stream=True))
+
+    def close(self):
+        self.client.close()
+
+
+_shared_pools = {}
+_shared_lock = threading.Lock()
+
+
+def shared_pool(http2=False):
+    # The process-wide pool every raw adapter sends through
+    with _shared_lock:
+        if http2 not in _shared_pools:
+            _shared_pools[http2] = HTTP2Pool() if http2 else ConnectionPool()
+        return _shared_pools[http2]
+
+
+def host_header(url):
+    # The Host header for `url`, with the port only when it isn't the default
+    parts = urlsplit(url)
+    default = 443 if parts.scheme == "https" else 80
+    return parts.hostname if parts.port in (None, default) else f"{parts.hostname}:{parts.port}"
+
+
+def _sign(key, message):
+    return hmac.new(key, message.encode("utf-8"), hashlib.sha256).digest()
+
+
+class SigV4Signer:
+    # AWS Signature Version 4 for one service and region. Credentials come
+    # from the environment or, when botocore is installed, from its provider
+    # chain (profiles, SSO, instance roles), which refreshes them before they
+    # expire. The signing key is derived once per day and secret key.
+
+    def __init__(self, service, region, credentials=None):
+        self.service = service
+        self.region = region
+        self.lock = threading.Lock()
+        self.static = credentials
+        self.provider = None
+        self.signing_key = (None, None, None)  # (date, secret key, key)
+
+    def credentials(self):
+        # (access key, secret key, session token or None)
+        if self.static is None and os.getenv("AWS_ACCESS_KEY_ID") and os.getenv("AWS_SECRET_ACCESS_KEY"):
+            self.static = (os.environ["AWS_ACCESS_KEY_ID"], os.environ["AWS_SECRET_ACCESS_KEY"], os.getenv("AWS_SESSION_TOKEN"))
+        if self.static is not None:
+            return self.static
+        with self.lock:
+            if self.provider is None:
+                import botocore.session
+
+                self.provider = botocore.session.get_session().get_credentials()
+                if self.provider is None:
+                    raise ValueError("No AWS credentials found.")
+        frozen = self.provider.get_frozen_credentials()
+        return frozen.access_key, frozen.secret_key, frozen.token
+
+    def key(self, date, secret_key):
+        with self.lock:
+            cached_date, cached_secret, key = self.signing_key
+            if cached_date != date or cached_secret != secret_key:
+                key = _sign(("AWS4" + secret_key).encode("utf-8"), date)
+                for part in (self.region, self.service, "aws4_request"):
+                    key = _sign(key, part)
+                self.signing_key = (date, secret_key, key)
+            return key
+
+    def headers(self, method, url, headers, payload_hash, now=None):
+        # `headers` (which must include Host) with X-Amz-Date, the session
+        # token and Authorization added. `payload_hash` is the body's SHA-256
+        # hex digest, which callers sending the same body can work out once.
+        access_key, secret_key, token = self.credentials()
+        amz_date = (now or datetime.datetime.utcnow()).strftime("%Y%m%dT%H%M%SZ")
+        date = amz_date[:8]
+        signed = dict(headers)
+        signed["X-Amz-Date"] = amz_date
+        if token:
+            signed["X-Amz-Security-Token"] = token
+        canonical_headers = sorted((name.lower(), " ".join(str(value).split())) for name, value in signed.items())
+        signed_names = ";".join(name for name, _ in canonical_headers)
+        parts = urlsplit(url)
+        query = sorted(
+            (quote(name, safe="-_.~"), quote(value, safe="-_.~"))
+            for name, _, value in (item.partition("=") for item in parts.query.split("&") if item)
+        )
+        # Services other than S3 sign the path as sent, percent-encoded again
+        canonical_request = "\n".join([
+            method,
+            quote(parts.path or "/", safe="/~"),
+            "&".join(f"{name}={value}" for name, value in query),
+            "".join(f"{name}:{value}\n" for name, value in canonical_headers),
+            signed_names,
+            payload_hash,
+        ])
+        scope = f"{date}/{self.region}/{self.service}/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
+        ])
+        signature = hmac.new(self.key(date, secret_key), string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+        signed["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, SignedHeaders={signed_names}, Signature={signature}"
+        )
+        return signed
+
+
+class GoogleToken:
+    # An OAuth access token from Google application default credentials,
+    # refreshed when it is within five minutes of expiring
+
+    refresh_margin = datetime.timedelta(minutes=5)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.credentials = None
+
+    def header(self):
+        with self.lock:
+            if self.credentials is None:
+                import google.auth
+
+                self.credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+            expiry = self.credentials.expiry
+            if not self.credentials.token or (expiry and expiry - self.refresh_margin <= datetime.datetime.utcnow()):
+                from google.auth.transport.requests import Request
+
+                self.credentials.refresh(Request())
+            return f"Bearer {self.credentials.token}"
+
+
+def sse_events(chunks):
+    # The data of each server-sent event in a stream of byte chunks, as
+    # bytes. Lines are found in one buffer as chunks arrive; only each
+    # event's data is copied out.
+    buffer = bytearray()
+    data = []
+    for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line_end = end - 1 if end > start and buffer[end - 1] == 13 else end  # \r\n
+            if line_end == start:
+                if data:
+                    yield b"\n".join(data)
+                    data = []
+            elif buffer.startswith(b"data:", start):
+                value_start = start + 6 if buffer[start + 5:start + 6] == b" " else start + 5
+                data.append(bytes(buffer[value_start:line_end]))
+            start = end + 1
+        del buffer[:start]
+    if data:
+        yield b"\n".join(data)
+
+
+# Sizes of the fixed-size AWS event-stream header value types
+_EVENT_HEADER_SIZES = {0: 0, 1: 0, 2: 1, 3: 2, 4: 4, 5: 8, 8: 8, 9: 16}
+
+
+def _event_headers(buffer, offset, end):
+    # The string-valued headers of one event-stream message
+    headers = {}
+    while offset < end:
+        name_length = buffer[offset]
+        name = bytes(buffer[offset + 1:offset + 1 + name_length]).decode("utf-8")
+        value_type = buffer[offset + 1 + name_length]
+        offset += 2 + name_length
+        if value_type in (6, 7):
+            (length,) = struct.unpack_from("!H", buffer, offset)
+            if value_type == 7:
+                headers[name] = bytes(buffer[offset + 2:offset + 2 + length]).decode("utf-8")
+            offset += 2 + length
+        else:
+            offset += _EVENT_HEADER_SIZES[value_type]
+    return headers
+
+
+def event_stream_messages(chunks):
+    # (headers, payload bytes) for each message of an AWS event stream
+    # (prelude, headers, payload, CRC) in a stream of byte chunks. Messages
+    # are framed by their length in one buffer; the CRCs aren't checked, as
+    # TLS already protects the bytes.
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        offset = 0
+        while len(buffer) - offset >= 12:
+            total_length, headers_length = struct.unpack_from("!II", buffer, offset)
+            if len(buffer) - offset < total_length:
+                break
+            headers_start = offset + 12
+            payload_start = headers_start + headers_length
+            yield (
+                _event_headers(buffer, headers_start, payload_start),
+                bytes(buffer[payload_start:offset + total_length - 4]),
+            )
+            offset += total_length
+        del buffer[:offset]
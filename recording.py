@@ -0,0 +1,301 @@
+# recording.py
+# Record and replay of raw provider responses, so analysis changes can be
+# tried again on real responses without paying for new calls.
+#
+# Recording (--record) wraps the provider's client: every payload it returns
+# (the response body, or each stream chunk) is captured with its arrival time,
+# and stored per run, as the provider's own JSON, with the fields the harness
+# measured around the call (throttles, queueing, network phases ...). The file
+# is gzip-compressed JSON Lines next to the CSV, <base>_recording.jsonl.gz,
+# flushed after every run like the results log, so an interrupted benchmark
+# keeps what it recorded:
+#
+#   {"type": "recording", "provider": "aws", "model": ..., "prompt": ..., "mode": "stream", ...}
+#   {"type": "run", "phase": "warm", "run": 0, "result": {...}, "calls": [
+#       {"method": ..., "stream": true, "returned": s, "events": [[s, payload], ...]}]}
+#   {"type": "series", "phase": "warm", "wall_time": s}
+#
+# Replay feeds a recording back through the provider adapter's own parsing
+# (with the SDK's response types, but a client that never touches the
+# network), then token counting, statistics, the CSV and the results store,
+# on a clock that follows the recorded timeline:
+#
+#     python recording.py aws_llama_results_recording.jsonl.gz --csv aws_replay.csv
+#
+# mock_server.py --replay serves the recorded timing (time to first chunk,
+# chunk gaps and texts) to any client, so harness changes can be measured
+# against real latency shapes.
+
+import argparse
+import datetime
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+
+# Fields of a result measured by the harness rather than parsed from the
+# response, stored with each run and restored on replay
+HARNESS_FIELDS = [
+    "timestamp", "error", "response_time", "network", "client_setup", "throttles", "retry_time", "queue_time",
+    "schedule_delay",
+]
+
+# Base URL a replayed provider is connected to: a closed local port, so a
+# call that isn't replayed fails at once instead of reaching the provider
+REPLAY_ENDPOINT = "http://127.0.0.1:9"
+
+
+def recording_filename(csv_filename):
+    # The recording lives next to the per-run CSV
+    return os.path.splitext(csv_filename)[0] + "_recording.jsonl.gz"
+
+
+class _RecordingClient:
+    # Stands in for a provider's client, passing every call through and
+    # capturing the responses of the provider's recorded_calls
+
+    def __init__(self, client, provider, recorder):
+        self._client = client
+        self._provider = provider
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if name not in self._provider.recorded_calls:
+            return attribute
+        return lambda *args, **kwargs: self._recorder.call(self._provider, name, attribute, args, kwargs)
+
+
+class Recorder:
+    # Writes one provider's recording. With resume=True an existing file is
+    # continued (as a new gzip member, which readers see as one stream).
+
+    def __init__(self, path, provider, mode, concurrency, resume=False):
+        self.path = path
+        self.lock = threading.Lock()
+        # Calls made by the run in progress on each worker thread
+        self.local = threading.local()
+        resuming = resume and os.path.exists(path)
+        self.file = gzip.open(path, "at" if resuming else "wt", encoding="utf-8")
+        if not resuming:
+            self._write({
+                "type": "recording",
+                "provider": provider.key,
+                "name": provider.name,
+                "model": provider.model,
+                "region": provider.region,
+                "prompt": provider.prompt,
+                "max_tokens": provider.max_tokens,
+                "temperature": provider.temperature,
+                "mode": mode,
+                "concurrency": concurrency,
+                "started": datetime.datetime.utcnow().isoformat() + "Z",
+            })
+
+    def _write(self, record):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self.lock:
+            self.file.write(line)
+            # A sync flush ends the compressed data on a byte boundary, so
+            # everything up to here can be read back after a crash
+            self.file.flush()
+
+    def attach(self, provider):
+        # Record the calls of this (connected) provider's client from now on
+        provider.client = _RecordingClient(provider.client, provider, self)
+
+    def call(self, provider, method, function, args, kwargs):
+        # One client call. Payloads are kept as the SDK returned them and only
+        # converted to JSON in add(), after the timing is over.
+        call = {"method": method, "stream": provider.is_stream_call(method, kwargs), "events": []}
+        if "stream" in kwargs:
+            call["kwargs"] = {"stream": kwargs["stream"]}
+        if not hasattr(self.local, "calls"):
+            self.local.calls = []
+        self.local.calls.append((provider, call))
+        start = time.perf_counter()
+
+        def event(item):
+            call["events"].append((time.perf_counter() - start, item))
+
+        try:
+            response = function(*args, **kwargs)
+        except Exception as e:
+            call["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            call["returned"] = time.perf_counter() - start
+        return provider.record_response(method, kwargs, response, event)
+
+    def add(self, phase, run, result):
+        # Store the run that just completed on this thread with its calls
+        # (throttled attempts first, the one that produced the result last)
+        calls = getattr(self.local, "calls", [])
+        self.local.calls = []
+        self._write({
+            "type": "run",
+            "phase": phase,
+            "run": run,
+            "result": {field: result.get(field) for field in HARNESS_FIELDS},
+            "calls": [
+                dict(call, events=[[round(t, 6), provider.payload_dict(item)] for t, item in call["events"]])
+                for provider, call in calls
+            ],
+        })
+
+    def end_series(self, phase, wall_time):
+        self._write({"type": "series", "phase": phase, "wall_time": wall_time})
+
+    def close(self):
+        self.file.close()
+
+
+def read_recording(path):
+    # Yield the records of a recording. A file cut short by a crash ends at
+    # its last complete flush.
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+        except (EOFError, zlib.error):
+            return
+
+
+class _ReplayClock(threading.local):
+    # The recorded timeline of the call being replayed, in seconds from its start
+    t = 0.0
+
+    def now(self):
+        return self.t
+
+
+class _ReplayClient:
+    # Stands in for a provider's client, answering the recorded_calls with
+    # the responses of self.call (set before each run) on the replay clock
+
+    def __init__(self, provider, clock):
+        self.provider = provider
+        self.clock = clock
+        self.call = None
+
+    def __getattr__(self, name):
+        if name not in self.provider.recorded_calls:
+            raise AttributeError(f"{name} is not available when replaying a recording")
+
+        def replayed(*args, **kwargs):
+            recorded = self.call
+            self.clock.t = recorded["returned"]
+            return self.provider.replay_response(name, kwargs, self._payloads(recorded))
+
+        return replayed
+
+    def _payloads(self, recorded):
+        # A blocking response is complete when the call returns; a stream's
+        # chunks each arrive at their recorded time, and it ends with the run
+        for t, payload in recorded["events"]:
+            if recorded["stream"]:
+                self.clock.t = t
+            yield payload
+        if recorded["stream"]:
+            self.clock.t = max(self.clock.t, recorded.get("end", self.clock.t))
+
+
+def replay(path, csv_filename, store=None):
+    # Rebuild a benchmark from a recording: each recorded run is parsed again
+    # by the provider adapter and written, with the harness's own fields, to a
+    # new results log, CSV, statistics and (if given) results store. Returns
+    # the statistics.
+    from benchmark_common import finish_benchmark, make_result
+    from mock_server import use_mock_credentials
+    from providers import get_provider
+    from results_log import ResultsLog, log_filename
+
+    records = read_recording(path)
+    header = next(records, None)
+    if not header or header.get("type") != "recording":
+        raise ValueError(f"{path} is not a recording")
+
+    # The SDK clients are built as usual, but every call goes to the replay
+    # client; placeholder credentials keep the SDKs from looking for real ones
+    use_mock_credentials()
+    provider = get_provider(
+        header["provider"], header["prompt"], region=header["region"], model=header["model"],
+        endpoint=REPLAY_ENDPOINT, max_tokens=header["max_tokens"], temperature=header["temperature"]
+    )
+    provider.connect()
+    clock = _ReplayClock()
+    provider.clock = clock.now
+    client = _ReplayClient(provider, clock)
+    provider.client = client
+    stream = header["mode"] == "stream"
+    invoke = provider.invoke_stream if stream else provider.invoke
+
+    log_path = log_filename(csv_filename)
+    log = ResultsLog(log_path)
+    replayed = 0
+    try:
+        for record in records:
+            if record["type"] == "series":
+                log.end_series(record["phase"], record["wall_time"])
+                continue
+            if record["type"] != "run":
+                continue
+            measured = record["result"]
+            if measured["error"] or not record["calls"]:
+                # Failed runs have no response to parse, only their error
+                result = make_result(0, 0, 0, 0, 0, "", error=measured["error"] or "Not recorded")
+            else:
+                client.call = dict(record["calls"][-1], end=measured["response_time"])
+                clock.t = 0.0
+                result = invoke(record["run"])
+            result.update({field: value for field, value in measured.items() if field not in ("error", "response_time")})
+            result["phase"] = record["phase"]
+            log.append(record["phase"], record["run"], result)
+            replayed += 1
+    finally:
+        log.close()
+    print(f"Replayed {replayed} runs of {header['name']} from {path}")
+    return finish_benchmark(provider, csv_filename, log_path, header["concurrency"], stream, store)
+
+
+def load_traces(path):
+    # The timing traces of a recording's successful calls, for mock_server.py:
+    # {"stream": bool, "returned": s, "chunks": [[s, text], ...]} each
+    from providers import get_provider
+
+    traces = []
+    provider = None
+    for record in read_recording(path):
+        if record["type"] == "recording":
+            provider = get_provider(record["provider"], record["prompt"])
+        elif record["type"] == "run" and not record["result"]["error"] and record["calls"]:
+            call = record["calls"][-1]
+            traces.append({
+                "stream": call["stream"],
+                "returned": call["returned"],
+                "chunks": [
+                    [t if call["stream"] else call["returned"], provider.payload_text(payload)]
+                    for t, payload in call["events"]
+                ],
+            })
+    return traces
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded benchmark through the parsing and statistics pipeline, offline.")
+    parser.add_argument("recording", type=str, help="A *_recording.jsonl.gz file written with --record.")
+    parser.add_argument("--csv", type=str, default=None, help="CSV to write the replayed results to (default: <recording>_replay.csv).")
+    # Not the default store: the recorded runs are already in it, with the
+    # same timestamps, and adding them again would count every sample twice
+    parser.add_argument("--store", type=str, default="", help="SQLite results store to add the replayed runs to (default: none).")
+    args = parser.parse_args()
+
+    from benchmark_common import print_summary
+
+    csv_filename = args.csv or args.recording.replace("_recording.jsonl.gz", "") + "_replay.csv"
+    print_summary(replay(args.recording, csv_filename, args.store))
@@ -0,0 +1,163 @@
+# regressions.py
+# Finds when a provider got slower (or faster) in the run history of the
+# results store, instead of comparing dated summaries by eye. Each group's
+# runs (provider, region, model and mode by default) are split into segments,
+# one per benchmark or per time window, and every segment is tested against
+# the runs of the segments before it with a rolling Mann-Whitney U test, which
+# makes no assumption about the shape of the latency distribution. A shift is
+# reported when it is significant (p below --alpha) and large enough (the
+# median moved by at least --min-change); it is a regression when the metric
+# got worse, and a breach when the regression is at least --max-regression.
+#
+#     python regressions.py --days 30 --window 1D --max-regression 0.2 --output regressions.json
+#
+# Writes a JSON report of every shift and exits with status 1 when there is
+# a breach in the latest segment of any group (or in any segment, with
+# --fail-on any), so it can gate a scheduled job or CI step.
+#
+# Needs pandas 2.x (pip install pandas), like report.py.
+
+import argparse
+import datetime
+import json
+import statistics
+import sys
+
+from benchmark_stats import mann_whitney
+from report import GROUP_KEYS, load_runs
+from results_store import DEFAULT_STORE, METRIC_COLUMNS
+
+DEFAULT_METRICS = ["response_time", "ttft", "decode_tokens_per_s"]
+
+# Metrics where a higher value is an improvement; for the rest lower is better
+HIGHER_IS_BETTER = {"decode_tokens_per_s"}
+
+
+def segments(group, window=None):
+    # A group's runs as [(segment key, start, end, runs)], oldest first: one
+    # segment per benchmark, or per `window` (a pandas frequency such as 1D)
+    key = group["timestamp"].dt.floor(window) if window else group["benchmark_id"]
+    found = []
+    for value, runs in group.groupby(key, sort=False):
+        found.append((value.isoformat() if window else value, runs["timestamp"].min(), runs["timestamp"].max(), runs))
+    found.sort(key=lambda segment: segment[1])
+    return found
+
+
+def detect(runs, group_by, metrics=DEFAULT_METRICS, window=None, baseline=3, alpha=0.01, min_change=0.05,
+           max_regression=0.1, min_samples=5):
+    # Every significant shift in the history, as dicts: the group, the metric,
+    # the segment and its baseline (the runs of up to `baseline` segments
+    # before it), their sizes and medians, the relative change of the median,
+    # the test's p-value and effect size, and whether it is a regression and
+    # a breach
+    findings = []
+    successes = runs[runs["error"].isna()]
+    for key_values, group in successes.groupby(group_by, sort=True):
+        key_values = key_values if isinstance(key_values, tuple) else (key_values,)
+        group_segments = segments(group, window)
+        for metric in metrics:
+            series = [
+                (segment_key, start, end, runs_in[metric].dropna().tolist())
+                for segment_key, start, end, runs_in in group_segments
+            ]
+            for index in range(1, len(series)):
+                segment_key, start, end, values = series[index]
+                reference = [value for _, _, _, previous in series[max(0, index - baseline):index] for value in previous]
+                if len(values) < min_samples or len(reference) < min_samples:
+                    continue
+                test = mann_whitney(reference, values)
+                reference_median = statistics.median(reference)
+                median = statistics.median(values)
+                if not reference_median:
+                    continue
+                change = (median - reference_median) / reference_median
+                if test["p"] >= alpha or abs(change) < min_change:
+                    continue
+                worse = change < 0 if metric in HIGHER_IS_BETTER else change > 0
+                findings.append({
+                    **dict(zip(group_by, key_values)),
+                    "metric": metric,
+                    "segment": segment_key,
+                    "start": start.isoformat(),
+                    "end": end.isoformat(),
+                    "latest": index == len(series) - 1,
+                    "baseline_runs": len(reference),
+                    "runs": len(values),
+                    "baseline_median": reference_median,
+                    "median": median,
+                    "change": change,
+                    "p_value": test["p"],
+                    "effect": test["effect"],
+                    "direction": "regression" if worse else "improvement",
+                    "breach": worse and abs(change) >= max_regression,
+                })
+    return findings
+
+
+def format_finding(finding, group_by):
+    group = " ".join(str(finding[key]) or "-" for key in group_by)
+    flag = " BREACH" if finding["breach"] else ""
+    return (
+        f"{finding['direction']}{flag}: {group} {finding['metric']} median {finding['baseline_median']:.3f} -> "
+        f"{finding['median']:.3f} ({finding['change']:+.1%}, p={finding['p_value']:.2g}) "
+        f"in {finding['segment']} ({finding['start']} to {finding['end']})"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect significant latency and throughput shifts in the results store.")
+    parser.add_argument("--store", type=str, default=DEFAULT_STORE, help="SQLite results store to read.")
+    parser.add_argument("--group-by", type=str, default="provider,region,model,mode", help=f"Comma-separated columns from: {', '.join(GROUP_KEYS)}.")
+    parser.add_argument("--metrics", type=str, default=",".join(DEFAULT_METRICS), help="Comma-separated metrics to test.")
+    parser.add_argument("--window", type=str, default=None, help="Segment each group by time window (pandas frequency, e.g. 1D or 1h) instead of by benchmark.")
+    parser.add_argument("--baseline", type=int, default=3, help="Segments before each one whose runs make up its baseline.")
+    parser.add_argument("--alpha", type=float, default=0.01, help="Significance level of the Mann-Whitney test.")
+    parser.add_argument("--min-change", type=float, default=0.05, help="Smallest relative change of the median reported (e.g. 0.05 for 5%%).")
+    parser.add_argument("--max-regression", type=float, default=0.1, help="Relative worsening of the median that counts as a breach.")
+    parser.add_argument("--min-samples", type=int, default=5, help="Fewest successful runs in a segment and in its baseline to test it.")
+    parser.add_argument("--fail-on", type=str, choices=["latest", "any"], default="latest", help="Exit with status 1 for breaches in each group's latest segment only, or in any segment.")
+    parser.add_argument("--days", type=float, default=None, help="Only runs from the last N days.")
+    parser.add_argument("--provider", type=str, default=None, help="Only one provider (gcp, aws, azure).")
+    parser.add_argument("--phase", type=str, default="warm", help="warm, cold or warmup runs.")
+    parser.add_argument("--output", type=str, default="regressions.json", help="JSON report to write.")
+    args = parser.parse_args()
+
+    group_by = [key.strip() for key in args.group_by.split(",") if key.strip()]
+    unknown = [key for key in group_by if key not in GROUP_KEYS]
+    if unknown:
+        parser.error(f"Unknown --group-by column(s): {', '.join(unknown)}")
+    metrics = [metric.strip() for metric in args.metrics.split(",") if metric.strip()]
+    unknown = [metric for metric in metrics if metric not in METRIC_COLUMNS]
+    if unknown:
+        parser.error(f"Unknown metric(s): {', '.join(unknown)}")
+
+    since = None
+    if args.days is not None:
+        since = (datetime.datetime.utcnow() - datetime.timedelta(days=args.days)).isoformat() + "Z"
+    runs = load_runs(args.store, since=since, phase=args.phase, provider=args.provider)
+    findings = detect(
+        runs, group_by, metrics, window=args.window, baseline=args.baseline, alpha=args.alpha,
+        min_change=args.min_change, max_regression=args.max_regression, min_samples=args.min_samples
+    ) if not runs.empty else []
+    breaches = [f for f in findings if f["breach"] and (args.fail_on == "any" or f["latest"])]
+
+    report = {
+        "generated": datetime.datetime.utcnow().isoformat() + "Z",
+        "store": args.store,
+        "settings": {
+            "group_by": group_by, "metrics": metrics, "window": args.window, "baseline": args.baseline,
+            "alpha": args.alpha, "min_change": args.min_change, "max_regression": args.max_regression,
+            "min_samples": args.min_samples, "fail_on": args.fail_on, "days": args.days, "phase": args.phase,
+        },
+        "runs": len(runs),
+        "findings": findings,
+        "breaches": len(breaches),
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for finding in findings:
+        print(format_finding(finding, group_by))
+    print(f"{len(findings)} shift(s), {len(breaches)} breach(es); report written to {args.output}")
+    sys.exit(1 if breaches else 0)
@@ -0,0 +1,174 @@
+# report.py
+# Reports over the run history in the results store (results_store.py), built
+# with pandas: any number of benchmarks, grouped by provider, region, model,
+# prompt and mode (and optionally time window), aggregated in one vectorized
+# pass. Writes the same summary and transposed summary as
+# run_all_benchmarks.py, one row per group, plus
+#   <prefix>_metrics.csv  count/mean/stddev/min/percentiles/max of every metric per group
+#   <prefix>_windows.csv  latency, TTFT, cost and errors per group and time window (with --window)
+#
+#     python report.py --group-by provider,region --days 30 --window 1D
+#
+# Needs pandas 2.x (pip install pandas), which the benchmarks themselves don't.
+
+import argparse
+import datetime
+import sqlite3
+
+import pandas as pd
+
+from benchmark_stats import PERCENTILES
+from results_store import DEFAULT_STORE, METRIC_COLUMNS
+from summary import summary_row, write_summary
+
+# Columns runs can be grouped by, with their summary headers
+GROUP_KEYS = {"provider": "Provider", "region": "Region", "model": "Model", "prompt_hash": "Prompt Hash", "mode": "Mode"}
+
+# Statistics per metric and group, named as in benchmark_stats.summarize()
+STATISTICS = ["count", "mean", "std", "min", "max"]
+
+# Columns of the per-window table: (metric, statistic)
+WINDOW_COLUMNS = [
+    ("response_time", "p50"), ("response_time", "p90"), ("response_time", "p99"),
+    ("ttft", "p50"), ("ttft", "p90"), ("cost", "mean"),
+]
+
+
+def load_runs(store, since=None, phase="warm", provider=None):
+    # The runs table as a DataFrame, optionally from one provider or since an
+    # ISO timestamp (the filters use the store's indexes)
+    conditions = ["phase = ?"]
+    params = [phase]
+    if provider is not None:
+        conditions.append("provider = ?")
+        params.append(provider)
+    if since is not None:
+        conditions.append("timestamp >= ?")
+        params.append(since)
+    columns = ", ".join(["benchmark_id"] + list(GROUP_KEYS) + ["timestamp", "error"] + METRIC_COLUMNS)
+    db = sqlite3.connect(store)
+    try:
+        runs = pd.read_sql_query(f"SELECT {columns} FROM runs WHERE {' AND '.join(conditions)}", db, params=params)
+    finally:
+        db.close()
+    # Columns with no values at all come back as objects
+    runs[METRIC_COLUMNS] = runs[METRIC_COLUMNS].astype(float)
+    runs["timestamp"] = pd.to_datetime(runs["timestamp"], utc=True, format="ISO8601")
+    # Imported CSVs have no model or prompt; keep them as a group of their own
+    runs[list(GROUP_KEYS)] = runs[list(GROUP_KEYS)].fillna("")
+    runs["gave_up"] = runs["error"].str.startswith("ThrottledError", na=False)
+    return runs
+
+
+def aggregate(runs, group_by, window=None):
+    # Returns (counts, stats) indexed by the group keys (and window):
+    # counts has runs/successes/errors/throttles/gave_up/cost per group, stats
+    # has a (metric, statistic) column for every metric in METRIC_COLUMNS.
+    # `window` is a pandas frequency such as "1D" or "1h".
+    keys = list(group_by)
+    if window:
+        runs = runs.assign(window=runs["timestamp"].dt.floor(window))
+        keys.append("window")
+
+    counts = runs.groupby(keys, sort=True).agg(
+        runs=("timestamp", "size"),
+        errors=("error", "count"),
+        throttles=("throttles", "sum"),
+        gave_up=("gave_up", "sum"),
+        total_cost=("cost", "sum"),
+        first=("timestamp", "min"),
+        last=("timestamp", "max"),
+    )
+    counts["successes"] = counts["runs"] - counts["errors"]
+    counts["error_rate"] = counts["errors"] / counts["runs"]
+    counts["attempts"] = counts["runs"] + counts["throttles"]
+    counts["throttle_rate"] = counts["throttles"] / counts["attempts"]
+
+    # Failed runs have no metrics, so these only see the successes
+    grouped = runs[runs["error"].isna()].groupby(keys, sort=True)[METRIC_COLUMNS]
+    stats = grouped.agg(STATISTICS).rename(columns={"std": "stddev"}, level=1)
+    quantiles = grouped.quantile([pct / 100 for pct in PERCENTILES]).unstack(level=-1)
+    quantiles.columns = pd.MultiIndex.from_tuples(
+        [(metric, f"p{round(level * 100)}") for metric, level in quantiles.columns]
+    )
+    stats = stats.join(quantiles).reindex(counts.index)
+    return counts, stats
+
+
+def group_stats(key_values, group_by, counts_row, stats_row):
+    # One group's figures in the shape of a *_stats.json file, for summary.summary_row()
+    metrics = {}
+    for (metric, statistic), value in stats_row.items():
+        if not pd.isna(value):
+            metrics.setdefault(metric, {})[statistic] = float(value)
+    keys = dict(zip(group_by, key_values))
+    return {
+        "provider": keys.get("provider", ""),
+        "region": keys.get("region", ""),
+        "timestamp": counts_row["last"].isoformat(),
+        "runs": int(counts_row["runs"]),
+        "successes": int(counts_row["successes"]),
+        "errors": int(counts_row["errors"]),
+        "throttles": int(counts_row["throttles"]),
+        "attempts": int(counts_row["attempts"]),
+        "throttle_rate": float(counts_row["throttle_rate"]),
+        "gave_up": int(counts_row["gave_up"]),
+        "metrics": metrics,
+    }
+
+
+def write_report(runs, group_by, prefix, window=None):
+    counts, stats = aggregate(runs, group_by)
+    labels = [key if isinstance(key, tuple) else (key,) for key in counts.index]
+    rows = [
+        summary_row(group_stats(label, group_by, counts.loc[key], stats.loc[key]))
+        for label, key in zip(labels, counts.index)
+    ]
+    write_summary(
+        labels, rows, f"{prefix}_summary.csv", f"{prefix}_summary_transposed.csv",
+        label_header=[GROUP_KEYS[key] for key in group_by], omit=group_by
+    )
+    written = [f"{prefix}_summary.csv", f"{prefix}_summary_transposed.csv"]
+
+    # Long format: one row per group and metric
+    metrics = stats.stack(level=0)
+    metrics = metrics[metrics["count"] > 0]
+    metrics.index = metrics.index.set_names(list(group_by) + ["metric"])
+    metrics.reset_index().to_csv(f"{prefix}_metrics.csv", index=False, float_format="%.6g")
+    written.append(f"{prefix}_metrics.csv")
+
+    if window:
+        window_counts, window_stats = aggregate(runs, group_by, window)
+        table = window_counts[["runs", "errors", "error_rate", "throttles", "total_cost"]].copy()
+        for metric, statistic in WINDOW_COLUMNS:
+            table[f"{metric}_{statistic}"] = window_stats[(metric, statistic)]
+        table.reset_index().to_csv(f"{prefix}_windows.csv", index=False, float_format="%.6g")
+        written.append(f"{prefix}_windows.csv")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the benchmark run history in the results store.")
+    parser.add_argument("--store", type=str, default=DEFAULT_STORE, help="SQLite results store to read.")
+    parser.add_argument("--group-by", type=str, default="provider,region,model", help=f"Comma-separated columns from: {', '.join(GROUP_KEYS)}.")
+    parser.add_argument("--window", type=str, default=None, help="Also break each group down by time window (pandas frequency, e.g. 1D or 1h).")
+    parser.add_argument("--days", type=float, default=None, help="Only runs from the last N days.")
+    parser.add_argument("--provider", type=str, default=None, help="Only one provider (gcp, aws, azure).")
+    parser.add_argument("--phase", type=str, default="warm", help="warm, cold or warmup runs.")
+    parser.add_argument("--output-prefix", type=str, default="report", help="Prefix of the CSV files written.")
+    args = parser.parse_args()
+
+    group_by = [key.strip() for key in args.group_by.split(",") if key.strip()]
+    unknown = [key for key in group_by if key not in GROUP_KEYS]
+    if unknown:
+        parser.error(f"Unknown --group-by column(s): {', '.join(unknown)}")
+
+    since = None
+    if args.days is not None:
+        since = (datetime.datetime.utcnow() - datetime.timedelta(days=args.days)).isoformat() + "Z"
+    runs = load_runs(args.store, since=since, phase=args.phase, provider=args.provider)
+    if runs.empty:
+        print("No matching runs.")
+    else:
+        for filename in write_report(runs, group_by, args.output_prefix, window=args.window):
+            print(f"Written {filename}")
@@ -0,0 +1,101 @@
+# results_log.py
+# Append-only JSON Lines log of benchmark runs. Each result is written and
+# flushed as soon as its request completes, so an interrupted or crashed
+# benchmark keeps every run it paid for and can be resumed, and response texts
+# don't pile up in memory. The CSV and the statistics are produced afterwards
+# by streaming over the log.
+#
+# The first line is {"type": "benchmark", "id": ..., "started": ...}, naming
+# the benchmark (resumed sessions keep it). After that, lines are
+# {"type": "run", "phase": ..., "run": n, <make_result fields>} for runs and
+# {"type": "series", "phase": ..., "wall_time": s} when a series (or a resumed
+# part of one) ends.
+
+import datetime
+import json
+import os
+import threading
+import uuid
+
+
+def log_filename(csv_filename):
+    # The log lives next to the per-run CSV
+    return os.path.splitext(csv_filename)[0] + "_runs.jsonl"
+
+
+def _drop_partial_line(path):
+    # A crash mid-write can leave half a line at the end; cut it off so the
+    # next record starts on a line of its own
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+class ResultsLog:
+    # Thread-safe appender. With resume=True an existing log is continued,
+    # otherwise it is started afresh.
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.lock = threading.Lock()
+        if resume and os.path.exists(path):
+            _drop_partial_line(path)
+            self.file = open(path, "a", encoding="utf-8")
+        else:
+            self.file = open(path, "w", encoding="utf-8")
+            self._write({
+                "type": "benchmark",
+                "id": uuid.uuid4().hex,
+                "started": datetime.datetime.utcnow().isoformat() + "Z",
+            })
+
+    def _write(self, record):
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            self.file.write(line)
+            # flush() hands the line to the OS, which is enough to survive the
+            # process dying; an fsync per request would cost more than it saves
+            self.file.flush()
+
+    def append(self, phase, run, result):
+        self._write({"type": "run", "phase": phase, "run": run, **result})
+
+    def end_series(self, phase, wall_time):
+        self._write({"type": "series", "phase": phase, "wall_time": wall_time})
+
+    def close(self):
+        self.file.close()
+
+
+def read_log(path, phase=None, record_type="run"):
+    # Yield the log's records one at a time, optionally only one phase's.
+    # Lines that don't parse (a write cut short) are skipped.
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("type") != record_type:
+                continue
+            if phase is None or record["phase"] == phase:
+                yield record
+
+
+def benchmark_info(path):
+    # The log's {"type": "benchmark", ...} header, or None for an empty log
+    return next(read_log(path, record_type="benchmark"), None)
+
+
+def completed_runs(path, phase):
+    # Run numbers of a phase that already have a result
+    return {record["run"] for record in read_log(path, phase)}
+
+
+def series_wall_time(path, phase):
+    # Wall time of a phase summed over the sessions that ran it, or None
+    times = [record["wall_time"] for record in read_log(path, phase, record_type="series")]
+    return sum(times) if times else None
@@ -0,0 +1,342 @@
+# results_store.py
+# SQLite store of every benchmark run, for comparing results across days
+# without opening CSV files by hand. run_provider() adds each finished
+# benchmark from its results log; older CSV directories (e.g. 16062025/) can be
+# imported once. Runs are keyed by provider, model, region, prompt hash, mode
+# and timestamp, with indexes for the usual "this provider and region over the
+# last N days" queries.
+#
+#     python results_store.py import 16062025 20062025
+#     python results_store.py query --provider aws --region us-east-2 --metric ttft --days 30
+
+import argparse
+import csv
+import datetime
+import hashlib
+import os
+import sqlite3
+import uuid
+
+from results_log import benchmark_info, read_log
+
+DEFAULT_STORE = "benchmark_results.db"
+
+# Per-run numeric columns, in the order of the runs table
+METRIC_COLUMNS = [
+    "response_time", "prompt_tokens", "completion_tokens", "total_tokens", "characters", "words", "cost",
+    "ttft", "mean_gap", "p95_gap", "max_gap", "decode_tokens_per_s",
+    "client_setup", "client_prep", "dns", "connect", "tls", "upload", "server", "download", "new_connections",
+    "throttles", "retry_time", "queue_time", "schedule_delay",
+]
+
+# Metrics query_metric() reads most, indexed from the start (others are
+# indexed the first time they are queried)
+INDEXED_METRICS = ["response_time", "ttft"]
+
+KEY_COLUMNS = ["benchmark_id", "provider", "model", "region", "prompt_hash", "mode", "phase", "run", "timestamp"]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS benchmarks (
+    id TEXT PRIMARY KEY,
+    provider TEXT,
+    model TEXT,
+    region TEXT,
+    prompt_hash TEXT,
+    mode TEXT,
+    started TEXT,
+    concurrency INTEGER,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS runs (
+    benchmark_id TEXT REFERENCES benchmarks(id),
+    provider TEXT,
+    model TEXT,
+    region TEXT,
+    prompt_hash TEXT,
+    mode TEXT,
+    phase TEXT,
+    run INTEGER,
+    timestamp TEXT,
+    {", ".join(f"{column} REAL" for column in METRIC_COLUMNS)},
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_provider_region_time ON runs (provider, region, timestamp);
+CREATE INDEX IF NOT EXISTS runs_model_time ON runs (model, timestamp);
+CREATE INDEX IF NOT EXISTS runs_prompt_time ON runs (prompt_hash, timestamp);
+CREATE INDEX IF NOT EXISTS runs_benchmark ON runs (benchmark_id);
+CREATE INDEX IF NOT EXISTS runs_phase_mode_group ON runs (phase, mode, provider, model, region);
+"""
+
+
+def ranked_index(metric):
+    # Successful runs of one phase in the order query_metric() ranks them (by
+    # group, then the metric), with the other filter columns, so a percentile
+    # query reads the index alone and never sorts
+    return (
+        f"CREATE INDEX IF NOT EXISTS runs_{metric}_ranked ON runs "
+        f"(phase, provider, model, region, {metric}, mode, timestamp, prompt_hash) "
+        f"WHERE error IS NULL AND {metric} IS NOT NULL"
+    )
+
+
+# Column names of the per-run CSV, for importing old result files
+CSV_COLUMNS = {
+    "Run": "run", "Phase": "phase", "Response Time (s)": "response_time", "Prompt Tokens": "prompt_tokens",
+    "Completion Tokens": "completion_tokens", "Total Tokens": "total_tokens", "Characters": "characters",
+    "Words": "words", "Cost (USD)": "cost", "Region": "region", "Timestamp (GMT)": "timestamp",
+    "TTFT (s)": "ttft", "Mean Chunk Gap (s)": "mean_gap", "P95 Chunk Gap (s)": "p95_gap",
+    "Max Chunk Gap (s)": "max_gap", "Decode Tokens/s": "decode_tokens_per_s", "Client Setup (s)": "client_setup",
+    "Client Prep (s)": "client_prep", "DNS (s)": "dns", "Connect (s)": "connect", "TLS (s)": "tls",
+    "Upload (s)": "upload", "Server (s)": "server", "Download (s)": "download",
+    "New Connections": "new_connections", "Throttles": "throttles", "Retry Time (s)": "retry_time",
+    "Queue Time (s)": "queue_time", "Schedule Delay (s)": "schedule_delay", "Error": "error",
+}
+
+
+def prompt_hash(prompt):
+    # Short, stable key for the prompt text
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def connect(path=DEFAULT_STORE):
+    db = sqlite3.connect(path, timeout=30)
+    # WAL lets queries run while a benchmark is writing
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(SCHEMA)
+    # Stores created before a metric was added get its column now
+    existing = {row[1] for row in db.execute("PRAGMA table_info(runs)")}
+    for column in METRIC_COLUMNS:
+        if column not in existing:
+            db.execute(f"ALTER TABLE runs ADD COLUMN {column} REAL")
+    for metric in INDEXED_METRICS:
+        db.execute(ranked_index(metric))
+    return db
+
+
+def _run_row(record):
+    # Flatten one results-log record into the runs table's metric columns
+    row = {column: record.get(column) for column in METRIC_COLUMNS}
+    if not record["error"]:
+        row["characters"] = len(record["response"])
+        row["words"] = len(record["response"].split())
+    else:
+        # Failed runs have no metrics, only the error (and any throttling)
+        row.update(dict.fromkeys(["response_time", "prompt_tokens", "completion_tokens", "total_tokens", "cost"]))
+    for group in ("stream", "network"):
+        for field, value in (record.get(group) or {}).items():
+            if field in row:
+                row[field] = value
+    return [row[column] for column in METRIC_COLUMNS] + [record["error"]]
+
+
+def _insert(db, benchmark, rows):
+    # Replace a benchmark and its runs, so adding the same one twice (e.g.
+    # after a resumed run) doesn't duplicate anything
+    db.execute("DELETE FROM runs WHERE benchmark_id = ?", (benchmark["id"],))
+    db.execute(
+        "INSERT OR REPLACE INTO benchmarks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [benchmark[key] for key in ("id", "provider", "model", "region", "prompt_hash", "mode", "started", "concurrency", "source")]
+    )
+    # Named columns, since older stores have the later metrics at the end
+    columns = KEY_COLUMNS + METRIC_COLUMNS + ["error"]
+    placeholders = ", ".join("?" * len(columns))
+    db.executemany(f"INSERT INTO runs ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+
+def add_benchmark(path, log_path, provider, model, region, prompt, mode, concurrency):
+    # Copy one benchmark's results log into the store, in one transaction
+    info = benchmark_info(log_path)
+    benchmark = {
+        "id": info["id"] if info else uuid.uuid4().hex,
+        "provider": provider,
+        "model": model,
+        "region": region,
+        "prompt_hash": prompt_hash(prompt),
+        "mode": mode,
+        "started": info["started"] if info else None,
+        "concurrency": concurrency,
+        "source": log_path,
+    }
+    keys = [benchmark[key] for key in ("id", "provider", "model", "region", "prompt_hash", "mode")]
+    rows = (keys + [record["phase"], record["run"], record["timestamp"]] + _run_row(record) for record in read_log(log_path))
+    db = connect(path)
+    try:
+        with db:
+            _insert(db, benchmark, rows)
+    finally:
+        db.close()
+    return benchmark["id"]
+
+
+def _csv_value(value):
+    if value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def import_csv_directory(path, directory, providers):
+    # Import the *_llama_results.csv files of a dated directory (DDMMYYYY) as
+    # one benchmark per file. `providers` maps file names to provider keys.
+    # Files from before regions and timestamps were recorded get the date of
+    # the directory and no region; the prompt and model aren't known.
+    try:
+        day = datetime.datetime.strptime(os.path.basename(os.path.normpath(directory)), "%d%m%Y")
+        default_timestamp = day.isoformat() + "Z"
+    except ValueError:
+        default_timestamp = None
+    imported = 0
+    db = connect(path)
+    try:
+        for filename, key in providers.items():
+            csv_path = os.path.join(directory, filename)
+            if not os.path.exists(csv_path):
+                continue
+            with open(csv_path, newline="", encoding="utf-8") as f:
+                # Older files end with "Average ..." summary rows, which aren't runs
+                records = [
+                    {CSV_COLUMNS[name]: _csv_value(value) for name, value in row.items() if name in CSV_COLUMNS}
+                    for row in csv.DictReader(f) if row.get("Run", "").isdigit()
+                ]
+            benchmark_id = uuid.uuid5(uuid.NAMESPACE_URL, os.path.abspath(csv_path)).hex
+            region = next((r["region"] for r in records if r.get("region")), None)
+            benchmark = {
+                "id": benchmark_id, "provider": key, "model": None, "region": region, "prompt_hash": None,
+                "mode": "stream" if any(r.get("ttft") is not None for r in records) else "blocking",
+                "started": records[0].get("timestamp") or default_timestamp if records else default_timestamp,
+                "concurrency": None, "source": csv_path,
+            }
+            rows = []
+            for record in records:
+                row = [
+                    benchmark_id, key, None, record.get("region") or region, None, benchmark["mode"],
+                    record.get("phase") or "warm", int(record["run"]) - 1, record.get("timestamp") or default_timestamp,
+                ]
+                rows.append(row + [record.get(column) for column in METRIC_COLUMNS] + [record.get("error")])
+            with db:
+                _insert(db, benchmark, rows)
+            imported += len(rows)
+    finally:
+        db.close()
+    return imported
+
+
+def query_metric(path, metric, provider=None, model=None, region=None, mode=None, prompt=None, since=None,
+                 phase="warm", percentiles=(50, 90, 99)):
+    # Percentiles of one metric over the successful runs matching the filters,
+    # per provider, model and region. `since` is an ISO timestamp.
+    if metric not in METRIC_COLUMNS:
+        raise ValueError(f"Unknown metric '{metric}'. Choose from: {', '.join(METRIC_COLUMNS)}")
+    filters = {"provider": provider, "model": model, "region": region, "mode": mode, "phase": phase}
+    if prompt is not None:
+        filters["prompt_hash"] = prompt_hash(prompt)
+    conditions = [f"{column} = ?" for column, value in filters.items() if value is not None]
+    params = [value for value in filters.values() if value is not None]
+    if since is not None:
+        conditions.append("timestamp >= ?")
+        params.append(since)
+    conditions.append(f"{metric} IS NOT NULL AND error IS NULL")
+    where = " AND ".join(conditions)
+    db = connect(path)
+    try:
+        # The first query of a metric without an index builds one
+        db.execute(ranked_index(metric))
+        groups = db.execute(
+            f"SELECT provider, model, region, COUNT(*) FROM runs WHERE {where} "
+            f"GROUP BY provider, model, region ORDER BY provider, model, region", params
+        ).fetchall()
+        # Only the two values either side of each percentile's rank are read,
+        # walking the index from whichever end is nearer, and interpolated the
+        # same way as benchmark_stats.percentile()
+        summaries = []
+        for group_provider, group_model, group_region, count in groups:
+            summary = {"provider": group_provider, "model": group_model, "region": group_region, "count": count}
+            group_params = params + [group_provider, group_model, group_region]
+            for pct in percentiles:
+                rank = (count - 1) * pct / 100
+                low = int(rank)
+                high = min(low + 1, count - 1)
+                if low < count - 1 - high:
+                    order, offset = "", low
+                else:
+                    order, offset = " DESC", count - 1 - high
+                values = [row[0] for row in db.execute(
+                    f"SELECT {metric} FROM runs WHERE {where} AND provider IS ? AND model IS ? AND region IS ? "
+                    f"ORDER BY {metric}{order} LIMIT ? OFFSET ?", group_params + [high - low + 1, offset]
+                )]
+                if order:
+                    values.reverse()
+                summary[f"p{pct}"] = values[0] + (values[-1] - values[0]) * (rank - low)
+            summaries.append(summary)
+    finally:
+        db.close()
+    return summaries
+
+
+def query_totals(path, provider=None, model=None, mode=None, since=None, phase="warm"):
+    # Count of the successful runs matching the filters, with their summed
+    # response time, cost and completion tokens
+    filters = {"provider": provider, "model": model, "mode": mode, "phase": phase}
+    conditions = [f"{column} = ?" for column, value in filters.items() if value is not None]
+    params = [value for value in filters.values() if value is not None]
+    if since is not None:
+        conditions.append("timestamp >= ?")
+        params.append(since)
+    conditions.append("error IS NULL")
+    sql = (
+        f"SELECT COUNT(*), SUM(response_time), SUM(cost), SUM(completion_tokens) FROM runs "
+        f"WHERE {' AND '.join(conditions)}"
+    )
+    db = connect(path)
+    try:
+        runs, response_time, cost, completion_tokens = db.execute(sql, params).fetchone()
+    finally:
+        db.close()
+    return {
+        "runs": runs, "response_time": response_time or 0.0, "cost": cost or 0.0,
+        "completion_tokens": completion_tokens or 0,
+    }
+
+
+if __name__ == "__main__":
+    from providers import PROVIDERS
+
+    parser = argparse.ArgumentParser(description="Import into and query the benchmark results store.")
+    parser.add_argument("--store", type=str, default=DEFAULT_STORE, help="SQLite file holding the results.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Import dated directories of result CSVs (e.g. 16062025).")
+    import_parser.add_argument("directories", nargs="+")
+
+    query_parser = commands.add_parser("query", help="Percentiles of one metric across stored runs.")
+    query_parser.add_argument("--metric", type=str, default="response_time", choices=METRIC_COLUMNS)
+    query_parser.add_argument("--provider", type=str, default=None, help="Provider key (gcp, aws, azure).")
+    query_parser.add_argument("--model", type=str, default=None)
+    query_parser.add_argument("--region", type=str, default=None)
+    query_parser.add_argument("--mode", type=str, choices=["blocking", "stream"], default=None)
+    query_parser.add_argument("--prompt", type=str, default=None, help="Only runs of this exact prompt.")
+    query_parser.add_argument("--days", type=float, default=None, help="Only runs from the last N days.")
+    query_parser.add_argument("--phase", type=str, default="warm", help="warm, cold or warmup runs.")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        csv_files = {provider.csv_filename: key for key, provider in PROVIDERS.items()}
+        for directory in args.directories:
+            print(f"{directory}: imported {import_csv_directory(args.store, directory, csv_files)} runs")
+    else:
+        since = None
+        if args.days is not None:
+            since = (datetime.datetime.utcnow() - datetime.timedelta(days=args.days)).isoformat() + "Z"
+        summaries = query_metric(
+            args.store, args.metric, provider=args.provider, model=args.model, region=args.region,
+            mode=args.mode, prompt=args.prompt, since=since, phase=args.phase
+        )
+        if not summaries:
+            print("No matching runs.")
+        for summary in summaries:
+            print(
+                f"{summary['provider']} {summary['model'] or '-'} {summary['region'] or '-'}: {summary['count']} runs, "
+                f"{args.metric} p50 {summary['p50']:.3f} / p90 {summary['p90']:.3f} / p99 {summary['p99']:.3f}"
+            )
@@ -1,145 +1,160 @@
-import subprocess
-import sys
-import time
 import csv
-import os
-
-# The question to use for all benchmarks (edit as needed or pass via sys.argv)
-question = "I'd like to compare hyperscalers to assess which one is the best choice for enterprise use, in about 600 words?"
-
-# Output CSV filenames for each script
-azure_csv = "azure_llama_results.csv"
-gcp_csv = "gcp_llama_results.csv"
-aws_csv = "aws_llama_results.csv"
-
-# Paths to your scripts
-azure_script = "azure_llama_demo.py"
-gcp_script = "gcp_llama_demo.py"
-aws_script = "aws_llama_demo.py"
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark_common import ARRIVALS, DEFAULT_MAX_IN_FLIGHT, run_provider
+from rate_limit import DEFAULT_MAX_RETRIES, limit_for, parse_limits
+from results_store import DEFAULT_STORE
+from summary import summary_row, write_summary
+from providers import DEFAULT_QUESTION, PROVIDERS, TRANSPORTS, get_provider
+
+# The question to use for all benchmarks (edit as needed or pass via --question)
+question = DEFAULT_QUESTION
+
+parser = argparse.ArgumentParser(description="Run the Azure, GCP and AWS Llama benchmarks and summarize them.")
+parser.add_argument("--question", type=str, default=question, help="The question to send to every provider.")
+parser.add_argument("--providers", type=str, default=",".join(PROVIDERS), help="Comma-separated providers to benchmark (gcp, aws, azure).")
+parser.add_argument("--runs", type=int, default=5, help="Number of requests per provider (ignored when --duration or --target-ci-width is set).")
+parser.add_argument("--concurrency", type=int, default=1, help="Requests to keep in flight per provider.")
+parser.add_argument("--duration", type=float, default=None, help="Seconds to keep each provider under load instead of a fixed number of runs.")
+parser.add_argument("--stream", action="store_true", help="Use the streaming APIs and record time-to-first-token and chunk gaps.")
+parser.add_argument("--net-timing", action="store_true", help="Record DNS, connect, TLS, upload, server and download time for every run.")
+parser.add_argument("--warmup", type=int, default=1, help="Requests sent to each provider before the measured runs and left out of the statistics.")
+parser.add_argument("--cold", action="store_true", help="Also measure a cold series, with a new client and connection for every request.")
+parser.add_argument("--rpm", type=str, default=None, help="Requests per minute to stay under, for every provider (60) or each one (aws=60,azure=120).")
+parser.add_argument("--tpm", type=str, default=None, help="Tokens per minute to stay under, for every provider or each one (aws=200000,gcp=100000).")
+parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES, help="Times to retry a throttled request (after Retry-After or exponential backoff).")
+parser.add_argument("--resume", action="store_true", help="Continue an interrupted benchmark from each provider's results log, skipping completed runs.")
+parser.add_argument("--store", type=str, default=DEFAULT_STORE, help="SQLite results store to add every provider's runs to; an empty string skips it.")
+parser.add_argument("--target-ci-width", type=float, default=None, help="Keep sampling each provider until the 95%% CI of its target percentile latency is this narrow, relative to the percentile (e.g. 0.05), or a budget runs out.")
+parser.add_argument("--target-percentile", type=int, choices=[50, 90], default=50, help="Latency percentile whose CI --target-ci-width applies to.")
+parser.add_argument("--max-runs", type=int, default=200, help="Most requests per provider when sampling adaptively (--target-ci-width).")
+parser.add_argument("--max-cost", type=float, default=None, help="Stop sending requests to a provider once their estimated cost reaches this many USD.")
+parser.add_argument("--arrival-rate", type=float, default=None, help="Open loop: send this many requests per second to each provider on schedule, however many are still in flight (replaces --concurrency).")
+parser.add_argument("--arrival", type=str, choices=ARRIVALS, default="poisson", help="Spacing of open-loop requests: Poisson or fixed intervals.")
+parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT, help="Most open-loop requests in flight per provider; later ones wait, and the wait counts in their latency.")
+parser.add_argument("--verbose", action="store_true", help="Print every response in full (text and raw payload) instead of one line per run.")
+parser.add_argument("--metrics-port", type=int, default=None, help="Serve live latency, TTFT and throughput histograms for every provider on http://127.0.0.1:PORT/metrics (Prometheus/OpenMetrics).")
+parser.add_argument("--dashboard", action="store_true", help="Show a live table of every provider's progress and percentiles in place of the per-run output.")
+parser.add_argument("--record", action="store_true", help="Also save every raw response and its timing per provider, for replay (see recording.py).")
+parser.add_argument("--parallel", action="store_true", help="Benchmark all providers at the same time even with one request in flight.")
+parser.add_argument("--mock", action="store_true", help="Point every provider at a local mock_server.py instead of the real endpoints.")
+parser.add_argument("--mock-replay", type=str, default=None, help="With --mock, serve the timing and text of this recording (see recording.py) instead of the modelled latency.")
+parser.add_argument("--transport", type=str, choices=[*TRANSPORTS, "both"], default="sdk", help="Send requests through each provider's SDK, raw HTTP (raw_http.py), or both side by side; both also writes transport_comparison.csv.")
+parser.add_argument("--raw-http2", action="store_true", help="Send raw-HTTP requests over HTTP/2 (needs httpx[http2]) instead of HTTP/1.1 keep-alive.")
+args = parser.parse_args()
+question = args.question
+
+# In mock mode a local stand-in answers for every provider, with placeholder
+# credentials so the SDKs don't go looking for real ones
+mock_url = None
+if args.mock:
+    from mock_server import start_mock_server, use_mock_credentials
+
+    mock_url = start_mock_server({"replay": args.mock_replay} if args.mock_replay else None).url
+    use_mock_credentials()
+    print(f"Using mock inference server at {mock_url}")
+    # Mock latencies would mix into the history and the regression baselines
+    args.store = ""
+
+# With more than one request in flight (or a timed run) the providers are loaded
+# at the same time, so they see the same window rather than one after another
+run_in_parallel = args.parallel or args.concurrency > 1 or args.duration is not None or args.arrival_rate is not None
+
+# Build each selected provider's client once, up front. Only the SDKs of the
+# selected providers are imported, and setup time stays out of the timed runs.
+transports = list(TRANSPORTS) if args.transport == "both" else [args.transport]
+providers = []
+for key in args.providers.split(","):
+    for transport in transports:
+        provider = get_provider(key.strip(), question, endpoint=mock_url, transport=transport)
+        provider.net_timing = args.net_timing
+        provider.http2 = args.raw_http2
+        try:
+            provider.connect()
+        except Exception as e:
+            print(f"Skipping {provider.name}: {e}")
+            continue
+        providers.append(provider)
+
+
+rpm_limits = parse_limits(args.rpm)
+tpm_limits = parse_limits(args.tpm)
+
+
+def benchmark(provider):
+    return run_provider(
+        provider, provider.csv_filename, args.max_runs if args.target_ci_width else args.runs, args.concurrency,
+        args.duration, args.stream, label=provider.name if run_in_parallel else None, warmup=args.warmup,
+        cold=args.cold, target_ci_width=args.target_ci_width, target_percentile=args.target_percentile,
+        max_cost=args.max_cost, rpm=limit_for(rpm_limits, provider.key), tpm=limit_for(tpm_limits, provider.key),
+        max_retries=args.max_retries, resume=args.resume, store=args.store, arrival_rate=args.arrival_rate,
+        arrival=args.arrival, max_in_flight=args.max_in_flight, recording=args.record,
+        verbose=args.verbose, metrics_port=args.metrics_port, dashboard=args.dashboard
+    )
 
-# List of scripts to run with their CSV filenames and provider names
-scripts = [
-    ("GCP Llama", gcp_script, gcp_csv),
-    ("AWS Bedrock Llama", aws_script, aws_csv),
-    ("Azure Llama", azure_script, azure_csv),
-]
 
 start_time = time.time()  # Start timing
 
-for name, script, csv_file in scripts:
-    print(f"\n=== Running {name} Benchmark ===\n")
-    try:
-        subprocess.run(
-            [sys.executable, script, "--question", question, "--csv", csv_file],
-            check=True
-        )
-    except subprocess.CalledProcessError as e:
-        print(f"Error running {script}: {e}")
+all_stats = []
+if run_in_parallel:
+    print(f"\n=== Running {len(providers)} benchmarks in parallel (concurrency {args.concurrency}) ===\n")
+    with ThreadPoolExecutor(max_workers=max(1, len(providers))) as pool:
+        all_stats = list(pool.map(benchmark, providers))
+else:
+    for provider in providers:
+        print(f"\n=== Running {provider.name} Benchmark ===\n")
+        all_stats.append(benchmark(provider))
 
 end_time = time.time()  # End timing
 elapsed = end_time - start_time
 
 print(f"\nAll benchmarks completed in {elapsed:.2f} seconds.")
 
-# Compile averages from each CSV into a summary file
-summary_csv = "benchmark_summary.csv"
-summary_rows = []
-header = [
-    "Provider",
-    "Average Response Time (s)",
-    "Average Prompt Tokens",
-    "Average Completion Tokens",
-    "Average Total Tokens",
-    "Average Characters",
-    "Average Words",
-    "Average Cost",
-    "Region",
-    "Timestamp"
-]
-
-for name, _, csv_file in scripts:
-    if not os.path.exists(csv_file):
-        print(f"Warning: {csv_file} not found, skipping.")
-        continue
-    with open(csv_file, newline='', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        rows = list(reader)
-        # Find the header row and column indices
-        header_row = next((row for row in rows if row and "region" in [col.strip().lower() for col in row]), None)
-        region_index = None
-        timestamp_index = None
-        if header_row:
-            region_index = [col.strip().lower() for col in header_row].index("region")
-            if "timestamp (gmt)" in [col.strip().lower() for col in header_row]:
-                timestamp_index = [col.strip().lower() for col in header_row].index("timestamp (gmt)")
-        # Find the row that starts with "Average"
-        avg_row = next((row for row in rows if row and row[0].strip().lower() == "average"), None)
-        # Get the region and timestamp values from the averages row if present, else from the first data row
-        region_value = ""
-        timestamp_value = ""
-        if avg_row:
-            if region_index is not None and len(avg_row) > region_index:
-                region_value = avg_row[region_index]
-            if timestamp_index is not None and len(avg_row) > timestamp_index:
-                timestamp_value = avg_row[timestamp_index]
-        else:
-            # Try to get from the first data row if not in averages
-            data_row = next((row for row in rows if row and row[0].strip().isdigit()), None)
-            if data_row:
-                if region_index is not None and len(data_row) > region_index:
-                    region_value = data_row[region_index]
-                if timestamp_index is not None and len(data_row) > timestamp_index:
-                    timestamp_value = data_row[timestamp_index]
-        if avg_row:
-            # Only keep the relevant columns (including cost, which should be at index 7)
-            # region_value and timestamp_value are already extracted from the correct columns
-            summary_rows.append(
-                [name] +
-                avg_row[1:8] +           # metrics up to cost
-                [region_value, timestamp_value]  # region and timestamp
-            )
-        else:
-            print(f"Warning: No averages found in {csv_file}")
-
-# Write the summary CSV
-with open(summary_csv, mode="w", newline="", encoding="utf-8") as f:
-    writer = csv.writer(f)
-    writer.writerow(header)
-    for row in summary_rows:
-        writer.writerow(row)
-
-print(f"\nSummary written to {summary_csv}")
-
-# Transpose the summary so metrics are rows and providers are columns
-provider_names = [row[0] for row in summary_rows]
-averages_by_provider = [row[1:] for row in summary_rows]
-
-metric_names = [
-    "Avg. Response Time (s)",
-    "Avg. Prompt Tokens",
-    "Avg. Completion Tokens",
-    "Avg. Total Tokens",
-    "Avg. Characters",
-    "Avg. Words",
-    "Avg. Cost",
-    "Region",
-    "Timestamp"
-]
-
-transposed_rows = []
-header_row = ["Metric"] + provider_names
-transposed_rows.append(header_row)
-
-for i, metric in enumerate(metric_names):
-    row = [metric]
-    for provider_avg in averages_by_provider:
-        value = provider_avg[i] if i < len(provider_avg) else ""
-        row.append(value)
-    transposed_rows.append(row)
-
-with open("benchmark_summary_transposed.csv", mode="w", newline="", encoding="utf-8") as f:
-    writer = csv.writer(f)
-    for row in transposed_rows:
-        writer.writerow(row)
-
-print("\nTransposed summary written to benchmark_summary_transposed.csv")
\ No newline at end of file
+# Compile each provider's statistics into the summary files
+for stats in all_stats:
+    if not stats["successes"]:
+        print(f"Warning: No successful runs for {stats['provider']}")
+
+write_summary(
+    [(stats["provider"],) for stats in all_stats], [summary_row(stats) for stats in all_stats],
+    "benchmark_summary.csv", "benchmark_summary_transposed.csv"
+)
+print("\nSummary written to benchmark_summary.csv")
+print("\nTransposed summary written to benchmark_summary_transposed.csv")
+
+
+def statistic(stats, metric, name):
+    return stats["metrics"].get(metric, {}).get(name) if stats["successes"] else None
+
+
+def difference(raw, sdk):
+    return "" if raw is None or sdk is None else f"{raw - sdk:.3f}"
+
+
+# SDK and raw HTTP side by side: what the SDK adds to every request, as the
+# raw path's time minus the SDK's (negative when raw HTTP is faster)
+if args.transport == "both":
+    by_transport = {(provider.key.split("-")[0], provider.transport): stats for provider, stats in zip(providers, all_stats)}
+    with open("transport_comparison.csv", mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        header = ["Provider", "HTTP Version"]
+        for metric in ("Response Time", "TTFT"):
+            for name in ("P50", "P99"):
+                header += [f"SDK {metric} {name} (s)", f"Raw {metric} {name} (s)", f"Raw - SDK {metric} {name} (s)"]
+        writer.writerow(header)
+        for key in PROVIDERS:
+            sdk, raw = by_transport.get((key, "sdk")), by_transport.get((key, "raw"))
+            if sdk is None or raw is None:
+                continue
+            row = [sdk["provider"], "2" if args.raw_http2 else "1.1"]
+            for metric in ("response_time", "ttft"):
+                for name in ("p50", "p99"):
+                    sdk_value, raw_value = statistic(sdk, metric, name), statistic(raw, metric, name)
+                    row += [
+                        "" if sdk_value is None else f"{sdk_value:.3f}", "" if raw_value is None else f"{raw_value:.3f}",
+                        difference(raw_value, sdk_value),
+                    ]
+            writer.writerow(row)
+    print("\nSDK and raw HTTP comparison written to transport_comparison.csv")
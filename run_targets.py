@@ -0,0 +1,95 @@
+import argparse
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark_common import add_load_arguments, load_options, run_provider
+from providers import DEFAULT_QUESTION
+from summary import summary_row, write_summary
+from targets import DEFAULT_MAX_PARALLEL, build_provider, load_targets
+
+# Runs a target registry (see targets.py) as a job matrix: every provider ×
+# model × region × deployment in the file is benchmarked as a series of its
+# own, up to --max-parallel of them at the same time, each with its own
+# concurrency and rate limits. Then writes one summary row per target.
+#
+#     python run_targets.py targets/llama70b.json --stream --runs 20 --max-parallel 8
+#     python run_targets.py targets/llama70b.json --only "aws-*,azure-sweden"
+
+parser = argparse.ArgumentParser(description="Benchmark every provider, model and region in a target registry in parallel.")
+parser.add_argument("registry", type=str, help="Target registry (JSON, see targets.py).")
+parser.add_argument("--question", type=str, default=DEFAULT_QUESTION, help="The question to send to every target.")
+parser.add_argument("--only", type=str, default=None, help="Comma-separated target names or wildcard patterns to run (e.g. \"aws-*\"); defaults to all.")
+parser.add_argument("--max-parallel", type=int, default=None, help=f"Targets to benchmark at the same time; defaults to the registry's max_parallel, or {DEFAULT_MAX_PARALLEL}.")
+parser.add_argument("--mock", action="store_true", help="Point every target at a local mock_server.py instead of the real endpoints.")
+add_load_arguments(parser)
+args = parser.parse_args()
+
+registry = load_targets(args.registry)
+name = registry["name"]
+targets = registry["targets"]
+if args.only:
+    patterns = [pattern.strip() for pattern in args.only.split(",")]
+    targets = [target for target in targets if any(fnmatch.fnmatchcase(target["name"], pattern) for pattern in patterns)]
+max_parallel = args.max_parallel or registry.get("max_parallel", DEFAULT_MAX_PARALLEL)
+print(f"Registry {name}: {len(targets)} targets, {max_parallel} at a time")
+
+mock_url = None
+if args.mock:
+    from mock_server import start_mock_server, use_mock_credentials
+
+    mock_url = start_mock_server().url
+    use_mock_credentials()
+    print(f"Using mock inference server at {mock_url}")
+    # Mock latencies would mix into the history and the regression baselines
+    args.store = ""
+
+# Build and connect every target's client up front, one at a time: SDK
+# imports and client setup stay out of the timed runs, and SDKs with
+# process-wide settings (vertexai.init) aren't set up from two threads at once
+jobs = []
+for target in targets:
+    try:
+        provider = build_provider(target, args.question, mock_url)
+        provider.net_timing = args.net_timing
+        provider.connect()
+    except Exception as e:
+        print(f"Skipping {target['name']}: {e}")
+        continue
+    jobs.append((target, provider))
+
+
+def benchmark(job):
+    # One target's series, with its own load settings over the command line's
+    target, provider = job
+    options = load_options(args, provider.key)
+    if target.get("concurrency"):
+        options["concurrency"] = target["concurrency"]
+    if target.get("rpm"):
+        options["rpm"] = target["rpm"]
+    if target.get("tpm"):
+        options["tpm"] = target["tpm"]
+    if target.get("runs") and not args.target_ci_width:
+        options["num_runs"] = target["runs"]
+    try:
+        return run_provider(provider, f"targets_{name}_{target['name']}_results.csv", label=target["name"], **options)
+    finally:
+        provider.close()
+
+
+print(f"\n=== Running {len(jobs)} targets ===\n")
+with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as pool:
+    all_stats = list(pool.map(benchmark, jobs))
+
+for stats in all_stats:
+    if not stats["successes"]:
+        print(f"Warning: No successful runs for {stats['provider']}")
+
+summary_csv = f"targets_{name}_summary.csv"
+transposed_csv = f"targets_{name}_summary_transposed.csv"
+write_summary(
+    [(target["name"], provider.key, provider.model) for target, provider in jobs],
+    [summary_row(stats) for stats in all_stats], summary_csv, transposed_csv,
+    label_header=("Target", "Provider", "Model")
+)
+print(f"\nSummary written to {summary_csv}")
+print(f"Transposed summary written to {transposed_csv}")
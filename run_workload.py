@@ -0,0 +1,132 @@
+import argparse
+import csv
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark_common import add_load_arguments, load_options, run_provider
+from benchmark_stats import fit_linear
+from providers import PROVIDERS, get_provider
+from results_log import log_filename, read_log
+from workload import expand_cells, load_workload, predict_mix
+
+# Runs a workload file (see workload.py) as a matrix: every provider gets every
+# prompt, input length, output cap and temperature, each cell a benchmark of
+# its own. Then fits latency ≈ a + b·prompt_tokens + c·completion_tokens per
+# provider over all the cells' runs, to separate prefill from decode cost and
+# predict latency for other traffic.
+#
+#     python run_workload.py workloads/prefill_decode.json --stream --runs 5
+
+parser = argparse.ArgumentParser(description="Run a workload matrix across the Llama providers and fit a latency model.")
+parser.add_argument("workload", type=str, help="Workload definition (JSON, see workload.py).")
+parser.add_argument("--providers", type=str, default=None, help="Comma-separated providers (gcp, aws, azure); defaults to the workload's, or all.")
+parser.add_argument("--mock", action="store_true", help="Point every provider at a local mock_server.py instead of the real endpoints.")
+add_load_arguments(parser)
+args = parser.parse_args()
+
+workload = load_workload(args.workload)
+cells = expand_cells(workload)
+keys = args.providers.split(",") if args.providers else workload.get("providers", list(PROVIDERS))
+name = workload["name"]
+print(f"Workload {name}: {len(cells)} cells x {len(keys)} providers")
+
+mock_url = None
+if args.mock:
+    from mock_server import start_mock_server, use_mock_credentials
+
+    mock_url = start_mock_server().url
+    use_mock_credentials()
+    print(f"Using mock inference server at {mock_url}")
+    # Mock latencies would mix into the history and the regression baselines
+    args.store = ""
+
+
+def run_cells(key):
+    # One provider's cells, one after another, as (cell, stats, csv filename)
+    results = []
+    for cell in cells:
+        provider = get_provider(key.strip(), cell["prompt"], endpoint=mock_url, max_tokens=cell["max_tokens"], temperature=cell["temperature"])
+        provider.net_timing = args.net_timing
+        try:
+            provider.connect()
+        except Exception as e:
+            print(f"Skipping {provider.name}: {e}")
+            return results
+        print(f"\n=== {provider.name}: {cell['label']} ===\n")
+        options = load_options(args, provider.key)
+        if "runs" in workload and not args.target_ci_width:
+            options["num_runs"] = workload["runs"]
+        csv_filename = f"workload_{name}_{provider.key}_{cell['label']}_results.csv"
+        stats = run_provider(provider, csv_filename, label=provider.name, **options)
+        provider.close()
+        results.append((cell, stats, csv_filename))
+    return results
+
+
+# Providers run side by side; each works through its cells in order
+with ThreadPoolExecutor(max_workers=max(1, len(keys))) as pool:
+    matrix = dict(zip(keys, pool.map(run_cells, keys)))
+
+
+def metric(stats, metric_name, statistic, decimals=3):
+    value = stats["metrics"].get(metric_name, {}).get(statistic)
+    return "" if value is None else f"{value:.{decimals}f}"
+
+
+matrix_csv = f"workload_{name}_matrix.csv"
+with open(matrix_csv, mode="w", newline="", encoding="utf-8") as f:
+    writer = csv.writer(f)
+    writer.writerow([
+        "Provider", "Prompt Set", "Input Tokens", "Max Tokens", "Temperature", "Runs", "Errors",
+        "Mean Prompt Tokens", "Mean Completion Tokens", "Response Time P50 (s)", "Response Time P90 (s)",
+        "TTFT P50 (s)", "TTFT P90 (s)", "Mean Decode Tokens/s",
+    ])
+    for results in matrix.values():
+        for cell, stats, _ in results:
+            writer.writerow([
+                stats["provider"], cell["prompt_set"], cell["input_tokens"] or "", cell["max_tokens"] or "",
+                "" if cell["temperature"] is None else cell["temperature"], stats["runs"], stats["errors"],
+                metric(stats, "prompt_tokens", "mean", 1), metric(stats, "completion_tokens", "mean", 1),
+                metric(stats, "response_time", "p50"), metric(stats, "response_time", "p90"),
+                metric(stats, "ttft", "p50"), metric(stats, "ttft", "p90"), metric(stats, "decode_tokens_per_s", "mean", 2),
+            ])
+print(f"\nMatrix written to {matrix_csv}")
+
+# Fit over the individual runs, not the cell averages, so every sample counts
+model_csv = f"workload_{name}_model.csv"
+with open(model_csv, mode="w", newline="", encoding="utf-8") as f:
+    writer = csv.writer(f)
+    writer.writerow([
+        "Provider", "Samples", "Intercept (s)", "Per 1K Prompt Tokens (s)", "Per 1K Completion Tokens (s)", "R²",
+        "TTFT Intercept (s)", "TTFT per 1K Prompt Tokens (s)", "TTFT R²", "Predicted Mix Latency (s)",
+    ])
+    for results in matrix.values():
+        if not results:
+            continue
+        runs = [
+            run for _, _, csv_filename in results for run in read_log(log_filename(csv_filename), "warm")
+            if not run["error"]
+        ]
+        latency = fit_linear([[r["prompt_tokens"], r["completion_tokens"]] for r in runs], [r["response_time"] for r in runs])
+        streamed = [r for r in runs if r["stream"]]
+        ttft = fit_linear([[r["prompt_tokens"]] for r in streamed], [r["stream"]["ttft"] for r in streamed]) if streamed else None
+        provider_name = results[0][1]["provider"]
+        if latency is None:
+            print(f"{provider_name}: not enough variation in prompt and completion length to fit a model")
+            writer.writerow([provider_name, len(runs)] + [""] * 8)
+            continue
+        a, b, c = latency["coefficients"]
+        mix = predict_mix(latency, workload["mix"]) if workload.get("mix") else None
+        writer.writerow([
+            provider_name, latency["n"], f"{a:.4f}", f"{b * 1000:.5f}", f"{c * 1000:.5f}", f"{latency['r2']:.4f}",
+            f"{ttft['coefficients'][0]:.4f}" if ttft else "", f"{ttft['coefficients'][1] * 1000:.5f}" if ttft else "",
+            f"{ttft['r2']:.4f}" if ttft else "", f"{mix:.3f}" if mix is not None else "",
+        ])
+        print(
+            f"{provider_name}: latency ≈ {a:.3f}s + {b * 1000:.4f}s per 1K prompt tokens + "
+            f"{c * 1000:.4f}s per 1K completion tokens (R² {latency['r2']:.3f}, {latency['n']} runs)"
+        )
+        if ttft:
+            print(f"{provider_name}: TTFT ≈ {ttft['coefficients'][0]:.3f}s + {ttft['coefficients'][1] * 1000:.4f}s per 1K prompt tokens (R² {ttft['r2']:.3f})")
+        if mix is not None:
+            print(f"{provider_name}: predicted mean latency for the workload's traffic mix {mix:.2f}s")
+print(f"Latency model written to {model_csv}")
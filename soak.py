@@ -0,0 +1,208 @@
+import argparse
+import collections
+import os
+import threading
+import time
+
+import live_metrics
+from benchmark_common import run_load
+from benchmark_stats import percentile
+from providers import DEFAULT_QUESTION, PROVIDERS, get_provider
+from rate_limit import DEFAULT_MAX_RETRIES, Scheduler
+from results_log import ResultsLog, log_filename, read_log
+from results_store import DEFAULT_STORE, add_benchmark
+from token_accounting import finalize_log
+
+# Soak mode: samples every provider around the clock at a fixed cadence, to
+# track latency over days and weeks (time-of-day effects, incidents) instead
+# of one-off runs. Each provider has a thread that sends --batch requests
+# every --interval seconds over its long-lived client.
+#
+# Memory stays flat however long it runs: the recent samples are kept in a
+# fixed-size ring buffer (the rolling percentiles printed at every roll), the
+# live_metrics histograms have a bounded number of buckets and are started
+# afresh at every roll, and response texts go straight to disk. Every
+# --roll-every seconds the provider's results log for the period is closed,
+# its token counts finished and the period added to the results store as one
+# benchmark; the next period starts a new log in the same file, so disk use
+# outside the store stays flat too and no file is left open between periods.
+# A log left behind by a crash is added to the store at the next start.
+#
+#     python soak.py --interval 60 --stream --roll-every 900 --metrics-port 9464
+#     python report.py --group-by provider,region --days 7 --window 1h
+#
+# Stop it with Ctrl-C; the current period is rolled into the store first.
+
+parser = argparse.ArgumentParser(description="Sample the Llama providers around the clock and roll the results into the store.")
+parser.add_argument("--question", type=str, default=DEFAULT_QUESTION, help="The question to send to every provider.")
+parser.add_argument("--providers", type=str, default=",".join(PROVIDERS), help="Comma-separated providers to sample (gcp, aws, azure).")
+parser.add_argument("--interval", type=float, default=60.0, help="Seconds between samples of each provider.")
+parser.add_argument("--batch", type=int, default=1, help="Requests sent one after another at each sample.")
+parser.add_argument("--stream", action="store_true", help="Use the streaming APIs and record time-to-first-token.")
+parser.add_argument("--window", type=int, default=1000, help="Recent samples per provider kept for the rolling percentiles.")
+parser.add_argument("--window-age", type=float, default=3600.0, help="Leave samples older than this many seconds out of the rolling percentiles.")
+parser.add_argument("--roll-every", type=float, default=900.0, help="Seconds between rolling each provider's results into the store.")
+parser.add_argument("--store", type=str, default=DEFAULT_STORE, help="SQLite results store the samples are rolled into.")
+parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES, help="Times to retry a throttled request.")
+parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds instead of running until interrupted.")
+parser.add_argument("--metrics-port", type=int, default=None, help="Serve live histograms and counters on http://127.0.0.1:PORT/metrics.")
+parser.add_argument("--dashboard", action="store_true", help="Show a live table of every provider in place of the per-sample output.")
+parser.add_argument("--mock", action="store_true", help="Point every provider at a local mock_server.py instead of the real endpoints.")
+args = parser.parse_args()
+
+mock_url = None
+if args.mock:
+    from mock_server import start_mock_server, use_mock_credentials
+
+    mock_url = start_mock_server().url
+    use_mock_credentials()
+    print(f"Using mock inference server at {mock_url}")
+    # Mock latencies would mix into the history and the regression baselines
+    args.store = ""
+
+
+class RollingWindow:
+    # The last `size` samples within `max_age` seconds, in a ring buffer
+
+    def __init__(self, size, max_age=None):
+        self.samples = collections.deque(maxlen=size)
+        self.max_age = max_age
+        self.lock = threading.Lock()
+
+    def add(self, result):
+        stream = result["stream"]
+        sample = (time.monotonic(), bool(result["error"]), result["response_time"], stream["ttft"] if stream else None)
+        with self.lock:
+            self.samples.append(sample)
+
+    def summary(self):
+        with self.lock:
+            now = time.monotonic()
+            while self.samples and self.max_age and now - self.samples[0][0] > self.max_age:
+                self.samples.popleft()
+            samples = list(self.samples)
+        ok = [s for s in samples if not s[1]]
+        latencies = [s[2] for s in ok]
+        ttfts = [s[3] for s in ok if s[3] is not None]
+        return {
+            "count": len(samples),
+            "errors": len(samples) - len(ok),
+            "response_time": {p: percentile(latencies, p) for p in (50, 90, 99)} if latencies else None,
+            "ttft": {p: percentile(ttfts, p) for p in (50, 99)} if ttfts else None,
+        }
+
+
+def format_summary(name, summary):
+    line = f"{name}: {summary['count']} samples in window, {summary['errors']} errors"
+    if summary["response_time"]:
+        latency = summary["response_time"]
+        line += f", response time p50 {latency[50]:.3f}s / p90 {latency[90]:.3f}s / p99 {latency[99]:.3f}s"
+    if summary["ttft"]:
+        line += f", TTFT p50 {summary['ttft'][50]:.3f}s / p99 {summary['ttft'][99]:.3f}s"
+    return line
+
+
+class Soak:
+    # One provider's sampling loop
+
+    def __init__(self, provider, stopped):
+        self.provider = provider
+        self.stopped = stopped
+        self.mode = "stream" if args.stream else "blocking"
+        self.window = RollingWindow(args.window, args.window_age)
+        self.scheduler = Scheduler(provider.is_throttled, provider.retry_after, max_retries=args.max_retries)
+        self.log_path = log_filename(f"soak_{provider.key}_results.csv")
+        self.log = None
+        self.run = 0
+
+    def invoke(self, run):
+        invoke = self.provider.invoke_stream if args.stream else self.provider.invoke
+        return self.scheduler.call(invoke, run)
+
+    def record(self, run, result):
+        # run_load numbers each batch from 0; the log numbers the whole period
+        result["phase"] = "warm"
+        self.log.append("warm", self.run, result)
+        self.run += 1
+        self.window.add(result)
+        live_metrics.REGISTRY.observe(self.provider.key, self.provider.region, "warm", result, model=self.provider.model)
+
+    def roll(self):
+        # Close the period's log and add it to the store
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+        self.run = 0
+        if next(read_log(self.log_path), None) is None:
+            return
+        try:
+            finalize_log(self.log_path, self.provider.prompt, self.provider.cost)
+        except ImportError:
+            # Without a tokenizer the placeholder counts are stored as they are
+            pass
+        if args.store:
+            add_benchmark(
+                args.store, self.log_path, self.provider.key, self.provider.model, self.provider.region,
+                self.provider.prompt, self.mode, 1
+            )
+        os.remove(self.log_path)
+        live_metrics.REGISTRY.rotate(self.provider.key)
+        print(format_summary(self.provider.name, self.window.summary()))
+
+    def loop(self):
+        # Samples on a fixed schedule; a sample that overruns the interval
+        # skips the slots it missed rather than bunching requests up
+        self.roll()  # a period left behind by a crash
+        next_sample = time.monotonic()
+        next_roll = next_sample + args.roll_every
+        self.log = ResultsLog(self.log_path)
+        try:
+            while not self.stopped.wait(max(0.0, next_sample - time.monotonic())):
+                run_load(self.invoke, num_runs=args.batch, label=self.provider.name, record=self.record,
+                         quiet=args.dashboard)
+                now = time.monotonic()
+                next_sample += args.interval
+                if next_sample < now:
+                    missed = int((now - next_sample) // args.interval) + 1
+                    print(f"{self.provider.name}: sample took longer than --interval, skipping {missed} slot(s)")
+                    next_sample += missed * args.interval
+                if now >= next_roll:
+                    self.roll()
+                    self.log = ResultsLog(self.log_path)
+                    next_roll = now + args.roll_every
+        finally:
+            self.roll()
+
+
+providers = []
+for key in args.providers.split(","):
+    provider = get_provider(key.strip(), args.question, endpoint=mock_url)
+    try:
+        provider.connect()
+    except Exception as e:
+        print(f"Skipping {provider.name}: {e}")
+        continue
+    providers.append(provider)
+
+stopped = threading.Event()
+soaks = [Soak(provider, stopped) for provider in providers]
+threads = [threading.Thread(target=soak.loop, name=f"soak-{soak.provider.key}") for soak in soaks]
+live_metrics.start(args.metrics_port, args.dashboard)
+print(f"Sampling {len(soaks)} provider(s) every {args.interval:g}s, rolling into {args.store or 'no store'} every {args.roll_every:g}s")
+for thread in threads:
+    thread.start()
+try:
+    deadline = time.monotonic() + args.duration if args.duration else None
+    while any(thread.is_alive() for thread in threads):
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        time.sleep(0.5)
+except KeyboardInterrupt:
+    print("Stopping: finishing the samples in flight and rolling the last period into the store")
+finally:
+    stopped.set()
+    for thread in threads:
+        thread.join()
+    live_metrics.release()
+    for provider in providers:
+        provider.close()
@@ -0,0 +1,121 @@
+# summary.py
+# The provider summary tables: which statistics go in benchmark_summary.csv
+# (one row per provider) and benchmark_summary_transposed.csv (one column per
+# provider), and the writers for both. Shared by run_all_benchmarks.py, which
+# fills them from the *_stats.json files, and report.py, which fills them from
+# the run history.
+
+import csv
+
+# Columns of the summary: (summary header, transposed label, metric, statistic, decimals).
+# A metric of None reads the statistic from the top level of the stats file.
+SUMMARY_COLUMNS = [
+    ("Average Response Time (s)", "Avg. Response Time (s)", "response_time", "mean", 2),
+    ("Average Prompt Tokens", "Avg. Prompt Tokens", "prompt_tokens", "mean", 2),
+    ("Average Completion Tokens", "Avg. Completion Tokens", "completion_tokens", "mean", 2),
+    ("Average Total Tokens", "Avg. Total Tokens", "total_tokens", "mean", 2),
+    ("Average Characters", "Avg. Characters", "characters", "mean", 2),
+    ("Average Words", "Avg. Words", "words", "mean", 2),
+    ("Average Cost", "Avg. Cost", "cost", "mean", 6),
+    ("Region", "Region", None, "region", None),
+    ("Timestamp", "Timestamp", None, "timestamp", None),
+    ("Concurrency", "Concurrency", None, "concurrency", None),
+    ("Requests/s", "Requests/s", None, "requests_per_s", 2),
+    ("Completion Tokens/s", "Completion Tokens/s", None, "completion_tokens_per_s", 2),
+    ("Average TTFT (s)", "Avg. TTFT (s)", "ttft", "mean", 3),
+    ("Average Chunk Gap (s)", "Avg. Chunk Gap (s)", "mean_gap", "mean", 3),
+    ("Average P95 Chunk Gap (s)", "Avg. P95 Chunk Gap (s)", "p95_gap", "mean", 3),
+    ("Average Decode Tokens/s", "Avg. Decode Tokens/s", "decode_tokens_per_s", "mean", 2),
+    ("Successful Runs", "Successful Runs", None, "successes", None),
+    ("Errors", "Errors", None, "errors", None),
+    ("Response Time Stddev (s)", "Response Time Stddev (s)", "response_time", "stddev", 2),
+    ("Response Time Min (s)", "Response Time Min (s)", "response_time", "min", 2),
+    ("Response Time P50 (s)", "Response Time P50 (s)", "response_time", "p50", 2),
+    ("Response Time P90 (s)", "Response Time P90 (s)", "response_time", "p90", 2),
+    ("Response Time P95 (s)", "Response Time P95 (s)", "response_time", "p95", 2),
+    ("Response Time P99 (s)", "Response Time P99 (s)", "response_time", "p99", 2),
+    ("Response Time Max (s)", "Response Time Max (s)", "response_time", "max", 2),
+    ("Response Time 95% CI Low (s)", "Response Time 95% CI Low (s)", "response_time", "ci_low", 2),
+    ("Response Time 95% CI High (s)", "Response Time 95% CI High (s)", "response_time", "ci_high", 2),
+    ("Completion Tokens P50", "Completion Tokens P50", "completion_tokens", "p50", 2),
+    ("Completion Tokens Stddev", "Completion Tokens Stddev", "completion_tokens", "stddev", 2),
+    ("Cost 95% CI Low", "Cost 95% CI Low", "cost", "ci_low", 6),
+    ("Cost 95% CI High", "Cost 95% CI High", "cost", "ci_high", 6),
+    ("TTFT P50 (s)", "TTFT P50 (s)", "ttft", "p50", 3),
+    ("TTFT P90 (s)", "TTFT P90 (s)", "ttft", "p90", 3),
+    ("TTFT P99 (s)", "TTFT P99 (s)", "ttft", "p99", 3),
+    ("Average Client Prep (s)", "Avg. Client Prep (s)", "client_prep", "mean", 4),
+    ("Average DNS (s)", "Avg. DNS (s)", "dns", "mean", 4),
+    ("Average Connect (s)", "Avg. Connect (s)", "connect", "mean", 4),
+    ("Average TLS (s)", "Avg. TLS (s)", "tls", "mean", 4),
+    ("Average Upload (s)", "Avg. Upload (s)", "upload", "mean", 4),
+    ("Average Server (s)", "Avg. Server (s)", "server", "mean", 4),
+    ("Average Download (s)", "Avg. Download (s)", "download", "mean", 4),
+    ("New Connections per Run", "New Connections per Run", "new_connections", "mean", 2),
+    ("Warm-up Runs", "Warm-up Runs", None, "warmup_runs", None),
+    ("Cold Response Time Mean (s)", "Cold Response Time Mean (s)", "cold.response_time", "mean", 2),
+    ("Cold Response Time P50 (s)", "Cold Response Time P50 (s)", "cold.response_time", "p50", 2),
+    ("Cold Response Time P90 (s)", "Cold Response Time P90 (s)", "cold.response_time", "p90", 2),
+    ("Cold TTFT P50 (s)", "Cold TTFT P50 (s)", "cold.ttft", "p50", 3),
+    ("Average Cold Client Setup (s)", "Avg. Cold Client Setup (s)", "cold.client_setup", "mean", 4),
+    ("Cold New Connections per Run", "Cold New Connections per Run", "cold.new_connections", "mean", 2),
+    ("Throttled Attempts", "Throttled Attempts", None, "throttles", None),
+    ("Throttle Rate", "Throttle Rate", None, "throttle_rate", 4),
+    ("Runs Given Up After Throttling", "Runs Given Up After Throttling", None, "gave_up", None),
+    ("Average Retry Time (s)", "Avg. Retry Time (s)", "retry_time", "mean", 3),
+    ("Retry Time P90 (s)", "Retry Time P90 (s)", "retry_time", "p90", 3),
+    ("Average Queue Time (s)", "Avg. Queue Time (s)", "queue_time", "mean", 3),
+    ("Attempts per Second", "Attempts per Second", None, "attempts_per_s", 2),
+    ("Target Latency CI Width", "Target Latency CI Width", None, "sampling.target_ci_width", None),
+    ("Achieved Latency CI Width", "Achieved Latency CI Width", None, "sampling.ci_width", 4),
+    ("Sampling Stop Reason", "Sampling Stop Reason", None, "sampling.stop_reason", None),
+    ("Arrival Rate (req/s)", "Arrival Rate (req/s)", None, "open_loop.arrival_rate", None),
+    ("Schedule Delay P99 (s)", "Schedule Delay P99 (s)", "schedule_delay", "p99", 3),
+    ("Corrected Response Time P50 (s)", "Corrected Response Time P50 (s)", "corrected_response_time", "p50", 2),
+    ("Corrected Response Time P99 (s)", "Corrected Response Time P99 (s)", "corrected_response_time", "p99", 2),
+    ("Corrected TTFT P99 (s)", "Corrected TTFT P99 (s)", "corrected_ttft", "p99", 3),
+    ("Runs with Estimated Tokens", "Runs with Estimated Tokens", None, "token_sources.estimated", None),
+    ("Tokenizer", "Tokenizer", None, "tokenizer", None),
+]
+
+
+def summary_value(stats, metric, statistic, decimals):
+    # Look up one summary cell; metrics a run didn't produce are left blank.
+    # A "cold." prefix reads the cold series' statistics instead.
+    if metric is not None and metric.startswith("cold."):
+        stats = stats.get("cold", {"metrics": {}})
+        metric = metric[len("cold."):]
+    if metric is None:
+        # Top-level fields; "sampling.x" reads x from the sampling report
+        value = stats
+        for key in statistic.split("."):
+            value = value.get(key, "") if isinstance(value, dict) else ""
+    else:
+        value = stats["metrics"].get(metric, {}).get(statistic, "")
+    if value is None or value == "" or decimals is None:
+        return "" if value is None else value
+    return f"{value:.{decimals}f}"
+
+
+def summary_row(stats):
+    # One provider's values, in SUMMARY_COLUMNS order
+    return [summary_value(stats, metric, statistic, decimals) for _, _, metric, statistic, decimals in SUMMARY_COLUMNS]
+
+
+def write_summary(labels, rows, summary_csv, transposed_csv, label_header=("Provider",), omit=()):
+    # Write the summary (one row per label) and its transpose (one column per
+    # label). `labels` are tuples matching `label_header`; the transposed file
+    # joins them into one column name. Columns of a stats field in `omit`
+    # (e.g. "region", when it is already a label) are left out.
+    kept = [i for i, column in enumerate(SUMMARY_COLUMNS) if column[2] is not None or column[3] not in omit]
+    with open(summary_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(list(label_header) + [SUMMARY_COLUMNS[i][0] for i in kept])
+        for label, row in zip(labels, rows):
+            writer.writerow(list(label) + [row[i] for i in kept])
+
+    with open(transposed_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Metric"] + [" / ".join(str(part) for part in label) for label in labels])
+        for i in kept:
+            writer.writerow([SUMMARY_COLUMNS[i][1]] + [row[i] for row in rows])
@@ -0,0 +1,120 @@
+# targets.py
+# Target registries: the endpoints to compare, as a JSON file run by
+# run_targets.py. A target is one provider × model × region (or Azure
+# deployment) with its own prices and load limits, so a single file can list
+# every endpoint worth comparing and run them all at once.
+#
+# {
+#   "name": "llama70b",
+#   "max_parallel": 8,                         targets benchmarked at once, optional
+#   "defaults": {"concurrency": 2},            fields every target starts from, optional
+#   "targets": [
+#     {"provider": "aws", "model": "meta.llama3-3-70b-instruct-v1:0",
+#      "region": ["us-east-2", "us-west-2"]},             a list expands to one target each
+#     {"name": "aws-us-profile", "provider": "aws",       a Bedrock cross-region inference profile
+#      "model": "us.meta.llama3-3-70b-instruct-v1:0", "region": "us-east-1"},
+#     {"name": "azure-sweden", "provider": "azure", "model": "Llama-3.3-70B-Instruct",
+#      "region": "swedencentral", "endpoint_env": "AZURE_SWEDEN_ENDPOINT",
+#      "api_key_env": "AZURE_SWEDEN_API_KEY", "input_price": 0.00071, "output_price": 0.00071,
+#      "concurrency": 4, "rpm": 60}
+#   ]
+# }
+#
+# Target fields (only provider is required):
+#   provider                      gcp, aws or azure
+#   name                          label and file name; defaults to provider-region-model
+#   model, region                 the adapter's defaults when omitted
+#   endpoint, endpoint_env        a base URL, or the environment variable holding it
+#   api_key_env                   Azure: the environment variable holding this deployment's key
+#   transport                     "sdk" (default) or "raw" (raw_http.py)
+#   input_price, output_price     USD per 1K tokens, in place of the adapter's
+#   max_tokens, temperature       generation settings, in place of the adapter's
+#   concurrency, rpm, tpm, runs   this target's load, in place of the command line's
+# model, region and transport may also be lists; the target is expanded into
+# one per combination.
+
+import itertools
+import json
+import os
+import re
+
+from providers import DEFAULT_QUESTION, PROVIDERS, TRANSPORTS, get_provider
+
+TARGET_FIELDS = {
+    "provider", "name", "model", "region", "endpoint", "endpoint_env", "api_key_env", "transport",
+    "input_price", "output_price", "max_tokens", "temperature", "concurrency", "rpm", "tpm", "runs",
+}
+
+# Fields a list in the registry expands over
+EXPANDED_FIELDS = ("model", "region", "transport")
+
+DEFAULT_MAX_PARALLEL = 4
+
+
+def _slug(value):
+    return re.sub(r"[^A-Za-z0-9]+", "-", str(value)).strip("-").lower()
+
+
+def load_targets(path):
+    with open(path, encoding="utf-8") as f:
+        registry = json.load(f)
+    if not registry.get("targets"):
+        raise ValueError(f"{path}: a registry needs at least one entry in 'targets'")
+    for target in [registry.get("defaults", {})] + registry["targets"]:
+        unknown = set(target) - TARGET_FIELDS
+        if unknown:
+            raise ValueError(f"{path}: unknown target fields {', '.join(sorted(unknown))}")
+    registry.setdefault("name", _slug(os.path.splitext(os.path.basename(path))[0]))
+    registry["targets"] = expand_targets(registry, path)
+    return registry
+
+
+def expand_targets(registry, path="registry"):
+    # Every target with the defaults applied and each list in EXPANDED_FIELDS
+    # spread into one target per combination, each with a unique name
+    targets = []
+    for entry in registry["targets"]:
+        entry = dict(registry.get("defaults", {}), **entry)
+        if entry.get("provider") not in PROVIDERS:
+            raise ValueError(f"{path}: each target needs a 'provider' out of {', '.join(PROVIDERS)}")
+        choices = [entry[field] if isinstance(entry.get(field), list) else [entry.get(field)] for field in EXPANDED_FIELDS]
+        varying = [field for field, values in zip(EXPANDED_FIELDS, choices) if len(values) > 1]
+        for values in itertools.product(*choices):
+            target = dict(entry, **dict(zip(EXPANDED_FIELDS, values)))
+            target["transport"] = target["transport"] or "sdk"
+            if target["transport"] not in TRANSPORTS:
+                raise ValueError(f"{path}: unknown transport '{target['transport']}'")
+            if "name" in entry:
+                # A named entry that expands gets the values that vary appended
+                target["name"] = "-".join([entry["name"]] + [_slug(target[field]) for field in varying])
+            else:
+                parts = [target["provider"], target["region"], target["model"], target["transport"] != "sdk" and target["transport"]]
+                target["name"] = "-".join(_slug(part) for part in parts if part)
+            targets.append(target)
+    names = [target["name"] for target in targets]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"{path}: more than one target is named {', '.join(duplicates)}")
+    return targets
+
+
+def build_provider(target, prompt=DEFAULT_QUESTION, mock_url=None):
+    # An unconnected adapter for one target. With `mock_url` every target is
+    # pointed at the mock server, with its placeholder credentials.
+    endpoint = mock_url or target.get("endpoint")
+    if endpoint is None and target.get("endpoint_env"):
+        endpoint = os.getenv(target["endpoint_env"])
+        if endpoint is None:
+            raise ValueError(f"{target['endpoint_env']} environment variable is not set.")
+    provider = get_provider(
+        target["provider"], prompt, region=target.get("region"), model=target.get("model"), endpoint=endpoint,
+        max_tokens=target.get("max_tokens"), temperature=target.get("temperature"), transport=target["transport"]
+    )
+    provider.name = target["name"]
+    if target.get("input_price") is not None:
+        provider.input_token_price = target["input_price"]
+    if target.get("output_price") is not None:
+        provider.output_token_price = target["output_price"]
+    if target.get("api_key_env") and mock_url is None:
+        provider.api_key_env = target["api_key_env"]
+    return provider
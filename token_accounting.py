@@ -0,0 +1,183 @@
+# token_accounting.py
+# Token counts the providers don't report, worked out after the measurement
+# instead of inside the timed request.
+#
+# Every result says where its counts came from (token_source):
+#   "reported"   the provider's usage figures
+#   "pending"    the provider gave none; a rough characters/4 placeholder is
+#                recorded so the rate limiter, cost budget and hedging have
+#                something to go on while the load runs
+#   "estimated"  the placeholder replaced by a tokenizer count, done for the
+#                whole results log at once by finalize_log() once the load is over
+#
+# The tokenizer is loaded once, on first use. Set LLAMA_TOKENIZER to Llama 3's
+# tokenizer.model (the tiktoken-format file Meta ships) or a Hugging Face
+# tokenizer.json for exact Llama 3 counts; without it, GPT's cl100k_base
+# stands in, which Llama 3's vocabulary extends, so counts come out close but
+# slightly high. Prompt counts are memoized by the prompt's hash, since every
+# run of a benchmark sends the same prompt.
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+REPORTED = "reported"
+PENDING = "pending"
+ESTIMATED = "estimated"
+
+# Characters per token for the placeholder counts of pending results
+CHARS_PER_TOKEN = 4
+
+# Llama 3's pre-tokenizer split pattern (from Meta's reference tokenizer)
+LLAMA3_PATTERN = (
+    r"(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"
+)
+
+# Texts per batch handed to the tokenizer
+BATCH_SIZE = 256
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+_prompt_counts = {}
+
+
+class Tokenizer:
+    # A tiktoken Encoding or a Hugging Face `tokenizers` Tokenizer behind one
+    # interface. Both do their work in Rust without holding the GIL, so
+    # batches counted on several threads run in parallel.
+
+    def __init__(self, name, encoding=None, hf_tokenizer=None):
+        self.name = name
+        self.encoding = encoding
+        self.hf_tokenizer = hf_tokenizer
+
+    def encode(self, text):
+        if self.encoding is not None:
+            return self.encoding.encode_ordinary(text)
+        return self.hf_tokenizer.encode(text, add_special_tokens=False).ids
+
+    def decode(self, ids):
+        if self.encoding is not None:
+            return self.encoding.decode(ids)
+        return self.hf_tokenizer.decode(ids)
+
+    def count_batch(self, texts):
+        if self.encoding is not None:
+            return [len(ids) for ids in self.encoding.encode_ordinary_batch(texts)]
+        return [len(encoded.ids) for encoded in self.hf_tokenizer.encode_batch(texts, add_special_tokens=False)]
+
+
+def _load_tokenizer():
+    path = os.getenv("LLAMA_TOKENIZER")
+    if path and path.endswith(".json"):
+        from tokenizers import Tokenizer as HFTokenizer
+
+        return Tokenizer("llama3", hf_tokenizer=HFTokenizer.from_file(path))
+    import tiktoken
+
+    if path:
+        from tiktoken.load import load_tiktoken_bpe
+
+        encoding = tiktoken.Encoding(
+            name="llama3", pat_str=LLAMA3_PATTERN, mergeable_ranks=load_tiktoken_bpe(path), special_tokens={}
+        )
+        return Tokenizer("llama3", encoding=encoding)
+    return Tokenizer("cl100k_base", encoding=tiktoken.get_encoding("cl100k_base"))
+
+
+def get_tokenizer():
+    global _tokenizer
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            _tokenizer = _load_tokenizer()
+        return _tokenizer
+
+
+def count_tokens(text):
+    return len(get_tokenizer().encode(text)) if text else 0
+
+
+def count_prompt_tokens(prompt):
+    # Memoized by hash, so a long prompt is neither tokenized nor kept twice
+    key = hashlib.sha256(prompt.encode("utf-8")).digest()
+    count = _prompt_counts.get(key)
+    if count is None:
+        count = _prompt_counts[key] = count_tokens(prompt)
+    return count
+
+
+def truncate_tokens(text, max_tokens):
+    # The start of `text`, cut to at most max_tokens tokens
+    tokenizer = get_tokenizer()
+    return tokenizer.decode(tokenizer.encode(text)[:max_tokens])
+
+
+def placeholder_tokens(text):
+    # Cheap stand-in count for a pending result, without touching the tokenizer
+    return -(-len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def count_batch(texts, workers=None):
+    # Token counts of many texts, in batches spread over a thread pool
+    texts = list(texts)
+    batches = [texts[i:i + BATCH_SIZE] for i in range(0, len(texts), BATCH_SIZE)]
+    if not batches:
+        return []
+    tokenizer = get_tokenizer()
+    with ThreadPoolExecutor(max_workers=workers or min(len(batches), os.cpu_count() or 1)) as pool:
+        return [count for counts in pool.map(tokenizer.count_batch, batches) for count in counts]
+
+
+def _estimate(record, prompt_tokens, completion_tokens, cost):
+    # Swap a pending record's placeholder counts for tokenizer counts
+    stream = record.get("stream")
+    if stream and record["completion_tokens"] > 1 and completion_tokens > 1:
+        # The decode rate was worked out from the placeholder count
+        stream["decode_tokens_per_s"] *= (completion_tokens - 1) / (record["completion_tokens"] - 1)
+    record["prompt_tokens"] = prompt_tokens
+    record["completion_tokens"] = completion_tokens
+    record["total_tokens"] = prompt_tokens + completion_tokens
+    record["cost"] = cost(prompt_tokens, completion_tokens)
+    record["token_source"] = ESTIMATED
+
+
+def finalize_log(path, prompt, cost, workers=None):
+    # Count the tokens of every pending run in the results log at `path` and
+    # rewrite it with the estimates. `prompt` is the benchmark's prompt and
+    # cost(prompt_tokens, completion_tokens) the provider's pricing. The new
+    # log replaces the old one in a single rename, so a crash part way leaves
+    # the old log, still pending and still resumable. Returns the number of
+    # runs estimated.
+    if not os.path.exists(path):
+        return 0
+    pending = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if '"pending"' in line:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("token_source") == PENDING:
+                    pending.append(record["response"])
+    if not pending:
+        return 0
+    prompt_tokens = count_prompt_tokens(prompt)
+    completion_counts = iter(count_batch(pending, workers))
+
+    temporary = path + ".tmp"
+    with open(path, encoding="utf-8") as source, open(temporary, "w", encoding="utf-8") as target:
+        for line in source:
+            if '"pending"' in line:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if record is not None and record.get("token_source") == PENDING:
+                    _estimate(record, prompt_tokens, next(completion_counts), cost)
+                    line = json.dumps(record) + "\n"
+            target.write(line)
+    os.replace(temporary, path)
+    return len(pending)
@@ -0,0 +1,119 @@
+# workload.py
+# Workload definitions: which prompts, input lengths, output caps and
+# temperatures to send, as a JSON file run as a matrix across providers by
+# run_workload.py. A single fixed question can't tell prefill cost from decode
+# cost; varying prompt and completion lengths independently can, by fitting
+#
+#     latency ≈ a + b·prompt_tokens + c·completion_tokens
+#
+# per provider (and TTFT ≈ a + b·prompt_tokens when streaming).
+#
+# {
+#   "name": "prefill_decode",
+#   "providers": ["gcp", "aws", "azure"],      optional, defaults to --providers
+#   "runs": 5,                                 requests per cell, optional
+#   "prompts": [
+#     {"name": "question", "text": "..."},     sent as written
+#     {"name": "summarize", "instruction": "Summarize the document below.",
+#      "input_tokens": [100, 1000, 10000, 100000]}   padded to each length
+#   ],
+#   "max_tokens": [64, 512, 2048],             output caps, optional
+#   "temperature": [0.0, 1.0],                 optional
+#   "mix": [                                   traffic to predict latency for, optional
+#     {"prompt_tokens": 2000, "completion_tokens": 300, "share": 0.8},
+#     {"prompt_tokens": 60000, "completion_tokens": 800, "share": 0.2}
+#   ]
+# }
+#
+# Omitted max_tokens or temperature leave each provider's default.
+
+import json
+import os
+import re
+
+from token_accounting import count_tokens, truncate_tokens
+
+# Filler for padded prompts. Numbered sections keep it from being one
+# sentence repeated, which some tokenizers and caches treat specially.
+FILLER_SENTENCES = [
+    "Enterprise teams weigh cloud providers on reliability, security controls and regional coverage.",
+    "Managed model endpoints differ in quota, latency under load and how they bill for tokens.",
+    "Procurement asks for predictable pricing while engineering asks for headroom at peak traffic.",
+    "Data residency rules decide which regions a workload may run in and where logs may be kept.",
+]
+
+
+def filler_text(tokens):
+    # At least `tokens` tokens of filler document (cut to size by the caller)
+    sentences = []
+    section = 0
+    # Sentences average over 10 tokens, so this overshoots; the caller trims
+    while len(sentences) * 10 < tokens:
+        section += 1
+        sentences.append(f"Section {section}.")
+        sentences.extend(FILLER_SENTENCES)
+    return " ".join(sentences)
+
+
+def padded_prompt(instruction, tokens):
+    # The instruction followed by filler, about `tokens` tokens in all
+    budget = max(0, tokens - count_tokens(instruction) - 2)
+    return f"{instruction}\n\n{truncate_tokens(filler_text(budget), budget)}"
+
+
+def _slug(value):
+    return re.sub(r"[^A-Za-z0-9]+", "-", str(value)).strip("-").lower()
+
+
+def load_workload(path):
+    with open(path, encoding="utf-8") as f:
+        workload = json.load(f)
+    if not workload.get("prompts"):
+        raise ValueError(f"{path}: a workload needs at least one entry in 'prompts'")
+    for prompt in workload["prompts"]:
+        if "name" not in prompt or ("text" in prompt) == ("input_tokens" in prompt):
+            raise ValueError(f"{path}: each prompt needs a 'name' and either 'text' or 'input_tokens'")
+    workload.setdefault("name", _slug(os.path.splitext(os.path.basename(path))[0]))
+    return workload
+
+
+def expand_cells(workload):
+    # Every prompt × input length × output cap × temperature combination, as
+    # dicts with the prompt text and a label for file names
+    prompts = []
+    for prompt in workload["prompts"]:
+        if "text" in prompt:
+            prompts.append((prompt["name"], None, prompt["text"]))
+        else:
+            instruction = prompt.get("instruction", "Summarize the document below in a few sentences.")
+            for tokens in prompt["input_tokens"]:
+                prompts.append((prompt["name"], tokens, padded_prompt(instruction, tokens)))
+    cells = []
+    for name, input_tokens, text in prompts:
+        for max_tokens in workload.get("max_tokens") or [None]:
+            for temperature in workload.get("temperature") or [None]:
+                parts = [name, input_tokens and f"in{input_tokens}", max_tokens and f"out{max_tokens}",
+                         temperature is not None and f"t{temperature}"]
+                cells.append({
+                    "prompt_set": name,
+                    "input_tokens": input_tokens,
+                    "prompt": text,
+                    "max_tokens": max_tokens,
+                    "temperature": temperature,
+                    "label": "_".join(_slug(part) for part in parts if part),
+                })
+    return cells
+
+
+def predict(model, prompt_tokens, completion_tokens):
+    # Latency from a fitted {"coefficients": [a, b, c]} model
+    a, b, c = model["coefficients"]
+    return a + b * prompt_tokens + c * completion_tokens
+
+
+def predict_mix(model, mix):
+    # Share-weighted mean latency of a traffic mix
+    total = sum(entry.get("share", 1.0) for entry in mix)
+    return sum(
+        entry.get("share", 1.0) * predict(model, entry["prompt_tokens"], entry["completion_tokens"]) for entry in mix
+    ) / total